@@ -3,7 +3,13 @@
 # app/__init__.py
 from flask import Flask, redirect, url_for
 from config import config
-from app.routes import order_download, order_delivery, dashboard, refund_order, return_order_notice, stockout_push, return_order_entry, exchange_order, allocation_out, allocation_in, inventory_entry, inventory_out, inventory_adjustment  # 导入蓝图
+from app.routes import order_download, order_delivery, dashboard, refund_order, return_order_notice, stockout_push, return_order_entry, exchange_order, allocation_out, allocation_in, inventory_entry, inventory_out, inventory_adjustment, id_service, catalog, bulk, replay, assets, profiler  # 导入蓝图
+from app.utils.logging_setup import setup_logging
+from app.utils.assets import init_assets
+from app.utils.compression import init_compression
+from app.utils.timing import init_timing
+from app.utils.tracing import init_tracing
+from app.utils.profiler import init_profiler
 import atexit
 
 
@@ -11,9 +17,21 @@ def create_app() -> Flask:
     """
     创建Flask应用（工厂函数）
     """
+    # 统一日志配置（队列异步输出、模块级别、滚动文件）
+    setup_logging(config)
+
     app = Flask(__name__)
     app.config.from_object(config)
 
+    # 请求分段计时（Server-Timing头与慢请求日志），最先注册以覆盖其他钩子的耗时
+    init_timing(app)
+
+    # 链路追踪（提交类请求的根span，流式响应结束后导出）
+    init_tracing(app)
+
+    # 按需性能剖析（未配置PROFILER_TOKEN时不注册钩子）
+    init_profiler(app)
+
     # 添加一个特殊路由来提供根目录下的logo.svg文件
     from flask import send_file
     import os
@@ -49,6 +67,24 @@ def create_app() -> Flask:
     app.register_blueprint(inventory_out.inventory_out_bp)
     # 注册蓝图（库存调整：URL前缀/inventory_adjustment）
     app.register_blueprint(inventory_adjustment.inventory_adjustment_bp)
+    # 注册蓝图（业务编码发放：URL前缀/id_service）
+    app.register_blueprint(id_service.id_service_bp)
+    # 注册蓝图（基础数据目录：URL前缀/catalog）
+    app.register_blueprint(catalog.catalog_bp)
+    # 注册蓝图（批量数据生成：URL前缀/bulk）
+    app.register_blueprint(bulk.bulk_bp)
+    # 注册蓝图（数据集回放：URL前缀/replay）
+    app.register_blueprint(replay.replay_bp)
+    # 注册蓝图（打包静态资源：URL前缀/assets）
+    app.register_blueprint(assets.assets_bp)
+    # 注册蓝图（按需性能剖析：URL前缀/profiler）
+    app.register_blueprint(profiler.profiler_bp)
+
+    # 构建带哈希的静态资源包，模板中通过asset_url引用
+    init_assets(app)
+
+    # 响应压缩（gzip/brotli，流式响应逐块压缩）
+    init_compression(app)
     
     # 根路径路由 - 重定向到仪表盘
     @app.route('/')
@@ -61,5 +97,9 @@ def create_app() -> Flask:
         """应用关闭时清理资源"""
         from app.utils.rabbitmq import close_rabbitmq_connection
         close_rabbitmq_connection()
+        from app.utils.http_client import close_gateway_client
+        close_gateway_client()
+        from app.utils.jobs import close_executor
+        close_executor()
 
     return app
\ No newline at end of file
@@ -1,10 +1,16 @@
 # app/routes/allocation_in.py
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, request, jsonify
 from config import config  # 导入配置实例
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, ValidationError
+from app.utils.output_schema import register_output_schema, ENTRY_ORDER, ORDER_LINES
 import logging
-import json
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -12,12 +18,88 @@ logger = logging.getLogger(__name__)
 allocation_in_bp = Blueprint('allocation_in', __name__, url_prefix='/allocation_in')
 
 
+# ==================== 输入结构 ====================
+# 前端提交完整的回传报文，明细在callbackResponse.orderLines中；actualQty保留原始字符串
+register_schema('allocation_in', fields=[
+    Field('entryOrderCode', path='callbackResponse.entryOrder.entryOrderCode'),
+    Field('warehouseCode', path='callbackResponse.entryOrder.warehouseCode')
+], details=[
+    Field('itemCode'),
+    Field('actualQty', 'float', convert=False)
+], detail_path='callbackResponse.orderLines')
+
+
+# ==================== 输出结构 ====================
+# 调拨入库：入库单号、仓库与入库明细
+register_output_schema(config.ALLOCATION_ENTRY_QUEUE, {
+    'type': 'object',
+    'required': ['callbackResponse'],
+    'properties': {
+        'callbackResponse': {
+            'type': 'object',
+            'required': ['entryOrder', 'orderLines'],
+            'properties': {
+                'entryOrder': ENTRY_ORDER,
+                'orderLines': ORDER_LINES
+            }
+        }
+    }
+})
+
+
+# ==================== 辅助函数 ====================
+def build_message(entry_order_code, warehouse_code, details, current_time):
+    """合并预设参数与明细，生成调拨入库消息"""
+    return {
+        **config.ALLOCATION_ENTRY_PRESET,
+        'callbackResponse': {
+            **config.ALLOCATION_ENTRY_PRESET['callbackResponse'],
+            'entryOrder': {
+                **config.ALLOCATION_ENTRY_PRESET['callbackResponse']['entryOrder'],
+                'entryOrderCode': entry_order_code,
+                'entryOrderId': entry_order_code,
+                'outBizCode': entry_order_code,
+                'warehouseCode': warehouse_code,
+                'operateTime': current_time
+            },
+            'orderLines': [
+                {
+                    **config.ALLOCATION_ENTRY_PRESET['callbackResponse']['orderLines'][0],
+                    'itemCode': detail['itemCode'],
+                    'actualQty': detail['actualQty'],
+                    'orderLineNo': str(i + 1)
+                } for i, detail in enumerate(details)
+            ]
+        }
+    }
+
+
+@register_generator('allocation_in', config.ALLOCATION_ENTRY_QUEUE, '调拨入库',
+                    required_fields=('callbackResponse.entryOrder.entryOrderCode', 'callbackResponse.entryOrder.warehouseCode', 'callbackResponse.orderLines[].itemCode', 'callbackResponse.orderLines[].actualQty'))
+def generate(ctx, params):
+    """批量生成调拨入库消息：入库单号唯一，SKU按仓库加权采样"""
+    warehouse_code = params.get('warehouse_code') or (ctx.sample_warehouse() or {}).get('warehouse_code', '')
+    details = [{'itemCode': sku['sku_code'], 'actualQty': str(qty)}
+               for sku, qty in sample_order_lines(ctx, params, warehouse_code)]
+    return build_message(ctx.code('entryOrderCode'), warehouse_code, details, ctx.format_time())
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条调拨入库报文并更新操作时间，单条提交与批量提交共用"""
+    # 按输入结构校验入库单号、仓库与订单行
+    parse_request('allocation_in', data)
+    # 更新操作时间为当前时间（提供seed时由基准时钟决定）
+    data['callbackResponse']['entryOrder']['operateTime'] = context_from_request(data).format_time()
+    return data
+
+
 # ==================== 路由函数 ====================
 # 调拨入库页面（GET请求）
 @allocation_in_bp.route('/')
 def index():
     """调拨入库页面"""
-    return render_template('allocation_in.html', preset=config.ALLOCATION_ENTRY_PRESET)
+    return render_cached('allocation_in.html', preset=config.ALLOCATION_ENTRY_PRESET)
 
 
 # 调拨入库接口（POST请求）
@@ -26,84 +108,27 @@ def submit():
     """调拨入库接口"""
     try:
         # 1. 获取JSON数据
-        try:
-            request_data = request.get_json()
-            if not request_data:
-                return jsonify({
-                    'success': False,
-                    'message': '请求数据格式错误，请提交JSON格式数据'
-                }), 400
-        except Exception as e:
+        request_data = request.get_json(silent=True)
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(request_data, list):
+            return submit_batch(config.ALLOCATION_ENTRY_QUEUE, request_data, message_from_input)
+        if not isinstance(request_data, dict) or not request_data:
             return jsonify({
                 'success': False,
-                'message': f'解析JSON数据失败: {str(e)}'
+                'message': '请求数据格式错误，请提交JSON格式数据'
             }), 400
 
-        # 2. 验证必填字段
-        if not request_data.get('callbackResponse'):
-            return jsonify({
-                'success': False,
-                'message': '请求数据结构错误'
-            }), 400
+        # 2-3. 校验入库单号、仓库与订单行（全部错误一次返回），使用前端提交的JSON数据作为最终消息
+        message_data = message_from_input(request_data)
+        entry_order_code = message_data['callbackResponse']['entryOrder']['entryOrderCode']
 
-        entry_order = request_data['callbackResponse'].get('entryOrder', {})
-        entry_order_code = entry_order.get('entryOrderCode')
-        warehouse_code = entry_order.get('warehouseCode')
+        logger.debug("最终推送给RabbitMQ的报文: %s", payload(message_data))
 
-        required_fields = {
-            'entryOrderCode': entry_order_code,
-            'warehouseCode': warehouse_code
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            return jsonify({
-                'success': False,
-                'message': f"缺少必填字段: {', '.join(missing_fields)}"
-            }), 400
-
-        # 3. 验证订单行数据
-        order_lines = request_data['callbackResponse'].get('orderLines', [])
-        if not order_lines:
-            return jsonify({
-                'success': False,
-                'message': '订单行数据不能为空'
-            }), 400
-
-        # 验证订单行中的必填字段
-        for i, line in enumerate(order_lines):
-            if not line.get('itemCode'):
-                return jsonify({
-                    'success': False,
-                    'message': f'明细 {i+1} 缺少SKU编码'
-                }), 400
-            
-            if not line.get('actualQty'):
-                return jsonify({
-                    'success': False,
-                    'message': f'明细 {i+1} 缺少实际数量'
-                }), 400
-            
-            try:
-                # 验证数量为数字
-                float(line['actualQty'])
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'message': f'明细 {i+1} 的实际数量必须为数字'
-                }), 400
-
-        # 4. 使用前端提交的JSON数据作为最终消息
-        message_data = request_data
-        
-        # 更新操作时间为当前时间
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        message_data['callbackResponse']['entryOrder']['operateTime'] = current_time
-
-        print('最终推送给RabbitMQ的报文:', json.dumps(message_data, ensure_ascii=False))
-
-        # 5. 推送消息到RabbitMQ
+        # 4. 推送消息到RabbitMQ
         logger.info(f"开始推送调拨入库消息到队列: {config.ALLOCATION_ENTRY_QUEUE}")
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run(request_data):
+            return dry_run_response(config.ALLOCATION_ENTRY_QUEUE, message_data, success=True)
         success = push_message(config.ALLOCATION_ENTRY_QUEUE, message_data)
         
         if success:
@@ -117,12 +142,19 @@ def submit():
         else:
             logger.error(f"调拨入库消息推送失败: {entry_order_code}")
             logger.error(f"队列名称: {config.ALLOCATION_ENTRY_QUEUE}")
-            logger.error(f"消息内容: {json.dumps(message_data, ensure_ascii=False)}")
+            logger.error("消息内容: %s", payload(message_data))
             return jsonify({
                 'success': False,
                 'message': '消息推送失败，请稍后重试'
             }), 500
 
+    except ValidationError as e:
+        logger.warning(f"请求验证失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'errors': e.errors
+        }), 400
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({
@@ -1,9 +1,16 @@
 # app/routes/allocation_out.py
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, request, jsonify
 from config import config  # 导入配置实例
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, request_data, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, DELIVERY_ORDER, ORDER_LINES
 import logging
-import json
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -12,12 +19,88 @@ logger = logging.getLogger(__name__)
 allocation_out_bp = Blueprint('allocation_out', __name__, url_prefix='/allocation_out')
 
 
+# ==================== 输入结构 ====================
+# 明细字段itemCode0、actualQty0……（序号从0开始），actualQty保持字符串写入报文
+register_schema('allocation_out', fields=[
+    Field('deliveryOrderCode'),
+    Field('warehouseCode')
+], details=[
+    Field('itemCode'),
+    Field('actualQty', 'int', convert=False)
+], detail_base=0)
+
+
+# ==================== 输出结构 ====================
+# 出库回传（调拨出库与其他出库共用stock_out_back队列）
+register_output_schema(config.ALLOCATION_OUT_QUEUE, {
+    'type': 'object',
+    'required': ['callbackResponse'],
+    'properties': {
+        'callbackResponse': {
+            'type': 'object',
+            'required': ['deliveryOrder', 'orderLines'],
+            'properties': {
+                'deliveryOrder': DELIVERY_ORDER,
+                'orderLines': ORDER_LINES
+            }
+        }
+    }
+})
+
+
+# ==================== 辅助函数 ====================
+def build_message(delivery_order_code, warehouse_code, details, current_time):
+    """合并预设参数与用户输入，生成调拨出库消息"""
+    return {
+        **config.ALLOCATION_OUT_PRESET,
+        'callbackResponse': {
+            **config.ALLOCATION_OUT_PRESET['callbackResponse'],
+            'deliveryOrder': {
+                **config.ALLOCATION_OUT_PRESET['callbackResponse']['deliveryOrder'],
+                'deliveryOrderCode': delivery_order_code,
+                'outBizCode': delivery_order_code,
+                'warehouseCode': warehouse_code,
+                'operateTime': current_time,
+                'orderConfirmTime': current_time
+            },
+            'orderLines': [
+                {
+                    **config.ALLOCATION_OUT_PRESET['callbackResponse']['orderLines'][0],
+                    'itemCode': detail['itemCode'],
+                    'actualQty': detail['actualQty']
+                } for detail in details
+            ]
+        }
+    }
+
+
+@register_generator('allocation_out', config.ALLOCATION_OUT_QUEUE, '调拨出库',
+                    required_fields=('callbackResponse.deliveryOrder.deliveryOrderCode', 'callbackResponse.deliveryOrder.warehouseCode', 'callbackResponse.orderLines[].itemCode', 'callbackResponse.orderLines[].actualQty'))
+def generate(ctx, params):
+    """批量生成调拨出库消息：出库单号唯一，SKU按仓库加权采样"""
+    warehouse_code = params.get('warehouse_code') or (ctx.sample_warehouse() or {}).get('warehouse_code', '')
+    details = [{'itemCode': sku['sku_code'], 'actualQty': str(qty)}
+               for sku, qty in sample_order_lines(ctx, params, warehouse_code)]
+    return build_message(ctx.code('deliveryOrderCode'), warehouse_code, details, ctx.format_time())
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条输入（表单或JSON对象）并生成最终消息，单条提交与批量提交共用"""
+    # 1. 按输入结构解析并校验基础字段与明细（itemCode、actualQty）
+    fields, details = parse_request('allocation_out', data)
+    # 2. 获取当前时间（提供seed时由基准时钟决定）
+    current_time = context_from_request(data).format_time()
+    # 3. 合并预设参数与用户输入
+    return build_message(fields['deliveryOrderCode'], fields['warehouseCode'], details, current_time)
+
+
 # ==================== 路由函数 ====================
 # 调拨出库页面（GET请求）
 @allocation_out_bp.route('/')
 def index():
     """调拨出库页面"""
-    return render_template('allocation_out.html', preset=config.ALLOCATION_OUT_PRESET)
+    return render_cached('allocation_out.html', preset=config.ALLOCATION_OUT_PRESET)
 
 
 # 调拨出库接口（POST请求）
@@ -25,82 +108,22 @@ def index():
 def submit():
     """调拨出库接口"""
     try:
-        # 1. 获取用户输入（基础字段）
-        delivery_order_code = request.form.get('deliveryOrderCode')
-        warehouse_code = request.form.get('warehouseCode')
-        detail_count = int(request.form.get('detail_count', 1))
-
-        # 2. 验证必填字段
-        required_fields = {
-            'deliveryOrderCode': delivery_order_code,
-            'warehouseCode': warehouse_code
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            return jsonify({
-                'status': 'error',
-                'message': f'缺少必填字段: {", ".join(missing_fields)}'
-            }), 400
-
-        # 3. 获取动态明细（itemCode、actualQty）
-        details = []
-        for i in range(detail_count):
-            item_code = request.form.get(f'itemCode{i}')
-            actual_qty = request.form.get(f'actualQty{i}')
-            
-            # 验证明细字段
-            if not all([item_code, actual_qty]):
-                return jsonify({
-                    'status': 'error',
-                    'message': f'明细 {i+1} 缺少必填字段'
-                }), 400
-            
-            # 验证数量是否为数字
-            try:
-                int(actual_qty)
-            except ValueError:
-                return jsonify({
-                    'status': 'error',
-                    'message': f'明细 {i+1} 的实际数量必须为数字'
-                }), 400
-                
-            details.append({
-                'itemCode': item_code,
-                'actualQty': actual_qty
-            })
-
-        # 4. 获取当前时间
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        values = request_data()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(values, list):
+            return submit_batch(config.ALLOCATION_OUT_QUEUE, values, message_from_input)
 
-        # 5. 合并预设参数与用户输入（生成最终消息）
-        message_data = {
-            **config.ALLOCATION_OUT_PRESET,
-            'callbackResponse': {
-                **config.ALLOCATION_OUT_PRESET['callbackResponse'],
-                'deliveryOrder': {
-                    **config.ALLOCATION_OUT_PRESET['callbackResponse']['deliveryOrder'],
-                    'deliveryOrderCode': delivery_order_code,
-                    'outBizCode': delivery_order_code,
-                    'warehouseCode': warehouse_code,
-                    'operateTime': current_time,
-                    'orderConfirmTime': current_time
-                },
-                'orderLines': [
-                    {
-                        **config.ALLOCATION_OUT_PRESET['callbackResponse']['orderLines'][0],
-                        'itemCode': detail['itemCode'],
-                        'actualQty': detail['actualQty']
-                    } for detail in details
-                ]
-            }
-        }
+        # 1-3. 校验输入并生成最终消息
+        message_data = message_from_input(values)
+        delivery_order_code = message_data['callbackResponse']['deliveryOrder']['deliveryOrderCode']
 
-        print("收到的 request.form:", dict(request.form))
-        print('最终推送给RabbitMQ的报文:', json.dumps(message_data, ensure_ascii=False))
+        logger.debug("最终推送给RabbitMQ的报文: %s", payload(message_data))
 
-        # 6. 推送消息到RabbitMQ
+        # 4. 推送消息到RabbitMQ
         logger.info(f"开始推送调拨出库消息到队列: {config.ALLOCATION_OUT_QUEUE}")
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run():
+            return dry_run_response(config.ALLOCATION_OUT_QUEUE, message_data)
         success = push_message(config.ALLOCATION_OUT_QUEUE, message_data)
         
         if success:
@@ -114,12 +137,15 @@ def submit():
         else:
             logger.error(f"调拨出库消息推送失败: {delivery_order_code}")
             logger.error(f"队列名称: {config.ALLOCATION_OUT_QUEUE}")
-            logger.error(f"消息内容: {json.dumps(message_data, ensure_ascii=False)}")
+            logger.error("消息内容: %s", payload(message_data))
             return jsonify({
                 'status': 'error',
                 'message': '消息推送失败，请检查RabbitMQ连接和终端日志'
             }), 500
 
+    except ValidationError as e:
+        logger.warning(f"请求验证失败: {str(e)}")
+        return validation_error_response(e)
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/20 10:30
+# file: assets.py
+# 打包后静态资源路由：文件名带内容哈希，允许浏览器永久缓存
+import os
+import mimetypes
+from flask import Blueprint, request, send_from_directory
+from werkzeug.security import safe_join
+from app.utils.assets import get_asset_pipeline
+from app.utils.compression import choose_encoding, ENCODING_SUFFIXES
+
+# ==================== 蓝图定义 ====================
+assets_bp = Blueprint('assets', __name__, url_prefix='/assets')
+
+# 一年，内容变化时文件名随之变化
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+
+# ==================== 路由函数 ====================
+@assets_bp.route('/<path:filename>')
+def serve(filename):
+    """提供带哈希的资源文件（Cache-Control: immutable），客户端支持时返回构建时预压缩的.br/.gz文件"""
+    output_dir = get_asset_pipeline().output_dir
+    path = safe_join(output_dir, filename)
+    encodings = [encoding for encoding, suffix in ENCODING_SUFFIXES.items()
+                 if path and os.path.isfile(path + suffix)]
+    encoding = choose_encoding(request.accept_encodings, encodings)
+    if encoding:
+        response = send_from_directory(output_dir, filename + ENCODING_SUFFIXES[encoding], max_age=ASSET_MAX_AGE,
+                                       mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(output_dir, filename, max_age=ASSET_MAX_AGE)
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/14 11:00
+# file: bulk.py
+# 批量数据生成路由文件
+from flask import Blueprint, request, jsonify
+from config import config
+from app.utils.catalog import get_catalog
+from app.utils.generation import list_generators, get_generator, generate_message, generate_messages, DEFAULT_INTERVAL_MS
+from app.utils.rabbitmq import push_message
+from app.utils.dry_run import is_dry_run, check_required, iter_dry_run, ndjson_response, DryRunStats, NDJSON_MIMETYPE
+from app.utils.replay import dataset_path, export_dataset
+from app.utils.schema import list_schemas
+from app.utils.output_schema import check_output, resolve_mode, list_output_schemas, OutputValidationError
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# ==================== 蓝图定义 ====================
+bulk_bp = Blueprint('bulk', __name__, url_prefix='/bulk')
+
+
+# ==================== 辅助函数 ====================
+def parse_spec(data):
+    """解析批量生成参数，返回 (count, seed, start_index, base_time, interval_ms, params)"""
+    count = int(data.get('count', 1))
+    if count < 1 or count > config.BULK_MAX_COUNT:
+        raise ValueError(f'生成数量必须在1到{config.BULK_MAX_COUNT}之间')
+    seed = data.get('seed')
+    start_index = int(data.get('start_index', 0))
+    if start_index < 0:
+        raise ValueError('start_index不能为负数')
+    interval_ms = data.get('interval_ms')
+    return count, seed, start_index, data.get('base_time'), int(interval_ms) if interval_ms else None, data.get('params') or {}
+
+
+def dry_run(messages, required_fields, count, output, validation, catalog):
+    """批量演练：按output返回汇总、完整报文或NDJSON流（汇总中附带所用基础数据快照的版本）"""
+    wants_ndjson = NDJSON_MIMETYPE in request.headers.get('Accept', '')
+    if output == 'ndjson' or (output == 'messages' and (wants_ndjson or count > config.BULK_DRY_RUN_INLINE_MAX)):
+        return ndjson_response(messages, required_fields, validation, catalog=catalog.version_info())
+
+    stats = DryRunStats()
+    if output == 'messages':
+        items = []
+        for index, queue_name, message_data, _, missing, schema_errors in iter_dry_run(messages, required_fields, stats, validation):
+            item = {'index': index, 'queue': queue_name, 'data': message_data}
+            if missing:
+                item['missing'] = missing
+            if schema_errors:
+                item['schema_errors'] = schema_errors
+            items.append(item)
+        return jsonify({'status': 'success', 'dry_run': True, 'summary': stats.to_dict(), 'catalog': catalog.version_info(),
+                        'messages': items})
+
+    for _ in iter_dry_run(messages, required_fields, stats, validation):
+        pass
+    return jsonify({'status': 'success', 'dry_run': True, 'summary': stats.to_dict(), 'catalog': catalog.version_info()})
+
+
+# ==================== 路由函数 ====================
+# 可批量生成的消息类型（GET请求）
+@bulk_bp.route('/types', methods=['GET'])
+def types():
+    """列出已注册的批量生成器"""
+    return jsonify({
+        'status': 'success',
+        'types': list_generators(),
+        # 各提交接口的输入结构（字段、明细、类型与范围）
+        'schemas': list_schemas(),
+        # 各队列的出站报文结构（JSON Schema）
+        'output_schemas': list_output_schemas()
+    })
+
+
+# 单条消息复现（GET请求）
+@bulk_bp.route('/<message_type>/message', methods=['GET'])
+def message(message_type):
+    """按种子和序号直接计算第index条消息，例如 /bulk/order_download/message?seed=42&index=1000"""
+    try:
+        if get_generator(message_type) is None:
+            return jsonify({
+                'status': 'error',
+                'message': f'不支持的消息类型: {message_type}'
+            }), 404
+
+        params = {k: v for k, v in request.args.items() if k not in ('seed', 'index', 'base_time', 'interval_ms')}
+        catalog = get_catalog().snapshot
+        queue_name, message_data = generate_message(
+            message_type,
+            int(request.args.get('index', 0)),
+            params,
+            seed=request.args.get('seed'),
+            base_time=request.args.get('base_time'),
+            interval_ms=request.args.get('interval_ms'),
+            catalog=catalog
+        )
+        return jsonify({
+            'status': 'success',
+            'queue': queue_name,
+            'catalog': catalog.version_info(),
+            'data': message_data
+        })
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'参数格式错误: {str(e)}'
+        }), 400
+
+
+# 批量生成并推送（POST请求）
+@bulk_bp.route('/<message_type>/generate', methods=['POST'])
+def generate(message_type):
+    """批量生成并推送消息
+
+    请求体: {"count": 1000, "seed": 42, "start_index": 0, "base_time": "2025-01-01 00:00:00",
+             "interval_ms": 1000, "params": {"lines": 3, "warehouse_code": "DCN"}}
+    不传seed为实时模式；传seed时第i条消息只由 (seed, i) 决定，可按start_index拆分到多个进程复现
+
+    演练模式（"dry_run": true）只生成并校验，不推送，"output" 可选：
+    - summary（默认）：只返回汇总统计
+    - messages：返回全部报文，数量超过BULK_DRY_RUN_INLINE_MAX或Accept为NDJSON时改为流式NDJSON
+    - ndjson：始终流式返回NDJSON
+
+    "validation" 覆盖本次的输出结构校验模式：strict（不合格的报文计入invalid_indexes、不推送）/ warn（记录警告后推送）/ off
+    """
+    try:
+        generator = get_generator(message_type)
+        if generator is None:
+            return jsonify({
+                'status': 'error',
+                'message': f'不支持的消息类型: {message_type}'
+            }), 404
+
+        data = request.get_json(silent=True) or {}
+        count, seed, start_index, base_time, interval_ms, params = parse_spec(data)
+        # 整批使用同一个基础数据快照，结果中记录其版本
+        catalog = get_catalog().snapshot
+        messages = generate_messages(message_type, count, params, seed, start_index, base_time, interval_ms, catalog)
+        required_fields = generator['required_fields']
+        validation = resolve_mode(data.get('validation'))
+
+        if is_dry_run(data):
+            return dry_run(messages, required_fields, count, data.get('output', 'summary'), validation, catalog)
+
+        start_time = time.time()
+        success_count = 0
+        failed_indexes = []
+        invalid_indexes = []
+        for index, queue_name, message_data in messages:
+            if check_required(message_data, required_fields):
+                invalid_indexes.append(index)
+                continue
+            try:
+                check_output(queue_name, message_data, validation)
+            except OutputValidationError:
+                invalid_indexes.append(index)
+                continue
+            # 已按本次的模式校验过，推送时不再重复校验
+            if push_message(queue_name, message_data, validation='off'):
+                success_count += 1
+            else:
+                failed_indexes.append(index)
+        elapsed_time = time.time() - start_time
+
+        logger.info(f"批量生成完成: type={message_type}, count={count}, 成功={success_count}, 耗时={elapsed_time:.2f}秒")
+        ok = not failed_indexes and not invalid_indexes
+        return jsonify({
+            'status': 'success' if ok else 'error',
+            'message_type': message_type,
+            'seed': seed,
+            'start_index': start_index,
+            'count': count,
+            'catalog': catalog.version_info(),
+            'validation': validation,
+            'success_count': success_count,
+            'failed_indexes': failed_indexes,
+            'invalid_indexes': invalid_indexes,
+            'elapsed': round(elapsed_time, 3)
+        }), 200 if ok else 500
+
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'参数格式错误: {str(e)}'
+        }), 400
+    except Exception as e:
+        logger.error(f"批量生成处理异常: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'系统错误: {str(e)}'
+        }), 500
+
+
+# 批量生成并导出为数据集文件（POST请求）
+@bulk_bp.route('/<message_type>/export', methods=['POST'])
+def export(message_type):
+    """批量生成消息并写入数据集文件，不推送，之后可通过 /replay 反复回放
+
+    请求体在generate参数基础上增加 "file": "orders_42.ndjson.gz"（.gz结尾时gzip压缩）
+    """
+    try:
+        if get_generator(message_type) is None:
+            return jsonify({
+                'status': 'error',
+                'message': f'不支持的消息类型: {message_type}'
+            }), 404
+
+        data = request.get_json(silent=True) or {}
+        count, seed, start_index, base_time, interval_ms, params = parse_spec(data)
+        path = dataset_path(config.DATASET_DIR, data.get('file') or f'{message_type}_{seed if seed is not None else "live"}.ndjson.gz')
+        interval_ms = interval_ms or DEFAULT_INTERVAL_MS
+        catalog = get_catalog().snapshot
+        meta = {
+            'message_type': message_type,
+            'seed': seed,
+            'start_index': start_index,
+            'count': count,
+            'base_time': base_time,
+            'interval_ms': interval_ms,
+            'params': params,
+            # 同一种子只有在基础数据版本相同时才能复现
+            'catalog': catalog.version_info()
+        }
+        messages = generate_messages(message_type, count, params, seed, start_index, base_time, interval_ms, catalog)
+        result = export_dataset(path, messages, meta, interval_ms)
+        return jsonify({
+            'status': 'success',
+            'file': os.path.basename(path),
+            **result
+        })
+
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'参数格式错误: {str(e)}'
+        }), 400
+    except Exception as e:
+        logger.error(f"数据集导出异常: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'系统错误: {str(e)}'
+        }), 500
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/13 10:30
+# file: catalog.py
+# 基础数据目录路由文件
+from flask import Blueprint, request, jsonify
+from config import config
+from app.utils.catalog import get_catalog
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ==================== 蓝图定义 ====================
+catalog_bp = Blueprint('catalog', __name__, url_prefix='/catalog')
+
+
+# ==================== 路由函数 ====================
+# 基础数据统计（GET请求）
+@catalog_bp.route('/stats', methods=['GET'])
+def stats():
+    """基础数据目录统计信息"""
+    return jsonify({
+        'status': 'success',
+        'data': get_catalog().stats()
+    })
+
+
+# 按编码查询（GET请求）
+@catalog_bp.route('/lookup', methods=['GET'])
+def lookup():
+    """按编码查询SKU、店铺或仓库，例如 /catalog/lookup?sku_code=6941428688156"""
+    catalog = get_catalog()
+    sku_code = request.args.get('sku_code')
+    store_id = request.args.get('store_id')
+    warehouse_code = request.args.get('warehouse_code')
+
+    if sku_code:
+        record = catalog.get_sku(sku_code)
+    elif store_id:
+        record = catalog.get_store(store_id)
+    elif warehouse_code:
+        record = catalog.get_warehouse(warehouse_code)
+    else:
+        return jsonify({
+            'status': 'error',
+            'message': '缺少查询参数: sku_code、store_id或warehouse_code'
+        }), 400
+
+    if record is None:
+        return jsonify({
+            'status': 'error',
+            'message': '未找到对应记录'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'data': record
+    })
+
+
+# 加权采样SKU（GET请求）
+@catalog_bp.route('/sample', methods=['GET'])
+def sample():
+    """按权重抽取SKU，例如 /catalog/sample?count=100&warehouse_code=DCN"""
+    try:
+        count = int(request.args.get('count', 1))
+        if count < 1 or count > config.CATALOG_MAX_SAMPLE:
+            return jsonify({
+                'status': 'error',
+                'message': f'采样数量必须在1到{config.CATALOG_MAX_SAMPLE}之间'
+            }), 400
+
+        skus = get_catalog().sample_skus(
+            count,
+            warehouse_code=request.args.get('warehouse_code'),
+            store_id=request.args.get('store_id')
+        )
+        return jsonify({
+            'status': 'success',
+            'data': skus
+        })
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'参数格式错误: {str(e)}'
+        }), 400
+
+
+# 重新加载基础数据（POST请求）
+@catalog_bp.route('/reload', methods=['POST'])
+def reload():
+    """不重启服务重新加载基础数据"""
+    try:
+        stats = get_catalog().reload()
+        return jsonify({
+            'status': 'success',
+            'message': '基础数据已重新加载',
+            'data': stats
+        })
+    except Exception as e:
+        logger.error(f"基础数据重新加载失败: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'重新加载失败: {str(e)}'
+        }), 500
@@ -2,8 +2,15 @@
 # time: 2025/8/1 10:15
 # file: dashboard.py
 # 仪表盘路由文件
-from flask import Blueprint, render_template, request, jsonify
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from config import config
 from app.utils.dashboard_data import DashboardDataManager
+from app.utils.live_feed import get_live_feed
+from app.utils.metrics import shared_series, shared_queues, LATENCY_BOUNDS_MS
+from app.utils.page_cache import render_cached
+from app.utils.tracing import get_trace_store
 
 # 创建仪表盘蓝图
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
@@ -13,7 +20,7 @@ dashboard_manager = DashboardDataManager()
 
 @dashboard_bp.route('/')
 def index():
-    return render_template('base.html')
+    return render_cached('base.html')
 
 
 @dashboard_bp.route('/increment_menu_count', methods=['POST'])
@@ -44,3 +51,160 @@ def save_memo():
 def get_memo():
     memo = dashboard_manager.get_memo()
     return jsonify({'memo': memo})
+
+
+@dashboard_bp.route('/get_push_history')
+def get_push_history():
+    """最近的RabbitMQ推送记录，?limit=50&queue_name=...&success=true&include_message=false"""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 1000)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit必须为整数'}), 400
+    success = request.args.get('success')
+    logs = dashboard_manager.get_rabbitmq_logs(
+        limit=limit,
+        queue_name=request.args.get('queue_name') or None,
+        success=None if success in (None, '') else success.lower() in ('1', 'true', 'yes'),
+        include_message=request.args.get('include_message', 'true').lower() not in ('0', 'false', 'no')
+    )
+    return jsonify({'logs': logs, 'stats': dashboard_manager.get_push_stats()})
+
+
+@dashboard_bp.route('/events')
+def events():
+    """仪表盘实时事件流（Server-Sent Events），替代轮询
+
+    连接时发送snapshot，之后推送push/throughput/stats/memo/connection增量事件
+    """
+    feed = get_live_feed()
+    subscriber = feed.subscribe()
+    return Response(stream_with_context(feed.stream(subscriber, config.LIVE_FEED_HEARTBEAT, config.LIVE_FEED_MAX_SECONDS)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@dashboard_bp.route('/metrics')
+def metrics():
+    """队列吞吐与延迟时间序列，?resolution=second|minute&span=120&queue_name=...（'*'为全部队列汇总）
+
+    各worker的指标桶随仪表盘写回进入共享存储，这里返回所有worker合并后的数据（最近STORE_FLUSH_INTERVAL秒可能尚未写回）
+    """
+    try:
+        span = request.args.get('span')
+        series = shared_series(
+            resolution=request.args.get('resolution', 'second'),
+            span=int(span) if span else None,
+            queue_name=request.args.get('queue_name') or None
+        )
+        return jsonify({
+            'status': 'success',
+            'queues': shared_queues(),
+            'latency_bounds_ms': LATENCY_BOUNDS_MS,
+            'series': series
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'参数错误: {str(e)}'}), 400
+
+
+
+@dashboard_bp.route('/slow_requests')
+def slow_requests():
+    """最近的慢请求及分段耗时（超过SLOW_REQUEST_MS），?limit=50&path=/order_download
+
+    各worker的慢请求随仪表盘数据写回共享存储，返回所有worker的记录（每条的pid为处理该请求的worker）
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), config.SLOW_REQUEST_LOG_SIZE)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit必须为整数'}), 400
+    return jsonify({
+        'status': 'success',
+        'threshold_ms': config.SLOW_REQUEST_MS,
+        'requests': dashboard_manager.get_slow_requests(limit, request.args.get('path') or None)
+    })
+
+
+@dashboard_bp.route('/traces')
+def traces():
+    """链路追踪查看页"""
+    return render_cached('traces.html')
+
+
+@dashboard_bp.route('/get_traces')
+def get_traces():
+    """最近的追踪（不含span明细），?limit=50&name=/order_download&min_ms=100&status=error
+
+    各worker结束的追踪随仪表盘数据写回共享存储，返回所有worker的追踪（每条的pid为处理该请求的worker）
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), config.TRACE_BUFFER_SIZE)
+        min_ms = float(request.args.get('min_ms') or 0)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit、min_ms必须为数字'}), 400
+    return jsonify({
+        'status': 'success',
+        'traces': get_trace_store().recent(limit, request.args.get('name') or None, min_ms,
+                                           request.args.get('status') or None)
+    })
+
+
+@dashboard_bp.route('/get_trace/<trace_id>')
+def get_trace(trace_id):
+    """单条追踪（含全部span、属性与事件）"""
+    trace = get_trace_store().get(trace_id.lower())
+    if trace is None:
+        return jsonify({'status': 'error', 'message': f'追踪不存在（可能已被淘汰）: {trace_id}'}), 404
+    return jsonify({'status': 'success', 'trace': trace})
+
+def parse_time(value):
+    """时间参数：支持Unix时间戳或 YYYY-MM-DD[ HH:MM:SS]（本地时间）"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f'时间格式错误: {value}')
+
+
+@dashboard_bp.route('/search_push_history')
+def search_push_history():
+    """检索推送记录（游标分页）
+
+    ?key=单号&key_name=deliveryOrderCode&queue_name=...&success=false&start=2025-08-18 00:00:00&end=...
+    &limit=50&cursor=上一页返回的next_cursor&include_message=false
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        cursor = request.args.get('cursor')
+        success = request.args.get('success')
+        result = dashboard_manager.search_rabbitmq_logs(
+            limit=limit,
+            cursor=int(cursor) if cursor else None,
+            include_message=request.args.get('include_message', 'false').lower() in ('1', 'true', 'yes'),
+            queue_name=request.args.get('queue_name') or None,
+            success=None if success in (None, '') else success.lower() in ('1', 'true', 'yes'),
+            start=parse_time(request.args.get('start')),
+            end=parse_time(request.args.get('end')),
+            key=request.args.get('key', '').strip() or None,
+            key_name=request.args.get('key_name') or None
+        )
+        return jsonify({'status': 'success', **result})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'参数错误: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': f'查询失败: {str(e)}'}), 500
+
+
+@dashboard_bp.route('/get_push_record/<int:seq>')
+def get_push_record(seq):
+    """按序号获取单条推送记录（含完整报文）"""
+    record = dashboard_manager.get_rabbitmq_log(seq)
+    if record is None:
+        return jsonify({'status': 'error', 'message': f'记录不存在: {seq}'}), 404
+    return jsonify({'status': 'success', 'data': record})
@@ -1,9 +1,15 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, jsonify
 from config import config  # 导入配置实例
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, request_data, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, CODE, QTY
 import logging
-import json
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -11,12 +17,119 @@ logger = logging.getLogger(__name__)
 exchange_order_bp = Blueprint('exchange_order', __name__, url_prefix='/exchange_order')
 
 
+# ==================== 输入结构 ====================
+# 明细字段platformOutSkuCode0、num0……（序号从0开始），退回物流信息选填
+register_schema('exchange_order', fields=[
+    Field('platformOrderNo'),
+    Field('platformExchangeNo'),
+    Field('platformStatus'),
+    Field('platformId'),
+    Field('storeId'),
+    Field('applyNum'),
+    Field('platformInSkuId'),
+    Field('platformNo'),
+    Field('backExpressNo', required=False),
+    Field('backExpressName', required=False)
+], details=[
+    Field('platformOutSkuCode'),
+    Field('num')
+], detail_base=0)
+
+
+# ==================== 输出结构 ====================
+# 换货单：换货单号、平台单号与换入/换出商品
+register_output_schema(config.EXCHANGE_ORDER_QUEUE, {
+    'type': 'object',
+    'required': ['platformExchangeNo', 'platformOrderNo', 'storeId', 'exchangeSkuList', 'exchangeSkuOutList'],
+    'properties': {
+        'platformExchangeNo': CODE,
+        'platformOrderNo': CODE,
+        'storeId': CODE,
+        'exchangeSkuList': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'required': ['platformInSkuId', 'applyNum'],
+                'properties': {'platformInSkuId': CODE, 'applyNum': QTY}
+            }
+        },
+        'exchangeSkuOutList': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'required': ['platformOutSkuCode', 'num'],
+                'properties': {'platformOutSkuCode': CODE, 'num': QTY}
+            }
+        }
+    }
+})
+
+
+# ==================== 辅助函数 ====================
+def build_message(fields, back_sku, details, current_time):
+    """合并预设参数与用户输入，生成换货单消息
+
+    back_sku为退回商品信息，details为换出商品列表
+    """
+    return {
+        **config.EXCHANGE_ORDER_PRESET,
+        'applyTime': current_time,
+        'applyUpdateTime': current_time,
+        **fields,
+        # 处理退回商品信息
+        'exchangeSkuList': [back_sku],
+        # 处理换出商品列表
+        'exchangeSkuOutList': details
+    }
+
+
+@register_generator('exchange_order', config.EXCHANGE_ORDER_QUEUE, '换货单生成',
+                    required_fields=('platformOrderNo', 'platformExchangeNo', 'storeId', 'exchangeSkuList[].platformInSkuId', 'exchangeSkuOutList[].platformOutSkuCode', 'exchangeSkuOutList[].num'))
+def generate(ctx, params):
+    """批量生成换货单消息：平台单号与换货单号唯一，换出SKU按权重采样"""
+    store = ctx.sample_store() or {}
+    lines = sample_order_lines(ctx, params)
+    back_sku, back_qty = lines[0]
+    return build_message({
+        'platformOrderNo': params.get('platform_order_no') or ctx.code('platformOrderNo'),
+        'platformExchangeNo': ctx.code('platformExchangeNo'),
+        'platformStatus': params.get('platform_status', 'WAIT_SELLER_AGREE'),
+        'platformId': params.get('platform_id', '1'),
+        'storeId': params.get('store_id') or store.get('store_id', ''),
+        'backExpressNo': ctx.code('expressCode'),
+        'backExpressName': params.get('back_express_name', '中通快运')
+    }, {
+        'applyNum': str(back_qty),
+        'platformInSkuId': back_sku['sku_code'],
+        'platformNo': ctx.code('platformNo')
+    }, [{'platformOutSkuCode': sku['sku_code'], 'num': str(qty)} for sku, qty in lines],
+        ctx.format_time('%Y-%m-%dT%H:%M:%S'))
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条输入（表单或JSON对象）并生成最终消息，单条提交与批量提交共用"""
+    # 1. 按输入结构解析并校验基础字段与明细（platformOutSkuCode、num）
+    fields, details = parse_request('exchange_order', data)
+    # 2. 获取当前时间，格式为ISO格式（提供seed时由基准时钟决定）
+    current_time = context_from_request(data).format_time('%Y-%m-%dT%H:%M:%S')
+    # 3. 合并预设参数与用户输入
+    return build_message({
+        name: fields[name] for name in ('platformOrderNo', 'platformExchangeNo', 'platformStatus', 'platformId',
+                                        'storeId', 'backExpressNo', 'backExpressName')
+    }, {
+        name: fields[name] for name in ('applyNum', 'platformInSkuId', 'platformNo')
+    }, details, current_time)
+
+
 # ==================== 路由函数 ====================
 # 换货单生成页面（GET请求）
 @exchange_order_bp.route('/')
 def index():
     """换货单生成页面"""
-    return render_template('exchange_order.html', preset=config.EXCHANGE_ORDER_PRESET)
+    return render_cached('exchange_order.html', preset=config.EXCHANGE_ORDER_PRESET)
 
 
 # 换货单生成接口（POST请求）
@@ -24,84 +137,21 @@ def index():
 def submit():
     """换货单生成接口"""
     try:
-        # 1. 获取用户输入（基础字段）
-        platform_order_no = request.form.get('platformOrderNo')
-        platform_exchange_no = request.form.get('platformExchangeNo')
-        platform_status = request.form.get('platformStatus')
-        platform_id = request.form.get('platformId')
-        store_id = request.form.get('storeId')
-        apply_num = request.form.get('applyNum')
-        platform_in_sku_id = request.form.get('platformInSkuId')
-        platform_no = request.form.get('platformNo')
-        back_express_no = request.form.get('backExpressNo')
-        back_express_name = request.form.get('backExpressName')
-        detail_count = int(request.form.get('detail_count', 1))
-
-        # 2. 验证必填字段
-        required_fields = {
-            'platformOrderNo': platform_order_no,
-            'platformExchangeNo': platform_exchange_no,
-            'platformStatus': platform_status,
-            'platformId': platform_id,
-            'storeId': store_id,
-            'applyNum': apply_num,
-            'platformInSkuId': platform_in_sku_id,
-            'platformNo': platform_no
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            return jsonify({
-                'status': 'error',
-                'message': f'缺少必填字段: {"|".join(missing_fields)}'
-            }), 400
-
-        # 3. 获取动态明细
-        details = []
-        for i in range(detail_count):
-            platform_out_sku_code = request.form.get(f'platformOutSkuCode{i}')
-            num = request.form.get(f'num{i}')
-            
-            # 验证明细字段
-            if not all([platform_out_sku_code, num,]):
-                return jsonify({
-                    'status': 'error',
-                    'message': f'明细 {i+1} 缺少必填字段'
-                }), 400
-            
-            details.append({
-                'platformOutSkuCode': platform_out_sku_code,
-                'num': num
-            })
+        values = request_data()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(values, list):
+            return submit_batch(config.EXCHANGE_ORDER_QUEUE, values, message_from_input)
 
-        # 4. 获取当前时间，格式为ISO格式
-        current_time = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
-
-        # 5. 合并预设参数与用户输入
-        message_data = {
-            **config.EXCHANGE_ORDER_PRESET,
-            'applyTime': current_time,
-            'applyUpdateTime': current_time,
-            'platformOrderNo': platform_order_no,
-            'platformExchangeNo': platform_exchange_no,
-            'platformStatus': platform_status,
-            'platformId': platform_id,
-            'storeId': store_id,
-            'backExpressNo': back_express_no,
-            'backExpressName': back_express_name,
-            # 处理退回商品信息
-            'exchangeSkuList': [{
-                'applyNum': apply_num,
-                'platformInSkuId': platform_in_sku_id,
-                'platformNo': platform_no
-            }],
-            # 处理换出商品列表
-            'exchangeSkuOutList': details
-        }
+        # 1-3. 校验输入并生成最终消息
+        message_data = message_from_input(values)
+        platform_exchange_no = message_data['platformExchangeNo']
 
-        logger.info(f"最终推送给RabbitMQ的报文: {json.dumps(message_data, ensure_ascii=False)}")
+        logger.debug("最终推送给RabbitMQ的报文: %s", payload(message_data))
 
-        # 6. 推送消息到RabbitMQ
+        # 4. 推送消息到RabbitMQ
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run():
+            return dry_run_response(config.EXCHANGE_ORDER_QUEUE, message_data)
         success = push_message(config.EXCHANGE_ORDER_QUEUE, message_data)
         
         if success:
@@ -119,6 +169,9 @@ def submit():
                 'message': '消息推送失败，请检查RabbitMQ连接'
             }), 500
 
+    except ValidationError as e:
+        logger.warning(f"请求验证失败: {str(e)}")
+        return validation_error_response(e)
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/12 11:00
+# file: id_service.py
+# 业务编码发放路由文件
+from flask import Blueprint, request, jsonify
+from config import config
+from app.utils.id_generator import get_id_generator
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ==================== 蓝图定义 ====================
+id_service_bp = Blueprint('id_service', __name__, url_prefix='/id_service')
+
+
+# ==================== 路由函数 ====================
+# 获取业务编码接口（GET请求）
+@id_service_bp.route('/next', methods=['GET'])
+def next_codes():
+    """批量获取唯一业务编码，例如 /id_service/next?code_type=deliveryOrderCode&count=100"""
+    try:
+        code_type = request.args.get('code_type', 'businessNo')
+        count = int(request.args.get('count', 1))
+
+        if code_type not in config.ID_CODE_FORMATS:
+            return jsonify({
+                'status': 'error',
+                'message': f'不支持的编码类型: {code_type}，可选: {", ".join(config.ID_CODE_FORMATS)}'
+            }), 400
+
+        if count < 1 or count > config.ID_MAX_BATCH:
+            return jsonify({
+                'status': 'error',
+                'message': f'获取数量必须在1到{config.ID_MAX_BATCH}之间'
+            }), 400
+
+        generator = get_id_generator()
+        codes = generator.reserve_codes(code_type, count)
+        return jsonify({
+            'status': 'success',
+            'code_type': code_type,
+            'shard_id': generator.shard_id,
+            'codes': codes
+        })
+
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'参数格式错误: {str(e)}'
+        }), 400
+    except Exception as e:
+        logger.error(f"业务编码生成异常: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'系统错误: {str(e)}'
+        }), 500
+
+
+# 获取可用编码类型（GET请求）
+@id_service_bp.route('/types', methods=['GET'])
+def code_types():
+    """列出已配置的编码类型及其格式"""
+    return jsonify({
+        'status': 'success',
+        'types': config.ID_CODE_FORMATS
+    })
@@ -1,27 +1,197 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, request, jsonify, url_for, Response, stream_with_context
 import logging
 import json
-import requests
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import time
 from config import config
+from app.utils.generation import context_from_request
+from app.utils.dry_run import is_dry_run, request_flag
+from app.utils.jobs import submit_job, get_job_store, FINISHED_STATUSES
+from app.utils.http_client import get_gateway_client
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.timing import timed, stage
+from app.utils.schema import Field, register_schema, get_schema, parse_request, ValidationError, validation_error_response
+from app.utils.schema import request_data as read_request_data
 
-# 设置当前模块的日志级别为DEBUG
-existing_logger = logging.getLogger()
-existing_logger.setLevel(logging.DEBUG)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 # ==================== 蓝图定义 ====================
 inventory_adjustment_bp = Blueprint('inventory_adjustment', __name__, url_prefix='/inventory_adjustment')
 
+# ==================== 输入结构 ====================
+# 单行调整：数量为正整数，apiEnv默认测试环境
+register_schema('inventory_adjustment', fields=[
+    Field('skuCode'),
+    Field('quantity', 'int', min=1),
+    Field('warehouseCode'),
+    Field('apiEnv', required=False, default='test')
+])
+
+
+# ==================== 辅助函数 ====================
+def build_detail_line(line_no, sku_code, quantity, source_code):
+    """构建saveArrival的一行到货明细"""
+    return {
+        "actualArrivalNumber": quantity,
+        "batchCode": "1",
+        "lineNo": str(line_no),
+        "planArrivalNumber": quantity,
+        "productDate": "2025-07-01",
+        "sampleQuality": 7,
+        "skuCode": sku_code,
+        "sourceCode": source_code,
+        "volume": 1,
+        "weight": 1
+    }
+
+
+@timed('build')
+def build_request_data(business_no, warehouse_code, details, current_time):
+    """构建saveArrival请求参数，每行明细体积、重量均为1"""
+    return {
+        "appointmentNo": "",
+        "businessNo": business_no,
+        "checkMethod": "20",
+        "detailList": details,
+        "forecastArrivalTime": current_time,
+        "forecastDeliveryTime": current_time,
+        "isCallCar": 0,
+        "orderCreator": "LY",
+        "remark": "LY",
+        "sourceType": "WWJG",
+        "supplierCode": "CO00049541",
+        "totalVolume": len(details),
+        "totalWeight": len(details),
+        "warehouseCode": warehouse_code,
+        "warehouseOutCode": warehouse_code
+    }
+
+
+def parse_batch_items(items):
+    """按输入结构逐行校验批量调整行（与单行提交的校验和错误信息一致），返回 (有效行列表, 每行结果列表)；无效行直接记入结果"""
+    rows = []
+    results = []
+    with stage('parse'):
+        parsed_items = get_schema('inventory_adjustment').parse_many(items)
+    for row, parsed, error in parsed_items:
+        item = items[row] if isinstance(items[row], dict) else {}
+        result = {'row': row, 'skuCode': item.get('skuCode'), 'warehouseCode': item.get('warehouseCode'),
+                  'quantity': item.get('quantity')}
+        if error is not None:
+            result.update({'status': 'invalid', 'message': str(error), 'errors': error.errors})
+        else:
+            fields, _ = parsed
+            result.update({'skuCode': fields['skuCode'], 'warehouseCode': fields['warehouseCode'],
+                           'quantity': fields['quantity']})
+            rows.append(result)
+        results.append(result)
+    return rows, results
+
+
+def group_batch_rows(rows, group_size):
+    """按仓库分组，每组最多group_size行，返回 [(仓库编码, [行, ...]), ...]"""
+    by_warehouse = {}
+    for row in rows:
+        by_warehouse.setdefault(row['warehouseCode'], []).append(row)
+    groups = []
+    for warehouse_code, warehouse_rows in by_warehouse.items():
+        for start in range(0, len(warehouse_rows), group_size):
+            groups.append((warehouse_code, warehouse_rows[start:start + group_size]))
+    return groups
+
+
+def save_arrival(api_env, api_url, request_data):
+    """调用网关saveArrival，返回 (响应数据, HTTP状态码)；同步接口与后台任务共用"""
+    try:
+        logger.info(f"开始调用外部API: {api_url}")
+        # 复用进程内连接池，长连接避免每次TLS握手
+        result = get_gateway_client().post_json(api_env, config.SRM_SAVE_ARRIVAL_PATH, request_data)
+        logger.info("外部API调用成功，返回数据: %s", payload(result))
+    except Exception as api_error:
+        logger.error(f"外部API调用失败: {str(api_error)}")
+        return {
+            'status': 'error',
+            'message': f'请求处理失败: {str(api_error)}',
+            'requestParams': request_data,
+            'errorType': str(type(api_error).__name__)
+        }, 500
+
+    logger.info(f"请求处理成功，返回状态: success")
+    return {
+        'status': 'success',
+        'message': '库存调整请求已成功提交',
+        'data': result,
+        'requestParams': request_data,
+        'timestamp': datetime.now().isoformat(),
+        'requestId': str(uuid.uuid4())
+    }, 200
+
+
+def save_arrival_batch(api_env, api_url, batch_requests, results, concurrency):
+    """有限并发调用网关，共享同一个连接池，返回 (响应数据, HTTP状态码)
+
+    与其他接口的批量提交一致，部分行无效或失败时仍返回200，status为error，逐行结果见results
+    """
+    gateway = get_gateway_client()
+    start_time = time.time()
+    success_groups = 0
+    if batch_requests:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batch_requests))) as executor:
+            futures = {
+                executor.submit(gateway.post_json, api_env, config.SRM_SAVE_ARRIVAL_PATH, request_data): group_rows
+                for group_rows, request_data in batch_requests
+            }
+            for future in as_completed(futures):
+                group_rows = futures[future]
+                try:
+                    response = future.result()
+                    success_groups += 1
+                    for row in group_rows:
+                        row.update({'status': 'success', 'response': response})
+                except Exception as api_error:
+                    logger.error(f"批量库存调整分组失败: businessNo={group_rows[0]['businessNo']}, 错误: {str(api_error)}")
+                    for row in group_rows:
+                        row.update({'status': 'error', 'message': str(api_error)})
+    elapsed_time = time.time() - start_time
+
+    failed_count = sum(1 for result in results if result['status'] != 'success')
+    logger.info(f"批量库存调整完成: 行数={len(results)}, 分组={len(batch_requests)}, 成功分组={success_groups}, 耗时={elapsed_time:.2f}秒")
+    return {
+        'status': 'success' if failed_count == 0 else 'error',
+        'message': f'共{len(results)}行，失败{failed_count}行',
+        'api_url': api_url,
+        'group_count': len(batch_requests),
+        'success_group_count': success_groups,
+        'failed_count': failed_count,
+        'elapsed': round(elapsed_time, 3),
+        'results': results
+    }, 200
+
+
+def dispatch(kind, fn, *args, values=None):
+    """同步执行fn并返回结果；请求带async=true时提交到后台线程池，立即返回202和任务ID"""
+    if request_flag(('async', 'asyncMode'), values):
+        job = submit_job(kind, fn, *args)
+        return jsonify({
+            'status': 'accepted',
+            'message': '库存调整请求已受理，正在后台处理',
+            'requestId': job['jobId'],
+            'statusUrl': url_for('inventory_adjustment.job_status', job_id=job['jobId']),
+            'eventsUrl': url_for('inventory_adjustment.job_events', job_id=job['jobId'])
+        }), 202
+    body, http_status = fn(*args)
+    return jsonify(body), http_status
+
+
 # ==================== 路由函数 ====================
 # 库存调整页面（GET请求）
 @inventory_adjustment_bp.route('/')
 def index():
     """库存调整页面"""
-    return render_template('inventory_adjustment.html')
+    return render_cached('inventory_adjustment.html')
 
 # 库存调整接口（POST请求）
 @inventory_adjustment_bp.route('/submit', methods=['POST'])
@@ -31,111 +201,58 @@ def submit():
         # 记录请求开始
         logger.info(f"收到库存调整请求，请求方法: POST, 客户端IP: {request.remote_addr}")
         
-        # 1. 获取用户输入
-        sku_code = request.form.get('skuCode')
-        quantity = int(request.form.get('quantity', 0))
-        warehouse_code = request.form.get('warehouseCode')
-        api_env = request.form.get('apiEnv', 'test')  # 默认测试环境
-        
+        # 1. 按输入结构解析并校验用户输入（skuCode、正整数quantity、warehouseCode、apiEnv）
+        values = read_request_data()
+        # JSON数组：按批量调整处理（apiEnv、groupSize、seed等从查询参数读取）
+        if isinstance(values, list):
+            return adjust_batch({**request.args.to_dict(), 'items': values})
+        fields, _ = parse_request('inventory_adjustment', values)
+        sku_code = fields['skuCode']
+        quantity = fields['quantity']
+        warehouse_code = fields['warehouseCode']
+        api_env = fields['apiEnv']
+
         # 详细记录用户输入
         logger.info(f"用户输入参数: sku_code={sku_code}, quantity={quantity}, warehouse_code={warehouse_code}, api_env={api_env}")
         
-        # 2. 验证必填字段
-        required_fields = {
-            'skuCode': sku_code,
-            'quantity': quantity,
-            'warehouseCode': warehouse_code
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            logger.warning(f'请求验证失败: 缺少必填字段 {", ".join(missing_fields)}')
-            return jsonify({
-                'status': 'error',
-                'message': f'缺少必填字段: {", ".join(missing_fields)}'
-            }), 400
-        
-        # 3. 选择API地址
-        api_url = (
-            'https://gateway-test.babycare.com/open/srm/purchase/saveArrival'
-            if api_env == 'test' else
-            'https://gateway-uat.babycare.com/open/srm/purchase/saveArrival'
-        )
+        # 3. 选择API地址（网关地址见config.SRM_GATEWAY_URLS）
+        api_url = get_gateway_client().url(api_env, config.SRM_SAVE_ARRIVAL_PATH)
         
         logger.info(f"根据环境选择API地址: {api_url}")
         
-        # 4. 生成动态参数
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        # 使用更可靠的方式生成唯一business_no
-        business_no = str(uuid.uuid4()).replace('-', '')[:13]  # 生成13位唯一编号
-        # 确保source_code唯一性，添加时间戳后几位
-        time_suffix = str(int(time.time() * 1000))[-5:]
-        source_code = f"{business_no}{time_suffix}"  # 生成唯一的sourceCode
+        # 4. 生成动态参数（提供seed时由种子和messageIndex决定，保证可复现）
+        ctx = context_from_request(values)
+        current_time = ctx.format_time()
+        # 实时模式下通过ID生成器获取跨worker唯一的businessNo和sourceCode
+        business_no = ctx.code('businessNo')
+        source_code = ctx.code('sourceCode')
         
         logger.debug(f"生成动态参数: business_no={business_no}, source_code={source_code}, current_time={current_time}")
         
         # 5. 构建请求参数
-        request_data = {
-            "appointmentNo": "",
-            "businessNo": business_no,
-            "checkMethod": "20",
-            "detailList": [
-                {
-                    "actualArrivalNumber": quantity,
-                    "batchCode": "1",
-                    "lineNo": "1",
-                    "planArrivalNumber": quantity,
-                    "productDate": "2025-07-01",
-                    "sampleQuality": 7,
-                    "skuCode": sku_code,
-                    "sourceCode": source_code,
-                    "volume": 1,
-                    "weight": 1
-                }
-            ],
-            "forecastArrivalTime": current_time,
-            "forecastDeliveryTime": current_time,
-            "isCallCar": 0,
-            "orderCreator": "LY",
-            "remark": "LY",
-            "sourceType": "WWJG",
-            "supplierCode": "CO00049541",
-            "totalVolume": 1,
-            "totalWeight": 1,
-            "warehouseCode": warehouse_code,
-            "warehouseOutCode": warehouse_code
-        }
+        request_data = build_request_data(
+            business_no, warehouse_code, [build_detail_line(1, sku_code, quantity, source_code)], current_time
+        )
         
         # 6. 记录请求日志
-        logger.info(f"提交库存调整请求: URL={api_url}, 参数={json.dumps(request_data)}")
-        
-        # 7. 调用外部API（实际环境中会取消注释）
-        try:
-            # 实际API调用
-            logger.info(f"开始调用外部API: {api_url}")
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(api_url, json=request_data, headers=headers, timeout=30)
-            logger.info(f"外部API响应状态码: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            logger.info(f"外部API调用成功，返回数据: {json.dumps(result)[:500]}...")
-        except Exception as api_error:
-            logger.error(f"外部API调用失败: {str(api_error)}")
-            raise
+        logger.info("提交库存调整请求: URL=%s, 参数=%s", api_url, payload(request_data))
         
-        # 8. 构建并返回响应
-        response_data = {
-            'status': 'success',
-            'message': '库存调整请求已成功提交',
-            'data': result,
-            'requestParams': request_data,
-            'timestamp': datetime.now().isoformat(),
-            'requestId': str(uuid.uuid4())
-        }
-        
-        logger.info(f"请求处理成功，返回状态: success")
-        return jsonify(response_data)
+        # 演练模式：只返回组装好的请求参数，不调用外部API
+        if is_dry_run():
+            return jsonify({
+                'status': 'success',
+                'message': '演练模式：请求参数已构建，未调用外部API',
+                'dry_run': True,
+                'api_url': api_url,
+                'requestParams': request_data
+            })
+
+        # 7. 调用外部API（async=true时放到后台线程池，立即返回任务ID）
+        return dispatch('inventory_adjustment', save_arrival, api_env, api_url, request_data)
         
+    except ValidationError as e:
+        logger.warning(f'请求验证失败: {str(e)}')
+        return validation_error_response(e)
     except ValueError as val_error:
         logger.error(f"数据验证错误: {str(val_error)}")
         return jsonify({
@@ -152,6 +269,120 @@ def submit():
             'errorType': str(type(e).__name__)
         }), 500
 
+# 批量库存调整接口（POST请求）
+@inventory_adjustment_bp.route('/batch', methods=['POST'])
+def batch_submit():
+    """批量库存调整：按仓库合并为多行detailList，多组并发调用网关，返回逐行结果
+
+    请求体: {"apiEnv": "test", "items": [{"skuCode": "...", "quantity": 100, "warehouseCode": "DCN"}, ...],
+             "groupSize": 50, "concurrency": 8}
+    """
+    return adjust_batch(request.get_json(silent=True) or {})
+
+
+def adjust_batch(data):
+    """批量库存调整的处理过程，/batch 与 /submit 的JSON数组请求体共用"""
+    try:
+        api_env = data.get('apiEnv', 'test')
+        items = data.get('items') or []
+        if not isinstance(items, list) or not items:
+            raise ValueError('items不能为空')
+        if len(items) > config.SRM_BATCH_MAX_ITEMS:
+            raise ValueError(f'单次最多调整{config.SRM_BATCH_MAX_ITEMS}行')
+        group_size = min(max(int(data.get('groupSize') or config.SRM_BATCH_GROUP_SIZE), 1), config.SRM_BATCH_GROUP_SIZE)
+        concurrency = min(max(int(data.get('concurrency') or config.SRM_BATCH_CONCURRENCY), 1), config.SRM_POOL_MAXSIZE)
+
+        api_url = get_gateway_client().url(api_env, config.SRM_SAVE_ARRIVAL_PATH)
+        logger.info(f"收到批量库存调整请求: 行数={len(items)}, 环境={api_env}, 每组行数={group_size}, 并发={concurrency}")
+
+        # 1. 校验并按仓库分组
+        rows, results = parse_batch_items(items)
+        groups = group_batch_rows(rows, group_size)
+
+        # 2. 每组构建一个多行请求（编码在主线程生成，提供seed时可复现）
+        ctx = context_from_request(data)
+        current_time = ctx.format_time()
+        batch_requests = []
+        for warehouse_code, group_rows in groups:
+            details = []
+            for line_no, row in enumerate(group_rows, 1):
+                details.append(build_detail_line(line_no, row['skuCode'], row['quantity'], ctx.code('sourceCode')))
+                row['lineNo'] = str(line_no)
+            request_data = build_request_data(ctx.code('businessNo'), warehouse_code, details, current_time)
+            for row in group_rows:
+                row['businessNo'] = request_data['businessNo']
+            batch_requests.append((group_rows, request_data))
+
+        if is_dry_run(data):
+            return jsonify({
+                'status': 'success',
+                'message': '演练模式：请求参数已构建，未调用外部API',
+                'dry_run': True,
+                'api_url': api_url,
+                'results': results,
+                'requests': [request_data for _, request_data in batch_requests]
+            })
+
+        # 3. 有限并发调用网关（async=true时放到后台线程池）
+        return dispatch('inventory_adjustment_batch', save_arrival_batch, api_env, api_url, batch_requests, results,
+                        concurrency, values=data)
+
+    except ValidationError as e:
+        logger.warning(f'请求验证失败: {str(e)}')
+        return validation_error_response(e)
+    except ValueError as val_error:
+        logger.error(f"数据验证错误: {str(val_error)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'数据格式错误: {str(val_error)}'
+        }), 400
+    except Exception as e:
+        logger.error(f"批量库存调整处理失败: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'请求处理失败: {str(e)}',
+            'errorType': str(type(e).__name__)
+        }), 500
+
+# 后台任务状态（GET请求）
+@inventory_adjustment_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """轮询异步库存调整结果，完成后result与同步接口的返回一致"""
+    job = get_job_store().get(job_id) if job_id.isalnum() else None
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'任务不存在或已过期: {job_id}'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'job': job
+    })
+
+
+# 后台任务事件流（GET请求，SSE）
+@inventory_adjustment_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """以Server-Sent Events推送任务状态，任务结束时发送result事件后关闭"""
+    store = get_job_store()
+    if not job_id.isalnum() or store.get(job_id) is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'任务不存在或已过期: {job_id}'
+        }), 404
+
+    def stream():
+        for job in store.watch(job_id, timeout=config.SRM_READ_TIMEOUT * 2 + 30):
+            if job is None:
+                yield ': keep-alive\n\n'
+                continue
+            event = 'result' if job['status'] in FINISHED_STATUSES else 'status'
+            yield f"event: {event}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 # 获取预设参数接口
 @inventory_adjustment_bp.route('/get-preset', methods=['GET'])
 def get_preset():
@@ -200,7 +431,7 @@ def get_preset():
         }
         
         logger.info("预设参数生成成功，准备返回数据")
-        logger.debug(f"返回的预设数据: {json.dumps(preset_data, ensure_ascii=False)}")
+        logger.debug("返回的预设数据: %s", payload(preset_data))
         
         return jsonify({
             'status': 'success',
@@ -1,10 +1,16 @@
 # app/routes/inventory_entry.py
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, jsonify
 from config import config  # 导入配置实例
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, request_data, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, ENTRY_ORDER, ORDER_LINES
 import logging
-import json
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -12,12 +18,87 @@ logger = logging.getLogger(__name__)
 inventory_entry_bp = Blueprint('inventory_entry', __name__, url_prefix='/inventory_entry')
 
 
+# ==================== 输入结构 ====================
+# 明细字段itemCode0、actualQty0……（序号从0开始）
+register_schema('inventory_entry', fields=[
+    Field('entryOrderCode')
+], details=[
+    Field('itemCode'),
+    Field('actualQty')
+], detail_base=0)
+
+
+# ==================== 输出结构 ====================
+# 其他入库：入库单号、仓库与入库明细
+register_output_schema(config.INVENTORY_ENTRY_QUEUE, {
+    'type': 'object',
+    'required': ['callbackResponse'],
+    'properties': {
+        'callbackResponse': {
+            'type': 'object',
+            'required': ['entryOrder', 'orderLines'],
+            'properties': {
+                'entryOrder': ENTRY_ORDER,
+                'orderLines': ORDER_LINES
+            }
+        }
+    }
+})
+
+
+# ==================== 辅助函数 ====================
+def build_message(entry_order_code, details, current_time):
+    """合并预设参数与用户输入，生成其他入库消息"""
+    return {
+        **config.INVENTORY_ENTRY_PRESET,
+        'entryOrderCode': entry_order_code,
+        'callbackResponse': {
+            **config.INVENTORY_ENTRY_PRESET['callbackResponse'],
+            'entryOrder': {
+                **config.INVENTORY_ENTRY_PRESET['callbackResponse']['entryOrder'],
+                'entryOrderCode': entry_order_code,
+                'entryOrderId': entry_order_code,
+                'outBizCode': entry_order_code,
+                'operateTime': current_time
+            },
+            'orderLines': [
+                {
+                    **{k: v for k, v in config.INVENTORY_ENTRY_PRESET['callbackResponse']['orderLines'][0].items()},
+                    'itemCode': detail['itemCode'],
+                    'actualQty': int(detail['actualQty'])
+                } for detail in details
+            ]
+        }
+    }
+
+
+@register_generator('inventory_entry', config.INVENTORY_ENTRY_QUEUE, '其他入库',
+                    required_fields=('entryOrderCode', 'callbackResponse.entryOrder.entryOrderCode', 'callbackResponse.orderLines[].itemCode', 'callbackResponse.orderLines[].actualQty'))
+def generate(ctx, params):
+    """批量生成其他入库消息：入库单号唯一，SKU按预设仓库加权采样"""
+    warehouse_code = config.INVENTORY_ENTRY_PRESET['callbackResponse']['entryOrder']['warehouseCode']
+    details = [{'itemCode': sku['sku_code'], 'actualQty': qty}
+               for sku, qty in sample_order_lines(ctx, params, warehouse_code)]
+    return build_message(ctx.code('entryOrderCode'), details, ctx.format_time())
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条输入（表单或JSON对象）并生成最终消息，单条提交与批量提交共用"""
+    # 1. 按输入结构解析并校验基础字段与明细（itemCode、actualQty）
+    fields, details = parse_request('inventory_entry', data)
+    # 2. 获取当前时间（提供seed时由基准时钟决定）
+    current_time = context_from_request(data).format_time()
+    # 3. 合并预设参数与用户输入
+    return build_message(fields['entryOrderCode'], details, current_time)
+
+
 # ==================== 路由函数 ====================
 # 其他入库页面（GET请求）
 @inventory_entry_bp.route('/')
 def index():
     """其他入库页面"""
-    return render_template('inventory_entry.html', preset=config.INVENTORY_ENTRY_PRESET)
+    return render_cached('inventory_entry.html', preset=config.INVENTORY_ENTRY_PRESET)
 
 
 # 其他入库接口（POST请求）
@@ -25,71 +106,22 @@ def index():
 def submit():
     """其他入库接口"""
     try:
-        # 1. 获取用户输入（基础字段）
-        entry_order_code = request.form.get('entryOrderCode')
-        detail_count = int(request.form.get('detail_count', 1))
-
-        # 2. 验证必填字段
-        required_fields = {
-            'entryOrderCode': entry_order_code
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            return jsonify({
-                'status': 'error',
-                'message': f'缺少必填字段: {", ".join(missing_fields)}'
-            }), 400
-
-        # 3. 获取动态明细（itemCode、actualQty）
-        details = []
-        for i in range(detail_count):
-            item_code = request.form.get(f'itemCode{i}')
-            actual_qty = request.form.get(f'actualQty{i}')
-            
-            # 验证明细字段
-            if not all([item_code, actual_qty]):
-                return jsonify({
-                    'status': 'error',
-                    'message': f'明细 {i+1} 缺少必填字段'
-                }), 400
-                
-            details.append({
-                'itemCode': item_code,
-                'actualQty': actual_qty
-            })
+        values = request_data()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(values, list):
+            return submit_batch(config.INVENTORY_ENTRY_QUEUE, values, message_from_input)
 
-        # 4. 获取当前时间
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        # 5. 合并预设参数与用户输入（生成最终消息）
-        message_data = {
-            **config.INVENTORY_ENTRY_PRESET,
-            'entryOrderCode': entry_order_code,
-            'callbackResponse': {
-                **config.INVENTORY_ENTRY_PRESET['callbackResponse'],
-                'entryOrder': {
-                    **config.INVENTORY_ENTRY_PRESET['callbackResponse']['entryOrder'],
-                    'entryOrderCode': entry_order_code,
-                    'entryOrderId': entry_order_code,
-                    'outBizCode': entry_order_code,
-                    'operateTime': current_time
-                },
-                'orderLines': [
-                    {
-                        **{k: v for k, v in config.INVENTORY_ENTRY_PRESET['callbackResponse']['orderLines'][0].items()},
-                        'itemCode': detail['itemCode'],
-                        'actualQty': int(detail['actualQty'])
-                    } for detail in details
-                ]
-            }
-        }
+        # 1-3. 校验输入并生成最终消息
+        message_data = message_from_input(values)
+        entry_order_code = message_data['entryOrderCode']
 
-        print("收到的 request.form:", dict(request.form))
-        print('最终推送给RabbitMQ的报文:', json.dumps(message_data, ensure_ascii=False))
+        logger.debug("最终推送给RabbitMQ的报文: %s", payload(message_data))
 
-        # 6. 推送消息到RabbitMQ
+        # 4. 推送消息到RabbitMQ
         logger.info(f"开始推送其他入库消息到队列: {config.INVENTORY_ENTRY_QUEUE}")
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run():
+            return dry_run_response(config.INVENTORY_ENTRY_QUEUE, message_data)
         success = push_message(config.INVENTORY_ENTRY_QUEUE, message_data)
         
         if success:
@@ -103,12 +135,15 @@ def submit():
         else:
             logger.error(f"其他入库消息推送失败: {entry_order_code}")
             logger.error(f"队列名称: {config.INVENTORY_ENTRY_QUEUE}")
-            logger.error(f"消息内容: {json.dumps(message_data, ensure_ascii=False)}")
+            logger.error("消息内容: %s", payload(message_data))
             return jsonify({
                 'status': 'error',
                 'message': '消息推送失败，请检查RabbitMQ连接和终端日志'
             }), 500
 
+    except ValidationError as e:
+        logger.warning(f"请求验证失败: {str(e)}")
+        return validation_error_response(e)
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({
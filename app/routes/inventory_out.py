@@ -3,17 +3,32 @@
 
 """其他出库功能后端逻辑"""
 
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, jsonify, current_app
 from datetime import datetime
 from config import config
 from app.utils.rabbitmq import push_message
+from app.utils.generation import context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, request_data, ValidationError, validation_error_response
 import logging
-import json
 
 logger = logging.getLogger(__name__)
 
 inventory_out_bp = Blueprint('inventory_out', __name__, url_prefix='/inventory_out')
 
+# 输入结构：明细字段itemCode0、actualQty0……（序号从0开始），detail_count必填且为1~100
+register_schema('inventory_out', fields=[
+    Field('deliveryOrderCode', max_length=100)
+], details=[
+    Field('itemCode'),
+    Field('actualQty', 'int', min=0)
+], detail_base=0, max_details=100, default_detail_count=0)
+# 输出结构与调拨出库共用（stock_out_back队列），在allocation_out中注册
+
 
 @inventory_out_bp.route('/')
 def index():
@@ -51,7 +66,7 @@ def index():
             }
         ]
 
-        return render_template(
+        return render_cached(
             'inventory_out.html',
             preset=preset_params,
             detail_fields=detail_fields,
@@ -67,115 +82,32 @@ def index():
 def submit():
     """处理其他出库表单提交"""
     try:
-        # 获取表单数据
-        form_data = request.form.to_dict()
-        logger.info(f"其他出库表单提交，数据: {form_data}")
-
-        # 表单验证 - 手动验证必填字段
-        delivery_order_code = form_data.get('deliveryOrderCode')
-        detail_count_str = form_data.get('detail_count')
-        
-        # 检查必填字段
-        required_fields = {}
-        if not delivery_order_code or len(delivery_order_code) > 100:
-            required_fields['deliveryOrderCode'] = '物流单号不能为空且长度不能超过100个字符'
-        
-        if not detail_count_str:
-            required_fields['detail_count'] = '明细数量不能为空'
-        else:
-            try:
-                detail_count = int(detail_count_str)
-                if detail_count < 1 or detail_count > 100:
-                    required_fields['detail_count'] = '明细数量必须在1到100之间'
-            except ValueError:
-                required_fields['detail_count'] = '明细数量必须为整数'
-        
-        if required_fields:
-            logger.warning(f"表单验证失败: {required_fields}")
-            return jsonify({'status': 'error', 'message': required_fields}), 400
-
-        # 获取预设参数
-        try:
-            preset_params = config.INVENTORY_OUT_PRESET
-        except AttributeError:
-            preset_params = {}
-            logger.warning("库存出库预设参数未找到，使用空字典")
-        
-        # 获取当前时间
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        # 构建完整的订单数据
-        order_data = {
-            'type': 2,
-            'callbackResponse': {
-                'apiMethodName': 'stockout.confirm',
-                'deliveryOrder': {
-                    'confirmType': 0,
-                    'deliveryOrderCode': form_data['deliveryOrderCode'],
-                    'operateTime': current_time,
-                    'orderConfirmTime': current_time,
-                    'orderType': 'DBCK',
-                    'outBizCode': form_data['deliveryOrderCode'],
-                    'ownerCode': 'XIER',
-                    'status': 'PARTDELIVERED',
-                    'warehouseCode': 'DCN'
-                },
-                'orderLines': [],
-                'responseClass': 'com.qimen.api.response.StockoutConfirmResponse',
-                'version': '2.0'
-            }
-        }
-
-        # 添加明细数据
-        detail_count = int(form_data['detail_count'])
-        order_lines = []
-
-        for i in range(detail_count):
-            # 验证明细字段
-            item_code_key = f'itemCode{i}'
-            actual_qty_key = f'actualQty{i}'
-
-            if item_code_key not in form_data or not form_data[item_code_key]:
-                logger.warning(f"明细 {i+1} 商品SKU缺失")
-                return jsonify({'status': 'error', 'message': f'明细 {i+1} 商品SKU不能为空'}), 400
-
-            if actual_qty_key not in form_data or not form_data[actual_qty_key]:
-                logger.warning(f"明细 {i+1} 实际数量缺失")
-                return jsonify({'status': 'error', 'message': f'明细 {i+1} 实际数量不能为空'}), 400
-
-            try:
-                actual_qty = int(form_data[actual_qty_key])
-                if actual_qty < 0:
-                    raise ValueError()
-            except ValueError:
-                logger.warning(f"明细 {i+1} 实际数量格式错误")
-                return jsonify({'status': 'error', 'message': f'明细 {i+1} 实际数量必须为非负整数'}), 400
-
-            line = {
-                'actualQty': str(actual_qty),
-                'inventoryType': 'ZP',
-                'itemCode': form_data[item_code_key],
-                'orderLineNo': str(i + 1),
-                'ownerCode': 'XIER'
-            }
-            order_lines.append(line)
+        form_data = request_data()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(form_data, list):
+            return submit_batch(config.INVENTORY_OUT_QUEUE, form_data, message_from_input)
 
-        order_data['callbackResponse']['orderLines'] = order_lines
+        # 校验输入并构建完整的订单数据
+        order_data = message_from_input(form_data)
+        delivery_order_code = order_data['callbackResponse']['deliveryOrder']['deliveryOrderCode']
 
         # 记录组装后的订单数据
-        logger.info(f"组装后的订单数据: {json.dumps(order_data, ensure_ascii=False, indent=2)}")
+        logger.debug("组装后的订单数据: %s", payload(order_data))
 
         # 推送RabbitMQ
-        rabbitmq_queue = 'stock_out_back'
+        rabbitmq_queue = config.INVENTORY_OUT_QUEUE
         try:
             # 推送消息到RabbitMQ
+            # 演练模式：只返回最终报文，不推送
+            if is_dry_run():
+                return dry_run_response(rabbitmq_queue, order_data)
             success = push_message(rabbitmq_queue, order_data)
             if not success:
                 raise Exception('消息推送返回失败状态')
             logger.info(f"消息已成功推送到RabbitMQ队列: {rabbitmq_queue}")
 
             # 记录操作日志
-            log_operation('inventory_out', form_data['deliveryOrderCode'], 'success', order_data)
+            log_operation('inventory_out', delivery_order_code, 'success', order_data)
 
             return jsonify({
                 'status': 'success',
@@ -183,17 +115,79 @@ def submit():
                 'data': order_data
             })
 
+        except ValidationError:
+            # 报文不符合输出结构（strict模式），按校验失败返回
+            raise
         except Exception as e:
             logger.error(f"RabbitMQ推送失败: {str(e)}")
             # 记录失败日志
-            log_operation('inventory_out', form_data['deliveryOrderCode'], 'failed', str(e))
+            log_operation('inventory_out', delivery_order_code, 'failed', str(e))
             return jsonify({'status': 'error', 'message': f'推送失败: {str(e)}'}), 500
 
+    except ValidationError as e:
+        logger.warning(f"表单验证失败: {str(e)}")
+        return validation_error_response(e)
     except Exception as e:
         logger.error(f"处理其他出库请求失败: {str(e)}")
         return jsonify({'status': 'error', 'message': f'系统错误: {str(e)}'}), 500
 
 
+def build_order_line(i, item_code, actual_qty):
+    """构建第i行（从0开始）出库明细"""
+    return {
+        'actualQty': str(actual_qty),
+        'inventoryType': 'ZP',
+        'itemCode': item_code,
+        'orderLineNo': str(i + 1),
+        'ownerCode': 'XIER'
+    }
+
+
+def build_message(delivery_order_code, order_lines, current_time):
+    """构建完整的其他出库订单数据"""
+    return {
+        'type': 2,
+        'callbackResponse': {
+            'apiMethodName': 'stockout.confirm',
+            'deliveryOrder': {
+                'confirmType': 0,
+                'deliveryOrderCode': delivery_order_code,
+                'operateTime': current_time,
+                'orderConfirmTime': current_time,
+                'orderType': 'DBCK',
+                'outBizCode': delivery_order_code,
+                'ownerCode': 'XIER',
+                'status': 'PARTDELIVERED',
+                'warehouseCode': 'DCN'
+            },
+            'orderLines': order_lines,
+            'responseClass': 'com.qimen.api.response.StockoutConfirmResponse',
+            'version': '2.0'
+        }
+    }
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条输入（表单或JSON对象）并构建出库报文，单条提交与批量提交共用"""
+    # 按输入结构解析并校验（物流单号、明细数量、各行SKU与非负整数数量）
+    fields, details = parse_request('inventory_out', data)
+    logger.debug("其他出库表单提交，数据: %s", payload({**fields, 'details': details}))
+    # 获取当前时间（提供seed时由基准时钟决定）
+    current_time = context_from_request(data).format_time()
+    order_lines = [build_order_line(i, detail['itemCode'], detail['actualQty']) for i, detail in enumerate(details)]
+    return build_message(fields['deliveryOrderCode'], order_lines, current_time)
+
+
+@register_generator('inventory_out', config.INVENTORY_OUT_QUEUE, '其他出库',
+                    required_fields=('callbackResponse.deliveryOrder.deliveryOrderCode', 'callbackResponse.orderLines[].itemCode', 'callbackResponse.orderLines[].actualQty'))
+def generate(ctx, params):
+    """批量生成其他出库消息：出库单号唯一，SKU按DCN仓加权采样"""
+    order_lines = [build_order_line(i, sku['sku_code'], qty)
+                   for i, (sku, qty) in enumerate(sample_order_lines(ctx, params, 'DCN'))]
+    return build_message(ctx.code('deliveryOrderCode'), order_lines, ctx.format_time())
+
+
 def merge_preset(target, preset):
     """合并预设参数，target中的值优先级更高"""
     if isinstance(target, dict) and isinstance(preset, dict):
@@ -205,6 +199,7 @@ def merge_preset(target, preset):
     return target
 
 
+@timed('log')
 def log_operation(operation_type, order_code, status, details=None):
     """记录操作日志"""
     try:
@@ -215,7 +210,7 @@ def log_operation(operation_type, order_code, status, details=None):
             'status': status,
             'details': details
         }
-        logger.info(f"操作日志: {json.dumps(log_entry, ensure_ascii=False)}")
+        logger.info("操作日志: %s", payload(log_entry))
     except Exception as e:
         # 即使日志记录失败也不影响主流程
         current_app.logger.error(f"记录操作日志失败: {str(e)}")
\ No newline at end of file
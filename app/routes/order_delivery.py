@@ -1,10 +1,16 @@
 from email import message
 import logging
-import datetime
 from jinja2.filters import K
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import GenerationContext, context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, CODE, NUMBER, DATETIME
 import json
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, request, jsonify
 from .. import config
 
 logger = logging.getLogger(__name__)
@@ -13,6 +19,77 @@ logger = logging.getLogger(__name__)
 order_delivery_bp = Blueprint('order_delivery', __name__, url_prefix='/order_delivery')
 
 
+# ==================== 输入结构 ====================
+# 表单先转换为回传报文（transform_form_data），再按本结构校验发货单与每个包裹的物流信息
+register_schema('order_delivery', fields=[
+    Field('deliveryOrderCode', path='callbackResponse.deliveryOrder.deliveryOrderCode'),
+    Field('warehouseCode', path='callbackResponse.deliveryOrder.warehouseCode')
+], details=[
+    Field('logisticsCode'),
+    Field('logisticsName'),
+    Field('expressCode')
+], detail_path='callbackResponse.packages')
+
+
+# ==================== 输出结构 ====================
+# 销售订单发货：数量、尺寸、重量为数值（由normalize_numeric_fields转换），每个包裹的物流信息必填
+register_output_schema(config.ORDER_DELIVERY_QUEUE, {
+    'type': 'object',
+    'required': ['callbackResponse'],
+    'properties': {
+        'callbackResponse': {
+            'type': 'object',
+            'required': ['deliveryOrder', 'orderLines', 'packages'],
+            'properties': {
+                'deliveryOrder': {
+                    'type': 'object',
+                    'required': ['deliveryOrderCode', 'warehouseCode', 'orderConfirmTime'],
+                    'properties': {
+                        'deliveryOrderCode': CODE,
+                        'warehouseCode': CODE,
+                        'orderConfirmTime': DATETIME
+                    }
+                },
+                'orderLines': {
+                    'type': 'array',
+                    'minItems': 1,
+                    'items': {
+                        'type': 'object',
+                        'required': ['itemCode', 'actualQty', 'planQty'],
+                        'properties': {
+                            'itemCode': CODE,
+                            'actualQty': NUMBER,
+                            'planQty': NUMBER,
+                            'batchs': {'type': 'array', 'items': {'type': 'object', 'properties': {'actualQty': NUMBER}}}
+                        }
+                    }
+                },
+                'packages': {
+                    'type': 'array',
+                    'minItems': 1,
+                    'items': {
+                        'type': 'object',
+                        'required': ['expressCode', 'logisticsCode', 'logisticsName'],
+                        'properties': {
+                            'expressCode': CODE,
+                            'logisticsCode': CODE,
+                            'logisticsName': CODE,
+                            'height': NUMBER,
+                            'length': NUMBER,
+                            'width': NUMBER,
+                            'weight': NUMBER,
+                            'volume': NUMBER,
+                            'items': {'type': 'array', 'items': {'type': 'object', 'properties': {'itemCode': CODE, 'quantity': NUMBER}}},
+                            'packageMaterialList': {'type': 'array', 'items': {'type': 'object', 'properties': {'quantity': NUMBER}}}
+                        }
+                    }
+                }
+            }
+        }
+    }
+})
+
+
 # ==================== 辅助函数 ====================
 def normalize_numeric_fields(data):
     """规范化JSON数据中的数值字段"""
@@ -53,8 +130,12 @@ def normalize_numeric_fields(data):
     return data
 
 
-def transform_form_data(data):
-    """将表单数据转换为后端期望的格式"""
+def transform_form_data(data, ctx=None):
+    """将表单数据转换为后端期望的格式
+
+    ctx为生成上下文，种子模式下时间字段由基准时钟决定，保证可复现
+    """
+    ctx = ctx or GenerationContext()
     # 直接从data中提取deliveryOrder和callbackResponse
     callback_response = data.get('callbackResponse', {})
     delivery_order = callback_response.get('deliveryOrder', {}) or data.get('deliveryOrder', {})
@@ -74,8 +155,7 @@ def transform_form_data(data):
             continue
 
         quantity = line.get('actualQty') or line.get('planQty', 0)
-        current_time = datetime.datetime.now()
-        expire_date = current_time .strftime('%Y-%m-%d')
+        expire_date = ctx.format_time('%Y-%m-%d')
 
         normalized_line = {
             'actualQty': str(quantity),
@@ -135,7 +215,7 @@ def transform_form_data(data):
                 'confirmType': 0,
                 'deliveryOrderCode': delivery_order_code,
                 'deliveryOrderId': delivery_order_id,
-                'orderConfirmTime': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'orderConfirmTime': ctx.format_time(),
                 'orderType': 'JYCK',
                 'outBizCode': out_biz_code,
                 'status': 'DELIVERED',
@@ -153,11 +233,46 @@ def transform_form_data(data):
     return transformed_data
 
 
+@register_generator('order_delivery', config.ORDER_DELIVERY_QUEUE, '销售订单发货',
+                    required_fields=('callbackResponse.deliveryOrder.deliveryOrderCode', 'callbackResponse.deliveryOrder.warehouseCode', 'callbackResponse.orderLines[].itemCode', 'callbackResponse.packages[].expressCode', 'callbackResponse.packages[].logisticsCode'))
+def generate(ctx, params):
+    """批量生成销售订单发货回传消息：发货单号与快递单号唯一，SKU按权重采样"""
+    warehouse_code = params.get('warehouse_code') or (ctx.sample_warehouse() or {}).get('warehouse_code', '')
+    lines = sample_order_lines(ctx, params, warehouse_code)
+    delivery_order_code = ctx.code('deliveryOrderCode')
+    data = {
+        'deliveryOrder': {
+            'deliveryOrderCode': delivery_order_code,
+            'deliveryOrderId': delivery_order_code,
+            'outBizCode': delivery_order_code,
+            'warehouseCode': warehouse_code,
+            'orderLines': [{'itemCode': sku['sku_code'], 'actualQty': qty} for sku, qty in lines],
+            'packages': [{
+                'expressCode': ctx.code('expressCode'),
+                'logisticsCode': params.get('logistics_code', 'ZT'),
+                'logisticsName': params.get('logistics_name', '中通快运'),
+                'items': [{'itemCode': sku['sku_code'], 'quantity': qty} for sku, qty in lines]
+            }]
+        }
+    }
+    return normalize_numeric_fields(transform_form_data(data, ctx))
+
+
+@timed('build')
+def message_from_input(data):
+    """转换并校验一条发货输入，单条提交与批量提交共用"""
+    # 转换表单数据格式（提供seed时进入种子模式），再规范化数值字段类型
+    normalized_data = normalize_numeric_fields(transform_form_data(data, context_from_request(data)))
+    # 按输入结构校验发货单与包裹必填字段（全部错误一次返回）
+    parse_request('order_delivery', normalized_data)
+    return normalized_data
+
+
 # ==================== 路由函数 ====================
 @order_delivery_bp.route('/')
 def index():
     """销售订单发货页面"""
-    return render_template('order_delivery.html', preset=config.ORDER_DELIVERY_PRESET)
+    return render_cached('order_delivery.html', preset=config.ORDER_DELIVERY_PRESET)
 
 
 @order_delivery_bp.route('/submit', methods=['POST'])
@@ -166,86 +281,43 @@ def submit():
     try:
         # 1. 获取表单数据
         data = request.get_json()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(data, list):
+            return submit_batch(config.ORDER_DELIVERY_QUEUE, data, message_from_input)
         if not data:
             return jsonify({
                 'status': 'error',
                 'message': '请求数据为空'
             }), 400
 
-        # 2. 转换表单数据格式
-        transformed_data = transform_form_data(data)
-
-        # 3. 规范化数值字段类型
-        normalized_data = normalize_numeric_fields(transformed_data)
-
-        # 4. 提取回调响应数据并验证必填字段
-        callback_response = normalized_data.get('callbackResponse', {})
-        delivery_order = callback_response.get('deliveryOrder', {})
-        packages = callback_response.get('packages', [])
-
-        # 从deliveryOrder中验证基础必填字段
-        required_delivery_fields = {
-            'deliveryOrderCode': delivery_order.get('deliveryOrderCode'),
-            'warehouseCode': delivery_order.get('warehouseCode')
-        }
-
-        # 检查deliveryOrder必填字段
-        missing_delivery_fields = [field for field, value in required_delivery_fields.items() if value is None or value == '']
-        if missing_delivery_fields:
-            field_info = ', '.join([f"{field}={required_delivery_fields[field]}" for field in missing_delivery_fields])
-            error_msg = f"缺少必填字段或字段值为空: {field_info}"
-            logger.warning(f"订单发货验证失败: {error_msg}")
-            return jsonify({
-                'status': 'error',
-                'message': error_msg
-            }), 400
-
-        # 从packages中验证物流必填字段
-        if not packages:
-            error_msg = "缺少包裹信息"
-            logger.warning(f"订单发货验证失败: {error_msg}")
-            return jsonify({
-                'status': 'error',
-                'message': error_msg
-            }), 400
-
-        # 获取第一个包裹的物流信息
-        first_package = packages[0]
-        required_package_fields = {
-            'logisticsCode': first_package.get('logisticsCode'),
-            'logisticsName': first_package.get('logisticsName'),
-            'expressCode': first_package.get('expressCode')
-        }
-
-        # 检查packages必填字段
-        missing_package_fields = [field for field, value in required_package_fields.items() if value is None or value == '']
-        if missing_package_fields:
-            field_info = ', '.join([f"{field}={required_package_fields[field]}" for field in missing_package_fields])
-            error_msg = f"缺少必填字段或字段值为空: {field_info}"
-            logger.warning(f"订单发货验证失败: {error_msg}")
-            return jsonify({
-                'status': 'error',
-                'message': error_msg
-            }), 400
+        # 2-4. 转换、规范化并校验
+        normalized_data = message_from_input(data)
+        delivery_order_code = normalized_data['callbackResponse']['deliveryOrder']['deliveryOrderCode']
 
         # 5. 推送消息到销售订单发货队列
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run(data):
+            return dry_run_response(config.ORDER_DELIVERY_QUEUE, normalized_data)
         success = push_message(config.ORDER_DELIVERY_QUEUE, normalized_data)
 
         if success:
-            logger.info(f"销售订单发货消息推送成功: {delivery_order.get('deliveryOrderCode')}")
+            logger.info(f"销售订单发货消息推送成功: {delivery_order_code}")
             return jsonify({
                 'status': 'success',
                 'message': '销售订单回传消息推送成功',
                 'queue': config.ORDER_DELIVERY_QUEUE,
-                'order_code': delivery_order.get('deliveryOrderCode')
+                'order_code': delivery_order_code
             }), 200
         else:
-            logger.error(f"销售订单发货消息推送失败: {delivery_order.get('deliveryOrderCode')}")
+            logger.error(f"销售订单发货消息推送失败: {delivery_order_code}")
             return jsonify({
                 'status': 'error',
                 'message': '消息推送失败，请检查RabbitMQ连接'
             }), 500
 
+    except ValidationError as e:
+        logger.warning(f"订单发货验证失败: {str(e)}")
+        return validation_error_response(e)
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({
@@ -1,9 +1,16 @@
 # app/routes/order_download.py（优化后）
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, jsonify
 from config import config  # 导入配置实例
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, request_data, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, CODE, QTY
 import logging
-import json
 
 logger = logging.getLogger(__name__)
 
@@ -11,12 +18,113 @@ logger = logging.getLogger(__name__)
 order_download_bp = Blueprint('order_download', __name__, url_prefix='/order_download')
 
 
+# ==================== 输入结构 ====================
+# 明细字段platformOuterSkuCode0、platformNo0、qty0、isGift0……（序号从0开始）
+register_schema('order_download', fields=[
+    Field('address'),
+    Field('platformOrderNo'),
+    Field('storeId'),
+    Field('platformPayTime')
+], details=[
+    Field('platformOuterSkuCode'),
+    Field('platformNo'),
+    Field('qty'),
+    Field('isGift', required=False, default='0')
+], detail_base=0)
+
+
+# ==================== 输出结构 ====================
+# 订单下载：平台单号、店铺、收货信息与商品明细
+register_output_schema(config.ORDER_DOWNLOAD_QUEUE, {
+    'type': 'object',
+    'required': ['platformOrderNo', 'storeId', 'address', 'platformPayTime', 'salesOrderDetailConvertDTOList'],
+    'properties': {
+        'platformOrderNo': CODE,
+        'storeId': CODE,
+        'address': CODE,
+        'platformPayTime': CODE,
+        'salesOrderDetailConvertDTOList': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'required': ['platformSkuId', 'qty', 'isGift'],
+                'properties': {
+                    'platformSkuId': CODE,
+                    'qty': QTY,
+                    'isGift': {'type': 'string', 'enum': ['0', '1']}
+                }
+            }
+        },
+        'salesOrderExtConvertDTO': {'type': 'object'}
+    }
+})
+
+
+# ==================== 辅助函数 ====================
+def build_message(address, platform_order_no, store_id, platform_pay_time, details):
+    """合并预设参数与用户输入，生成订单下载消息"""
+    return {
+        **config.ORDER_DOWNLOAD_PRESET,
+        'address': address,
+        'platformOrderNo': platform_order_no,
+        'storeId': store_id,
+        'platformPayTime': platform_pay_time,
+        # 动态明细：替换预设中的platformOuterSkuCode、platformNo、qty
+        'salesOrderDetailConvertDTOList': [
+            {
+                **{k: v for k, v in config.ORDER_DOWNLOAD_PRESET['salesOrderDetailConvertDTOList'][0].items() if k != 'sku'},
+                'platformOuterSkuCode': detail['platformOuterSkuCode'],
+                'platformNo': detail['platformNo'],
+                'qty': detail['qty'],
+                'isGift': detail['isGift']
+            } for detail in details
+        ],
+        # 支付时间：更新到扩展字段
+        'salesOrderExtConvertDTO': {
+            **config.ORDER_DOWNLOAD_PRESET['salesOrderExtConvertDTO'],
+            'platformPayTime': platform_pay_time
+        }
+    }
+
+
+@register_generator('order_download', config.ORDER_DOWNLOAD_QUEUE, '订单下载',
+                    required_fields=('platformOrderNo', 'storeId', 'platformPayTime', 'salesOrderDetailConvertDTOList[].platformOuterSkuCode', 'salesOrderDetailConvertDTOList[].qty'))
+def generate(ctx, params):
+    """批量生成订单下载消息：平台单号唯一，店铺与SKU按权重采样"""
+    store = ctx.sample_store() or {}
+    store_id = params.get('store_id') or store.get('store_id', '')
+    details = [{
+        'platformOuterSkuCode': sku['sku_code'],
+        'platformNo': ctx.code('platformNo'),
+        'qty': str(qty),
+        'isGift': '0'
+    } for sku, qty in sample_order_lines(ctx, params)]
+    return build_message(
+        params.get('address', '测试地址'),
+        ctx.code('platformOrderNo'),
+        store_id,
+        ctx.format_time(),
+        details
+    )
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条输入（表单或JSON对象）并生成最终消息，单条提交与批量提交共用"""
+    # 1. 按输入结构解析并校验基础字段与明细（platformOuterSkuCode、platformNo、qty、isGift）
+    fields, details = parse_request('order_download', data)
+    # 2. 合并预设参数与用户输入
+    return build_message(fields['address'], fields['platformOrderNo'], fields['storeId'],
+                         fields['platformPayTime'], details)
+
+
 # ==================== 路由函数 ====================
 # 订单下载页面（GET请求）
 @order_download_bp.route('/')
 def index():
     """订单下载页面"""
-    return render_template('order_download.html', preset=config.ORDER_DOWNLOAD_PRESET)
+    return render_cached('order_download.html', preset=config.ORDER_DOWNLOAD_PRESET)
 
 
 # 订单下载接口（POST请求）
@@ -24,79 +132,22 @@ def index():
 def submit():
     """订单下载接口"""
     try:
-        # 1. 获取用户输入（基础字段）
-        address = request.form.get('address')
-        platform_order_no = request.form.get('platformOrderNo')
-        store_id = request.form.get('storeId')
-        platform_pay_time = request.form.get('platformPayTime')
-        detail_count = int(request.form.get('detail_count', 1))
-
-        # 2. 验证必填字段
-        required_fields = {
-            'address': address,
-            'platformOrderNo': platform_order_no,
-            'storeId': store_id,
-            'platformPayTime': platform_pay_time
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            return jsonify({
-                'status': 'error',
-                'message': f'缺少必填字段: {", ".join(missing_fields)}'
-            }), 400
-
-        # 3. 获取动态明细（platformOuterSkuCode、platformNo、qty、isGift）
-        details = []
-        for i in range(detail_count):
-            platform_outer_sku_code = request.form.get(f'platformOuterSkuCode{i}')
-            platform_no = request.form.get(f'platformNo{i}')
-            qty = request.form.get(f'qty{i}')
-            is_gift = request.form.get(f'isGift{i}', '0')
-            
-            # 验证明细字段
-            if not all([platform_outer_sku_code, platform_no, qty]):
-                return jsonify({
-                    'status': 'error',
-                    'message': f'明细 {i+1} 缺少必填字段'
-                }), 400
-                
-            details.append({
-                'platformOuterSkuCode': platform_outer_sku_code,
-                'platformNo': platform_no,
-                'qty': qty,
-                'isGift': is_gift
-            })
+        values = request_data()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(values, list):
+            return submit_batch(config.ORDER_DOWNLOAD_QUEUE, values, message_from_input)
 
-        # 4. 合并预设参数与用户输入（生成最终消息）
-        message_data = {
-            **config.ORDER_DOWNLOAD_PRESET,
-            'address': address,
-            'platformOrderNo': platform_order_no,
-            'storeId': store_id,
-            'platformPayTime': platform_pay_time,
-            # 动态明细：替换预设中的platformOuterSkuCode、platformNo、qty
-            'salesOrderDetailConvertDTOList': [
-                {
-                    **{k: v for k, v in config.ORDER_DOWNLOAD_PRESET['salesOrderDetailConvertDTOList'][0].items() if k != 'sku'},
-                    'platformOuterSkuCode': detail['platformOuterSkuCode'],
-                    'platformNo': detail['platformNo'],
-                    'qty': detail['qty'],
-                    'isGift': detail['isGift']
-                } for detail in details
-            ],
-            # 支付时间：更新到扩展字段
-            'salesOrderExtConvertDTO': {
-                **config.ORDER_DOWNLOAD_PRESET['salesOrderExtConvertDTO'],
-                'platformPayTime': platform_pay_time
-            }
-        }
+        # 1-2. 校验输入并生成最终消息
+        message_data = message_from_input(values)
+        platform_order_no = message_data['platformOrderNo']
 
-        print("收到的 request.form:", dict(request.form))
-        print('最终推送给RabbitMQ的报文:', json.dumps(message_data, ensure_ascii=False))
+        logger.debug("最终推送给RabbitMQ的报文: %s", payload(message_data))
 
-        # 5. 推送消息到RabbitMQ
+        # 3. 推送消息到RabbitMQ
         logger.info(f"开始推送订单下载消息到队列: {config.ORDER_DOWNLOAD_QUEUE}")
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run():
+            return dry_run_response(config.ORDER_DOWNLOAD_QUEUE, message_data)
         success = push_message(config.ORDER_DOWNLOAD_QUEUE, message_data)
         
         if success:
@@ -110,12 +161,15 @@ def submit():
         else:
             logger.error(f"订单下载消息推送失败: {platform_order_no}")
             logger.error(f"队列名称: {config.ORDER_DOWNLOAD_QUEUE}")
-            logger.error(f"消息内容: {json.dumps(message_data, ensure_ascii=False)}")
+            logger.error("消息内容: %s", payload(message_data))
             return jsonify({
                 'status': 'error',
                 'message': '消息推送失败，请检查RabbitMQ连接和终端日志'
             }), 500
 
+    except ValidationError as e:
+        logger.warning(f"请求验证失败: {str(e)}")
+        return validation_error_response(e)
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({
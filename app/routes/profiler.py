@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/24 10:30
+# file: profiler.py
+# 按需性能剖析路由文件（管理接口，需配置PROFILER_TOKEN）
+import hmac
+import logging
+
+from flask import Blueprint, request, jsonify, Response
+from config import config
+from app.utils.profiler import ProfileSession, run_session, MODES, THREAD_SCOPES
+
+logger = logging.getLogger(__name__)
+
+# ==================== 蓝图定义 ====================
+profiler_bp = Blueprint('profiler', __name__, url_prefix='/profiler')
+
+
+def check_admin():
+    """管理接口鉴权：未配置PROFILER_TOKEN时接口不存在（404），令牌不符时403；令牌通过 X-Admin-Token 或 Authorization: Bearer 传入"""
+    if not config.PROFILER_TOKEN:
+        return jsonify({'status': 'error', 'message': '性能剖析未启用'}), 404
+    token = request.headers.get('X-Admin-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if not token and authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    if not hmac.compare_digest(token.encode('utf-8'), config.PROFILER_TOKEN.encode('utf-8')):
+        logger.warning(f"性能剖析鉴权失败: remote={request.remote_addr}")
+        return jsonify({'status': 'error', 'message': '无权访问'}), 403
+    return None
+
+
+# ==================== 路由函数 ====================
+# 执行一次剖析（POST请求，阻塞到剖析结束后返回结果）
+@profiler_bp.route('/run', methods=['POST'])
+def run():
+    """剖析处理本次请求的worker，例如 /profiler/run?mode=sample&seconds=10&requests=200&interval_ms=5&format=collapsed
+
+    - mode: sample（采样，默认）/ cprofile
+    - seconds: 最长剖析秒数；requests: 处理完该数量的请求后提前结束
+    - threads: requests（只采样处理请求的线程，默认）/ all
+    - format: json（默认，含热点函数表和折叠栈）/ collapsed（纯文本折叠栈，可直接交给flamegraph.pl或speedscope）
+    """
+    denied = check_admin()
+    if denied is not None:
+        return denied
+    try:
+        mode = request.args.get('mode', 'sample')
+        seconds = float(request.args.get('seconds', 10))
+        max_requests = int(request.args.get('requests', 0)) or None
+        interval_ms = float(request.args.get('interval_ms', config.PROFILER_SAMPLE_INTERVAL_MS))
+        limit = min(max(int(request.args.get('limit', 30)), 1), 500)
+        output = request.args.get('format', 'json')
+
+        if not 0 < seconds <= config.PROFILER_MAX_SECONDS:
+            raise ValueError(f'seconds必须在0到{config.PROFILER_MAX_SECONDS}之间')
+        if max_requests is not None and not 0 < max_requests <= config.PROFILER_MAX_REQUESTS:
+            raise ValueError(f'requests必须在1到{config.PROFILER_MAX_REQUESTS}之间')
+        if interval_ms < 1:
+            raise ValueError('interval_ms不能小于1')
+        if output not in ('json', 'collapsed'):
+            raise ValueError('format取值必须为: json, collapsed')
+
+        session = ProfileSession(mode, seconds, max_requests, interval_ms / 1000,
+                                 request.args.get('threads', 'requests'))
+        run_session(session)
+        collapsed = session.collapsed()
+        if output == 'collapsed':
+            return Response(''.join(f'{stack} {weight}\n' for stack, weight in collapsed), mimetype='text/plain')
+        return jsonify({
+            'status': 'success',
+            **session.summary(),
+            'top': session.top(limit),
+            'collapsed': [{'stack': stack, 'weight': weight} for stack, weight in collapsed]
+        })
+
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'参数格式错误: {str(e)}'
+        }), 400
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    except Exception as e:
+        logger.error(f"性能剖析异常: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'系统错误: {str(e)}'
+        }), 500
+
+
+# 剖析参数说明（GET请求）
+@profiler_bp.route('/options', methods=['GET'])
+def options():
+    denied = check_admin()
+    if denied is not None:
+        return denied
+    return jsonify({
+        'status': 'success',
+        'modes': MODES,
+        'threads': THREAD_SCOPES,
+        'max_seconds': config.PROFILER_MAX_SECONDS,
+        'max_requests': config.PROFILER_MAX_REQUESTS,
+        'default_interval_ms': config.PROFILER_SAMPLE_INTERVAL_MS
+    })
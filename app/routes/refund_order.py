@@ -1,8 +1,15 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, jsonify
 from config import config  # 导入配置实例
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, request_data, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, CODE, QTY
 import logging
-import json
 
 logger = logging.getLogger(__name__)
 
@@ -10,12 +17,106 @@ logger = logging.getLogger(__name__)
 refund_order_bp = Blueprint('refund_order', __name__, url_prefix='/refund_order')
 
 
+# ==================== 输入结构 ====================
+# 明细字段platformNo0、applyNum0……（序号从0开始）
+register_schema('refund_order', fields=[
+    Field('platformOrderNo'),
+    Field('platformRefundNo'),
+    Field('applyType'),
+    Field('applyReason'),
+    Field('refundPeriod'),
+    Field('storeId'),
+    Field('expressNo'),
+    Field('expressName'),
+    Field('platformStatus'),
+    Field('omsStatus')
+], details=[
+    Field('platformNo'),
+    Field('applyNum')
+], detail_base=0)
+
+
+# ==================== 输出结构 ====================
+# 退款单：平台单号、退款单号与退款明细
+register_output_schema(config.REFUND_ORDER_QUEUE, {
+    'type': 'object',
+    'required': ['platformOrderNo', 'platformRefundNo', 'storeId', 'salesOrderRefundApplyDetailList'],
+    'properties': {
+        'platformOrderNo': CODE,
+        'platformRefundNo': CODE,
+        'storeId': CODE,
+        'salesOrderRefundApplyDetailList': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'required': ['platformNo', 'applyNum'],
+                'properties': {
+                    'platformNo': CODE,
+                    'applyNum': QTY
+                }
+            }
+        }
+    }
+})
+
+
+# ==================== 辅助函数 ====================
+def build_message(fields, details):
+    """合并预设参数与用户输入，生成退款单消息"""
+    return {
+        **config.REFUND_ORDER_PRESET,
+        **fields,
+        # 根层级platformNo设为null
+        'platformNo': None,
+        # 动态明细
+        'salesOrderRefundApplyDetailList': [
+            {
+                **config.REFUND_ORDER_PRESET['salesOrderRefundApplyDetailList'][0],
+                'platformNo': detail['platformNo'],
+                'applyNum': detail['applyNum'],
+                'platformStatus': fields['platformStatus']
+            } for detail in details
+        ]
+    }
+
+
+@register_generator('refund_order', config.REFUND_ORDER_QUEUE, '退款单生成',
+                    required_fields=('platformOrderNo', 'platformRefundNo', 'storeId', 'salesOrderRefundApplyDetailList[].platformNo', 'salesOrderRefundApplyDetailList[].applyNum'))
+def generate(ctx, params):
+    """批量生成退款单消息：平台单号与退款单号唯一，店铺与SKU按权重采样"""
+    store = ctx.sample_store() or {}
+    details = [{'platformNo': ctx.code('platformNo'), 'applyNum': str(qty)}
+               for _, qty in sample_order_lines(ctx, params)]
+    return build_message({
+        'platformOrderNo': params.get('platform_order_no') or ctx.code('platformOrderNo'),
+        'platformRefundNo': ctx.code('platformRefundNo'),
+        'applyType': params.get('apply_type', '1'),
+        'applyReason': params.get('apply_reason', '测试退款'),
+        'refundPeriod': params.get('refund_period', '1'),
+        'storeId': params.get('store_id') or store.get('store_id', ''),
+        'expressNo': ctx.code('expressCode'),
+        'expressName': params.get('express_name', '中通快运'),
+        'platformStatus': params.get('platform_status', 'WAIT_SELLER_AGREE'),
+        'omsStatus': params.get('oms_status', '0')
+    }, details)
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条输入（表单或JSON对象）并生成最终消息，单条提交与批量提交共用"""
+    # 1. 按输入结构解析并校验基础字段与明细（platformNo、applyNum）
+    fields, details = parse_request('refund_order', data)
+    # 2. 合并预设参数与用户输入
+    return build_message(fields, details)
+
+
 # ==================== 路由函数 ====================
 # 退款单生成页面（GET请求）
 @refund_order_bp.route('/')
 def index():
     """退款单生成页面"""
-    return render_template('refund_order.html', preset=config.REFUND_ORDER_PRESET)
+    return render_cached('refund_order.html', preset=config.REFUND_ORDER_PRESET)
 
 
 # 退款单生成接口（POST请求）
@@ -23,90 +124,21 @@ def index():
 def submit():
     """退款单生成接口"""
     try:
-        # 1. 获取用户输入（基础字段）
-        platform_order_no = request.form.get('platformOrderNo')
-        platform_refund_no = request.form.get('platformRefundNo')
-        apply_type = request.form.get('applyType')
-        apply_reason = request.form.get('applyReason')
-        refund_period = request.form.get('refundPeriod')
-        store_id = request.form.get('storeId')
-        express_no = request.form.get('expressNo')
-        express_name = request.form.get('expressName')
-        platform_status = request.form.get('platformStatus')
-        oms_status = request.form.get('omsStatus')
-        detail_count = int(request.form.get('detail_count', 1))
-
-        # 2. 验证必填字段
-        required_fields = {
-            'platformOrderNo': platform_order_no,
-            'platformRefundNo': platform_refund_no,
-            'applyType': apply_type,
-            'applyReason': apply_reason,
-            'refundPeriod': refund_period,
-            'storeId': store_id,
-            'expressNo': express_no,
-            'expressName': express_name,
-            'platformStatus': platform_status,
-            'omsStatus': oms_status
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            return jsonify({
-                'status': 'error',
-                'message': f'缺少必填字段: {",".join(missing_fields)}'
-            }), 400
-
-        # 3. 获取动态明细
-        details = []
-        platform_no_values = []
-        for i in range(detail_count):
-            platform_no = request.form.get(f'platformNo{i}')
-            apply_num = request.form.get(f'applyNum{i}')
-            
-            # 验证明细字段
-            if not all([platform_no, apply_num,]):
-                return jsonify({
-                    'status': 'error',
-                    'message': f'明细 {i+1} 缺少必填字段'
-                }), 400
-                
-            details.append({
-                'platformNo': platform_no,
-                'applyNum': apply_num
-            })
-            platform_no_values.append(platform_no)
-
-        # 4. 合并预设参数与用户输入
-        message_data = {
-            **config.REFUND_ORDER_PRESET,
-            'platformOrderNo': platform_order_no,
-            'platformRefundNo': platform_refund_no,
-            'applyType': apply_type,
-            'applyReason': apply_reason,
-            'refundPeriod': refund_period,
-            'storeId': store_id,
-            'expressNo': express_no,
-            'expressName': express_name,
-            'platformStatus': platform_status,
-            'omsStatus': oms_status,
-            # 根层级platformNo设为null
-            'platformNo': None,
-            # 动态明细
-            'salesOrderRefundApplyDetailList': [
-                {
-                    **config.REFUND_ORDER_PRESET['salesOrderRefundApplyDetailList'][0],
-                    'platformNo': detail['platformNo'],
-                    'applyNum': detail['applyNum'],
-                    'platformStatus': platform_status
-                } for detail in details
-            ]
-        }
+        values = request_data()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(values, list):
+            return submit_batch(config.REFUND_ORDER_QUEUE, values, message_from_input)
+
+        # 1-2. 校验输入并生成最终消息
+        message_data = message_from_input(values)
+        platform_refund_no = message_data['platformRefundNo']
 
-        logger.info(f"最终推送给RabbitMQ的报文: {json.dumps(message_data, ensure_ascii=False)}")
+        logger.debug("最终推送给RabbitMQ的报文: %s", payload(message_data))
 
-        # 5. 推送消息到RabbitMQ
-        # 5. 推送消息到RabbitMQ
+        # 3. 推送消息到RabbitMQ
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run():
+            return dry_run_response(config.REFUND_ORDER_QUEUE, message_data)
         success = push_message(config.REFUND_ORDER_QUEUE, message_data)
         
         if success:
@@ -124,6 +156,9 @@ def submit():
                 'message': '消息推送失败，请检查RabbitMQ连接'
             }), 500
 
+    except ValidationError as e:
+        logger.warning(f"请求验证失败: {str(e)}")
+        return validation_error_response(e)
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({
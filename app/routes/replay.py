@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/15 16:00
+# file: replay.py
+# 数据集回放路由文件
+from flask import Blueprint, request, jsonify
+from config import config
+from app.utils.rabbitmq import push_batch
+from app.utils.output_schema import check_output, resolve_mode, OutputValidationError
+from app.utils.replay import dataset_path, list_datasets, read_checkpoint, start_replay, get_replay_job, stop_replay, list_replay_jobs
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# ==================== 蓝图定义 ====================
+replay_bp = Blueprint('replay', __name__, url_prefix='/replay')
+
+
+# ==================== 辅助函数 ====================
+def parse_optional_number(data, key, cast):
+    value = data.get(key)
+    if value is None or value == '':
+        return None
+    return cast(value)
+
+
+def make_publisher(validation):
+    """按指定的输出结构校验模式逐条校验后整批推送；strict模式下不合格的报文记为失败，不影响同批其他报文
+
+    整批推送失败时抛出ConnectionError，回放任务据此停止并把断点留在该批之前
+    """
+    def publish(queue_name, messages):
+        results = []
+        valid = []
+        for message in messages:
+            try:
+                check_output(queue_name, message, validation)
+                results.append(True)
+                valid.append(message)
+            except OutputValidationError as e:
+                logger.warning(f"回放跳过不合格报文: {str(e)}")
+                results.append(False)
+        # 已按本次的模式校验过，推送时不再重复校验
+        if valid and not push_batch(queue_name, valid, validation='off'):
+            raise ConnectionError(f'推送到队列 {queue_name} 失败（{len(valid)}条）')
+        return results
+    return publish
+
+
+# ==================== 路由函数 ====================
+# 数据集列表（GET请求）
+@replay_bp.route('/datasets', methods=['GET'])
+def datasets():
+    """列出已导出的数据集及其断点"""
+    return jsonify({
+        'status': 'success',
+        'dataset_dir': config.DATASET_DIR,
+        'datasets': list_datasets(config.DATASET_DIR)
+    })
+
+
+# 开始回放（POST请求）
+@replay_bp.route('/start', methods=['POST'])
+def start():
+    """后台回放数据集到原队列
+
+    请求体: {"file": "orders_42.ndjson.gz", "rate": 200}          按固定速率（条/秒）
+           {"file": "orders_42.ndjson.gz", "speed": 10}          按原始节奏的10倍
+           {"file": "...", "resume": true} / {"file": "...", "offset": 123456}  从断点或指定字节偏移续放
+    可选 "limit": 本次最多回放条数；"validation": 输出结构校验模式 strict / warn / off（默认取OUTPUT_SCHEMA_MODE）
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        path = dataset_path(config.DATASET_DIR, data.get('file'))
+        if not os.path.exists(path):
+            return jsonify({
+                'status': 'error',
+                'message': f'数据集不存在: {data.get("file")}'
+            }), 404
+
+        rate = parse_optional_number(data, 'rate', float)
+        speed = parse_optional_number(data, 'speed', float)
+        limit = parse_optional_number(data, 'limit', int)
+        offset = parse_optional_number(data, 'offset', int) or 0
+        if rate is not None and speed is not None:
+            raise ValueError('rate与speed只能指定一个')
+        if rate is not None and rate > config.REPLAY_MAX_RATE:
+            raise ValueError(f'rate不能超过{config.REPLAY_MAX_RATE}条/秒')
+        if offset < 0:
+            raise ValueError('offset不能为负数')
+        if data.get('resume'):
+            checkpoint = read_checkpoint(path)
+            offset = checkpoint['offset'] if checkpoint else 0
+
+        publish = make_publisher(resolve_mode(data.get('validation')))
+        job = start_replay(path, publish, offset=offset, rate=rate, speed=speed, limit=limit,
+                           batch_size=config.REPLAY_BATCH_SIZE)
+        return jsonify({
+            'status': 'success',
+            'job': job.to_dict()
+        })
+
+    except ValueError as e:
+        logger.error(f"参数验证错误: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'参数格式错误: {str(e)}'
+        }), 400
+    except Exception as e:
+        logger.error(f"数据集回放启动异常: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'系统错误: {str(e)}'
+        }), 500
+
+
+# 回放任务列表（GET请求）
+@replay_bp.route('/jobs', methods=['GET'])
+def jobs():
+    """全部worker的回放任务"""
+    return jsonify({
+        'status': 'success',
+        'jobs': list_replay_jobs()
+    })
+
+
+# 回放任务进度（GET请求）
+@replay_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_replay_job(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'回放任务不存在: {job_id}'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'job': job
+    })
+
+
+# 停止回放（POST请求）
+@replay_bp.route('/jobs/<job_id>/stop', methods=['POST'])
+def stop(job_id):
+    """停止回放并写入断点，之后可用 resume 续放（任务可以在其他worker中运行）"""
+    job = stop_replay(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'回放任务不存在: {job_id}'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'job': job
+    })
@@ -1,9 +1,15 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify
 from config import config  # 导入配置实例
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, CODE, QTY, ENTRY_ORDER
 import logging
 import json
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -11,12 +17,135 @@ logger = logging.getLogger(__name__)
 return_order_entry_bp = Blueprint('return_order_entry', __name__, url_prefix='/return_order_entry')
 
 
+# ==================== 输入结构 ====================
+# 明细按 detail_0、detail_1…… 逐行提交，行数由detail_count给出；数量保留原始字符串，actualQty缺省时取planQty
+register_schema('return_order_entry', fields=[
+    Field('entryOrderCode', path='callbackResponse.entryOrder.entryOrderCode'),
+    Field('warehouseCode', path='callbackResponse.entryOrder.warehouseCode')
+], details=[
+    Field('itemCode'),
+    Field('planQty', 'float', convert=False),
+    Field('actualQty', 'float', required=False, convert=False),
+    Field('itemName', required=False, default='儿童折叠滑板车')
+], row_key='detail_{i}', default_detail_count=0)
+
+
+# ==================== 输出结构 ====================
+# 2B退货入库：入库单号、仓库与含计划数量的明细
+register_output_schema(config.RETURN_ORDER_ENTRY_QUEUE, {
+    'type': 'object',
+    'required': ['callbackResponse'],
+    'properties': {
+        'callbackResponse': {
+            'type': 'object',
+            'required': ['entryOrder', 'orderLines'],
+            'properties': {
+                'entryOrder': ENTRY_ORDER,
+                'orderLines': {
+                    'type': 'array',
+                    'minItems': 1,
+                    'items': {
+                        'type': 'object',
+                        'required': ['itemCode', 'planQty', 'actualQty'],
+                        'properties': {'itemCode': CODE, 'planQty': QTY, 'actualQty': QTY}
+                    }
+                }
+            }
+        }
+    }
+})
+
+
+# ==================== 辅助函数 ====================
+def build_order_line(line, item_name):
+    """构建符合预览结构的退货入库明细"""
+    return {
+        'actualQty': line['actualQty'],
+        'batchCode': '',
+        'expireDate': '',
+        'inventoryType': line['inventoryType'],
+        'itemCode': line['itemCode'],
+        'itemId': '',  # 预览JSON中itemId为空
+        'itemName': item_name,
+        'orderLineNo': line['orderLineNo'],
+        'outBizCode': '',
+        'ownerCode': line['ownerCode'],
+        'planQty': line['planQty'],
+        'produceCode': '',
+        'productDate': ''
+    }
+
+
+@register_generator('return_order_entry', config.RETURN_ORDER_ENTRY_QUEUE, '2B退货单入库',
+                    required_fields=('callbackResponse.entryOrder.entryOrderCode', 'callbackResponse.entryOrder.warehouseCode', 'callbackResponse.orderLines[].itemCode', 'callbackResponse.orderLines[].planQty'))
+def generate(ctx, params):
+    """批量生成2B退货入库消息：入库单号唯一，SKU按仓库加权采样"""
+    warehouse_code = params.get('warehouse_code') or (ctx.sample_warehouse() or {}).get('warehouse_code', '')
+    entry_order_code = ctx.code('entryOrderCode')
+    current_time = ctx.format_time()
+    order_lines = [build_order_line({
+        'orderLineNo': str(i),
+        'itemCode': sku['sku_code'],
+        'planQty': str(qty),
+        'actualQty': str(qty),
+        'inventoryType': 'ZP',
+        'ownerCode': 'NEWTESTXIER'
+    }, sku.get('item_name') or '儿童折叠滑板车') for i, (sku, qty) in enumerate(sample_order_lines(ctx, params, warehouse_code), start=1)]
+    preset = config.RETURN_ORDER_ENTRY_PRESET
+    return {
+        'callbackResponse': {
+            **preset['callbackResponse'],
+            'entryOrder': {
+                **preset['callbackResponse']['entryOrder'],
+                'entryOrderCode': entry_order_code,
+                'warehouseCode': warehouse_code,
+                'orderConfirmTime': current_time,
+                'operateTime': current_time
+            },
+            'orderLines': order_lines
+        },
+        'outOrderCode': preset.get('outOrderCode', ''),
+        'type': preset.get('type', 2)
+    }
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条退货入库输入并生成最终报文，单条提交与批量提交共用"""
+    # 按输入结构校验入库单号、仓库与明细（全部错误一次返回）
+    _, details = parse_request('return_order_entry', data)
+
+    # 处理时间字段（提供seed时由基准时钟决定）
+    current_time = context_from_request(data).format_time()
+    callback_response = data['callbackResponse']
+    entry_order = callback_response['entryOrder']
+    entry_order['orderConfirmTime'] = current_time
+    entry_order['operateTime'] = current_time
+
+    # 生成符合预览结构的orderLines（itemName从原始数据获取或使用默认值）
+    callback_response['orderLines'] = [build_order_line({
+        'orderLineNo': str(i),
+        'itemCode': detail['itemCode'],
+        'planQty': detail['planQty'],
+        'actualQty': detail['planQty'] if detail['actualQty'] is None else detail['actualQty'],
+        'inventoryType': 'ZP',
+        'ownerCode': 'NEWTESTXIER'
+    }, detail['itemName']) for i, detail in enumerate(details, start=1)]
+
+    # 创建只包含预览结构中字段的最终数据
+    return {
+        'callbackResponse': callback_response,
+        'outOrderCode': data.get('outOrderCode', ''),
+        'type': data.get('type', 2)
+    }
+
+
 # ==================== 路由函数 ====================
 # 退货单入库页面（GET请求）
 @return_order_entry_bp.route('/')
 def index():
     """退货单入库页面"""
-    return render_template('return_order_entry.html', preset=config.RETURN_ORDER_ENTRY_PRESET)
+    return render_cached('return_order_entry.html', preset=config.RETURN_ORDER_ENTRY_PRESET)
 
 
 # 获取退货单入库预设参数
@@ -35,104 +164,27 @@ def submit():
     """退货单入库接口"""
     try:
         # 1. 获取用户输入（JSON格式）
-        data = request.get_json()
-        if not data:
+        data = request.get_json(silent=True)
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(data, list):
+            return submit_batch(config.RETURN_ORDER_ENTRY_QUEUE, data, message_from_input)
+        if not isinstance(data, dict) or not data:
             return jsonify({
                 'status': 'error',
                 'message': '请求数据不能为空'
             }), 400
 
-        # 2. 验证必填字段
-        entry_order_code = data.get('callbackResponse', {}).get('entryOrder', {}).get('entryOrderCode')
-        warehouse_code = data.get('callbackResponse', {}).get('entryOrder', {}).get('warehouseCode')
-        detail_count = data.get('detail_count', 0)
-
-        required_fields = {
-            'entryOrderCode': entry_order_code,
-            'warehouseCode': warehouse_code,
-            'detail_count': detail_count
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            return jsonify({
-                'status': 'error',
-                'message': f'缺少必填字段: {", ".join(missing_fields)}'
-            }), 400
-
-        # 3. 处理时间字段
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        entry_order = data.get('callbackResponse', {}).get('entryOrder', {})
-        entry_order['orderConfirmTime'] = current_time
-        entry_order['operateTime'] = current_time
-
-        # 4. 生成动态明细
-        order_lines = []
-        detail_count = int(detail_count)
-        for i in range(detail_count):
-            line_data = data.get(f'detail_{i}', {})
-            item_code = line_data.get('itemCode')
-            plan_qty = line_data.get('planQty')
-            actual_qty = line_data.get('actualQty', plan_qty)
-
-            if not item_code or not plan_qty:
-                missing = []
-                if not item_code: missing.append('itemCode')
-                if not plan_qty: missing.append('planQty')
-                return jsonify({
-                    'status': 'error',
-                    'message': f'明细 {i+1} 缺少必填字段: {", ".join(missing)}'
-                }), 400
-
-            order_line = {
-                'orderLineNo': str(i+1),
-                'itemCode': item_code,
-                'itemId': item_code,
-                'planQty': plan_qty,
-                'actualQty': actual_qty,
-                'inventoryType': 'ZP',
-                'ownerCode': 'NEWTESTXIER'
-            }
-            order_lines.append(order_line)
-
-        # 5. 更新数据结构
-        callback_response = data.get('callbackResponse', {})
-
-        # 6. 生成符合预览结构的orderLines
-        formatted_order_lines = []
-        for i, line in enumerate(order_lines):
-            # 获取前端提交的原始明细数据
-            original_detail = data.get(f'detail_{i}', {})
-            
-            # 构建符合预览结构的明细
-            formatted_line = {
-                'actualQty': line['actualQty'],
-                'batchCode': '',
-                'expireDate': '',
-                'inventoryType': line['inventoryType'],
-                'itemCode': line['itemCode'],
-                'itemId': '',  # 预览JSON中itemId为空
-                'itemName': original_detail.get('itemName', '儿童折叠滑板车'),  # 从原始数据获取或使用默认值
-                'orderLineNo': line['orderLineNo'],
-                'outBizCode': '',
-                'ownerCode': line['ownerCode'],
-                'planQty': line['planQty'],
-                'produceCode': '',
-                'productDate': ''
-            }
-            formatted_order_lines.append(formatted_line)
-
-        callback_response['orderLines'] = formatted_order_lines
-
-        # 7. 创建只包含预览结构中字段的最终数据
-        final_data = {
-            'callbackResponse': callback_response,
-            'outOrderCode': data.get('outOrderCode', ''),
-            'type': data.get('type', 2)
-        }
+        # 2-5. 校验输入并生成只包含预览结构中字段的最终数据
+        final_data = message_from_input(data)
+        entry_order = final_data['callbackResponse']['entryOrder']
+        entry_order_code = entry_order['entryOrderCode']
+        warehouse_code = entry_order['warehouseCode']
 
-        # 8. 推送消息到RabbitMQ
+        # 6. 推送消息到RabbitMQ
         queue_name = config.RETURN_ORDER_ENTRY_QUEUE
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run(data):
+            return dry_run_response(queue_name, final_data)
         push_success = push_message(queue_name, final_data)
 
         if push_success:
@@ -149,6 +201,9 @@ def submit():
                 'status': 'error',
                 'message': '退货单入库数据推送至队列失败，请查看终端日志获取详细信息'
             }), 500    
+    except ValidationError as e:
+        logger.warning(f'请求验证失败: {str(e)}')
+        return validation_error_response(e)
     except ValueError as e:
         logger.error(f'ValueError: {str(e)}')
         return jsonify({
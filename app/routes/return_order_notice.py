@@ -1,9 +1,15 @@
-from flask import Blueprint, request, render_template, jsonify, current_app
+from flask import Blueprint, jsonify, current_app
 from config import config  # 导入配置实例
 from app.utils.rabbitmq import push_message  # 复用RabbitMQ推送工具
+from app.utils.generation import context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, request_data, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, CODE, DATETIME, ORDER_LINES
 import logging
 import json
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -11,12 +17,114 @@ logger = logging.getLogger(__name__)
 return_order_notice_bp = Blueprint('return_order_notice', __name__, url_prefix='/return_order_notice')
 
 
+# ==================== 输入结构 ====================
+# 明细字段itemCode1、actualQty1……（序号从1开始，与页面一致）
+register_schema('return_order_notice', fields=[
+    Field('returnOrderCode'),
+    Field('CloseStatus', required=False, default=''),
+    Field('warehouseCode')
+], details=[
+    Field('itemCode'),
+    Field('actualQty')
+], detail_base=1)
+
+
+# ==================== 输出结构 ====================
+# 通知单入库：退货单号、仓库与入库明细
+register_output_schema(config.RETURN_ORDER_NOTICE_QUEUE, {
+    'type': 'object',
+    'required': ['returnOrderCode', 'callbackResponse'],
+    'properties': {
+        'returnOrderCode': CODE,
+        'callbackResponse': {
+            'type': 'object',
+            'required': ['returnOrder', 'orderLines'],
+            'properties': {
+                'returnOrder': {
+                    'type': 'object',
+                    'required': ['returnOrderCode', 'warehouseCode'],
+                    'properties': {
+                        'returnOrderCode': CODE,
+                        'warehouseCode': CODE,
+                        'orderConfirmTime': DATETIME
+                    }
+                },
+                'orderLines': ORDER_LINES
+            }
+        }
+    }
+})
+
+
+# ==================== 辅助函数 ====================
+def build_order_line(line_no, item_code, actual_qty):
+    """构建退货明细，line_no从1开始"""
+    return {
+        'itemCode': item_code,
+        'actualQty': actual_qty,
+        'inventoryType': 'ZP',
+        'orderLineNo': str(line_no),
+        'ownerCode': 'XIER'
+    }
+
+
+def build_message(return_order_code, close_status, warehouse_code, order_lines, current_time):
+    """生成通知单入库消息"""
+    return {
+        'type': 2,
+        'returnOrderCode': return_order_code,
+        'callbackResponse': {
+            'apiMethodName': 'returnorder.confirm',
+            'orderLines': order_lines,
+            'extendProps': {
+                'CloseStatus': close_status,
+                'ApiSource': 'FLUXWMS'
+            },
+            'responseClass': 'com.qimen.api.response.ReturnorderConfirmResponse',
+            'returnOrder': {
+                'orderConfirmTime': current_time,
+                'orderType': 'THRK',
+                'outBizCode': '',
+                'ownerCode': 'XIER',
+                'remark': '',
+                'returnOrderCode': return_order_code,
+                'warehouseCode': warehouse_code
+            },
+            'version': '2.0'
+        }
+    }
+
+
+@register_generator('return_order_notice', config.RETURN_ORDER_NOTICE_QUEUE, '通知单入库',
+                    required_fields=('returnOrderCode', 'callbackResponse.returnOrder.warehouseCode', 'callbackResponse.orderLines[].itemCode', 'callbackResponse.orderLines[].actualQty'))
+def generate(ctx, params):
+    """批量生成通知单入库消息：退货单号唯一，SKU按仓库加权采样"""
+    warehouse_code = params.get('warehouse_code') or (ctx.sample_warehouse() or {}).get('warehouse_code', '')
+    order_lines = [build_order_line(i, sku['sku_code'], str(qty))
+                   for i, (sku, qty) in enumerate(sample_order_lines(ctx, params, warehouse_code), start=1)]
+    return build_message(ctx.code('returnOrderCode'), params.get('close_status', ''), warehouse_code,
+                         order_lines, ctx.format_time())
+
+
+@timed('build')
+def message_from_input(data):
+    """校验一条输入（表单或JSON对象）并生成最终消息，单条提交与批量提交共用"""
+    # 1. 按输入结构解析并校验基础字段与明细（itemCode、actualQty），CloseStatus为空时取空字符串
+    fields, details = parse_request('return_order_notice', data)
+    order_lines = [build_order_line(line_no, detail['itemCode'], detail['actualQty'])
+                   for line_no, detail in enumerate(details, 1)]
+    # 2. 合并参数（提供seed时时间由基准时钟决定）
+    current_time = context_from_request(data).format_time()
+    return build_message(fields['returnOrderCode'], fields['CloseStatus'], fields['warehouseCode'],
+                         order_lines, current_time)
+
+
 # ==================== 路由函数 ====================
 # 通知单入库页面（GET请求）
 @return_order_notice_bp.route('/')
 def index():
     """通知单入库页面"""
-    return render_template('return_order_notice.html', preset=config.RETURN_ORDER_NOTICE_PRESET)
+    return render_cached('return_order_notice.html', preset=config.RETURN_ORDER_NOTICE_PRESET)
 
 
 # 通知单入库接口（POST请求）
@@ -24,78 +132,19 @@ def index():
 def submit():
     """通知单入库接口"""
     try:
-        # 1. 获取用户输入（基础字段）
-        return_order_code = request.form.get('returnOrderCode')
-        close_status = request.form.get('CloseStatus')
-        warehouse_code = request.form.get('warehouseCode')
-        detail_count = int(request.form.get('detail_count', 1))
-
-        # 2. 验证必填字段
-        required_fields = {
-            'returnOrderCode': return_order_code,
-            'warehouseCode': warehouse_code
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            return jsonify({
-                'status': 'error',
-                'message': f'缺少必填字段: {missing_fields}'
-            })
-        
-        # 处理CloseStatus字段，如果为空则赋值为空字符串
-        close_status = close_status if close_status else ''
-
-        # 3. 获取商品明细
-        order_lines = []
-        for i in range(1, detail_count + 1):
-            item_code = request.form.get(f'itemCode{i}')
-            actual_qty = request.form.get(f'actualQty{i}')
-            
-            # 验证明细必填字段
-            if not item_code or not actual_qty:
-                return jsonify({
-                    'status': 'error',
-                    'message': f'第{i}行明细缺少必填字段: 商品编码或数量'
-                })
-            
-            order_lines.append({
-                'itemCode': item_code,
-                'actualQty': actual_qty,
-                'inventoryType': 'ZP',
-                'orderLineNo': str(i),
-                'ownerCode': 'XIER'
-            })
-
-        # 4. 合并参数
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        final_params = {
-            'type': 2,
-            'returnOrderCode': return_order_code,
-            'callbackResponse': {
-                'apiMethodName': 'returnorder.confirm',
-                'orderLines': order_lines,
-                'extendProps': {
-                    'CloseStatus': close_status,
-                    'ApiSource': 'FLUXWMS'
-                },
-                'responseClass': 'com.qimen.api.response.ReturnorderConfirmResponse',
-                'returnOrder': {
-                    'orderConfirmTime': current_time,
-                    'orderType': 'THRK',
-                    'outBizCode': '',
-                    'ownerCode': 'XIER',
-                    'remark': '',
-                    'returnOrderCode': return_order_code,
-                    'warehouseCode': warehouse_code
-                },
-                'version': '2.0'
-            }
-        }
-
-        # 5. 推送消息到RabbitMQ
         queue_name = current_app.config.get('RETURN_ORDER_NOTICE_QUEUE', 'sale_return_plan_add_back_b2c')
+        values = request_data()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(values, list):
+            return submit_batch(queue_name, values, message_from_input)
+
+        # 1-2. 校验输入并合并参数
+        final_params = message_from_input(values)
+
+        # 3. 推送消息到RabbitMQ
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run():
+            return dry_run_response(queue_name, final_params)
         push_message(queue_name, final_params)
 
         return jsonify({
@@ -103,6 +152,8 @@ def submit():
             'message': '通知单入库成功',
             'data': final_params
         })
+    except ValidationError as e:
+        return validation_error_response(e)
     except Exception as e:
         return jsonify({
             'status': 'error',
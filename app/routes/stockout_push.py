@@ -1,8 +1,14 @@
 import logging
-import datetime
-import json
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, request, jsonify
 from app.utils.rabbitmq import push_message
+from app.utils.generation import GenerationContext, context_from_request, register_generator, sample_order_lines
+from app.utils.dry_run import is_dry_run, dry_run_response
+from app.utils.batch_submit import submit_batch
+from app.utils.timing import timed
+from app.utils.logging_setup import payload
+from app.utils.page_cache import render_cached
+from app.utils.schema import Field, register_schema, parse_request, ValidationError, validation_error_response
+from app.utils.output_schema import register_output_schema, DELIVERY_ORDER, ORDER_LINES
 from .. import config
 
 logger = logging.getLogger(__name__)
@@ -11,20 +17,46 @@ logger = logging.getLogger(__name__)
 stockout_push_bp = Blueprint('stockout_push', __name__, url_prefix='/stockout_push')
 
 
+# ==================== 输入结构 ====================
+# 表单先转换为回传报文（transform_form_data），再按本结构校验出库单基础字段
+register_schema('stockout_push', fields=[
+    Field('deliveryOrderCode', path='callbackResponse.deliveryOrder.deliveryOrderCode'),
+    Field('warehouseCode', path='callbackResponse.deliveryOrder.warehouseCode')
+])
+
+
+# ==================== 输出结构 ====================
+# 2B出库确认：每行商品编码不能为空（未填写商品时transform_form_data会生成空itemCode）
+register_output_schema(config.STOCKOUT_PUSH_QUEUE, {
+    'type': 'object',
+    'required': ['callbackResponse'],
+    'properties': {
+        'callbackResponse': {
+            'type': 'object',
+            'required': ['deliveryOrder', 'orderLines'],
+            'properties': {
+                'deliveryOrder': DELIVERY_ORDER,
+                'orderLines': ORDER_LINES
+            }
+        }
+    }
+})
+
+
 # ==================== 辅助函数 ====================
 
-def transform_form_data(data):
+def transform_form_data(data, ctx=None):
+    ctx = ctx or GenerationContext()
     # 提取基础信息 - 支持从根级别或callbackResponse.deliveryOrder获取
     delivery_order_code = data.get('deliveryOrderCode') or data.get('callbackResponse', {}).get('deliveryOrder', {}).get('deliveryOrderCode')
     warehouse_code = data.get('warehouseCode') or data.get('callbackResponse', {}).get('deliveryOrder', {}).get('warehouseCode')
     
     # 增加日志以便调试
-    logger.info(f"接收到的数据: {data}")
-    logger.info(f"提取的delivery_order_code: {delivery_order_code}")
-    logger.info(f"提取的warehouse_code: {warehouse_code}")
+    logger.debug("接收到的数据: %s", payload(data))
+    logger.debug(f"提取的delivery_order_code: {delivery_order_code}, warehouse_code: {warehouse_code}")
     
     # 获取当前时间
-    current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    current_time = ctx.format_time()
     
     # 构建订单行
     order_lines = []
@@ -96,16 +128,40 @@ def transform_form_data(data):
     callback_response['deliveryOrder'] = delivery_order
     transformed_data['callbackResponse'] = callback_response
     
-    logger.info(f"转换后的JSON数据: {json.dumps(transformed_data, ensure_ascii=False)}")
+    logger.debug("转换后的JSON数据: %s", payload(transformed_data))
     
     return transformed_data
 
 
+@register_generator('stockout_push', config.STOCKOUT_PUSH_QUEUE, '2B出库单推送',
+                    required_fields=('callbackResponse.deliveryOrder.deliveryOrderCode', 'callbackResponse.deliveryOrder.warehouseCode', 'callbackResponse.orderLines[].itemCode', 'callbackResponse.orderLines[].actualQty'))
+def generate(ctx, params):
+    """批量生成2B出库确认消息：出库单号唯一，SKU按仓库加权采样"""
+    warehouse_code = params.get('warehouse_code') or (ctx.sample_warehouse() or {}).get('warehouse_code', '')
+    lines = sample_order_lines(ctx, params, warehouse_code)
+    return transform_form_data({
+        'deliveryOrderCode': ctx.code('deliveryOrderCode'),
+        'warehouseCode': warehouse_code,
+        'itemCodes': [sku['sku_code'] for sku, _ in lines],
+        'actualQtys': [str(qty) for _, qty in lines]
+    }, ctx)
+
+
+@timed('build')
+def message_from_input(data):
+    """转换并校验一条出库输入，单条提交与批量提交共用"""
+    # 转换表单数据格式（提供seed时进入种子模式）
+    transformed_data = transform_form_data(data, context_from_request(data))
+    # 按输入结构校验必填字段
+    parse_request('stockout_push', transformed_data)
+    return transformed_data
+
+
 # ==================== 路由函数 ====================
 @stockout_push_bp.route('/')
 def index():
     # 出库单推送页面
-    return render_template('stockout_push.html', preset=config.STOCKOUT_PUSH_PRESET)
+    return render_cached('stockout_push.html', preset=config.STOCKOUT_PUSH_PRESET)
 
 
 @stockout_push_bp.route('/api/stockout_push', methods=['POST'])
@@ -114,52 +170,45 @@ def submit():
     try:
         # 1. 获取表单数据
         data = request.get_json()
+        # JSON数组：批量提交，逐条校验后按块推送，返回逐条结果
+        if isinstance(data, list):
+            return submit_batch(config.STOCKOUT_PUSH_QUEUE, data, message_from_input)
         if not data:
             return jsonify({
                 'status': 'error',
                 'message': '请求数据为空'
             }), 400
 
-        # 2. 转换表单数据格式
-        transformed_data = transform_form_data(data)
-
-        # 3. 验证必填字段
-        delivery_order = transformed_data['callbackResponse']['deliveryOrder']
-        required_fields = {
-            'deliveryOrderCode': delivery_order.get('deliveryOrderCode'),
-            'warehouseCode': delivery_order.get('warehouseCode')
-        }
-
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        if missing_fields:
-            error_msg = f"缺少必填字段: {', '.join(missing_fields)}"
-            logger.warning(f"出库单推送验证失败: {error_msg}")
-            return jsonify({
-                'status': 'error',
-                'message': error_msg
-            }), 400
+        # 2-3. 转换并校验
+        transformed_data = message_from_input(data)
+        delivery_order_code = transformed_data['callbackResponse']['deliveryOrder']['deliveryOrderCode']
 
         # 4. 推送消息到RabbitMQ
-        logger.info(f"最终推送给RabbitMQ的报文: {json.dumps(transformed_data, ensure_ascii=False)}")
         logger.info(f"推送队列名称: {config.STOCKOUT_PUSH_QUEUE}")
+        # 演练模式：只返回最终报文，不推送
+        if is_dry_run(data):
+            return dry_run_response(config.STOCKOUT_PUSH_QUEUE, transformed_data)
         success = push_message(config.STOCKOUT_PUSH_QUEUE, transformed_data)
         logger.info(f"推送结果: {success}")
 
         if success:
-            logger.info(f"出库单推送消息成功: {delivery_order.get('deliveryOrderCode')}")
+            logger.info(f"出库单推送消息成功: {delivery_order_code}")
             return jsonify({
                 'status': 'success',
                 'message': '出库单推送成功',
                 'queue': config.STOCKOUT_PUSH_QUEUE,
-                'delivery_order_code': delivery_order.get('deliveryOrderCode')
+                'delivery_order_code': delivery_order_code
             }), 200
         else:
-            logger.error(f"出库单推送消息失败: {delivery_order.get('deliveryOrderCode')}")
+            logger.error(f"出库单推送消息失败: {delivery_order_code}")
             return jsonify({
                 'status': 'error',
                 'message': '消息推送失败，请检查RabbitMQ连接'
             }), 500
 
+    except ValidationError as e:
+        logger.warning(f"出库单推送验证失败: {str(e)}")
+        return validation_error_response(e)
     except ValueError as e:
         logger.error(f"参数验证错误: {str(e)}")
         return jsonify({
@@ -34,9 +34,8 @@ function addTab(url, title) {
     content.style.display = 'none'; // 默认隐藏
     document.querySelector('.tab-content-container').appendChild(content);
 
-    // 4. 加载页面内容（Ajax异步加载）
-    fetch(url)
-        .then(response => response.text())
+    // 4. 加载页面内容（Ajax异步加载，已缓存的页面用ETag向服务器确认，未变化时返回304）
+    loadFragment(url)
         .then(html => {
             content.innerHTML = html; // 将页面内容插入容器
             activateTab(tab); // 激活新标签
@@ -53,6 +52,46 @@ function addTab(url, title) {
     });
 }
 
+// 页面片段缓存（sessionStorage，键为 fragment:页面路径，值为 {etag, html}）
+function getCachedFragment(url) {
+    try {
+        return JSON.parse(sessionStorage.getItem('fragment:' + url));
+    } catch (e) {
+        return null;
+    }
+}
+
+function setCachedFragment(url, etag, html) {
+    try {
+        sessionStorage.setItem('fragment:' + url, JSON.stringify({ etag: etag, html: html }));
+    } catch (e) {
+        // 超出存储配额时不缓存，下次重新获取
+        sessionStorage.removeItem('fragment:' + url);
+    }
+}
+
+// 加载页面片段：有缓存时带If-None-Match重新验证，304直接使用缓存内容
+function loadFragment(url) {
+    const cached = getCachedFragment(url);
+    const headers = cached && cached.etag ? { 'If-None-Match': cached.etag } : {};
+    return fetch(url, { headers: headers, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304 && cached) {
+                return cached.html;
+            }
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.text().then(html => {
+                const etag = response.headers.get('ETag');
+                if (etag) {
+                    setCachedFragment(url, etag, html);
+                }
+                return html;
+            });
+        });
+}
+
 // 激活标签页（切换内容显示）
 function activateTab(tab) {
     // 1. 移除所有标签的“激活状态”
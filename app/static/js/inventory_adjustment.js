@@ -173,6 +173,8 @@ class InventoryAdjustmentManager {
         console.log('开始提交库存调整请求，表单数据:', formValues);
         console.log('当前选择的API环境:', this.apiEnvSelect.value);
         
+        // 异步提交：接口立即返回任务ID，网关较慢时不占用服务端worker
+        formData.append('async', '1');
         fetch('/inventory_adjustment/submit', {
             method: 'POST',
             body: formData
@@ -190,6 +192,14 @@ class InventoryAdjustmentManager {
                 response: response
             }));
         })
+        .then(({ data, response }) => {
+            if (response.status === 202) {
+                console.log('请求已受理，任务ID:', data.requestId);
+                this.submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>等待网关响应...';
+                return this.waitForJob(data).then(result => ({ data: result, response: response }));
+            }
+            return { data: data, response: response };
+        })
         .then(({ data, response }) => {
             console.log('接口调用成功，完整响应数据:', data);
             
@@ -226,6 +236,39 @@ class InventoryAdjustmentManager {
         });
     }
 
+    waitForJob(accepted) {
+        // 优先使用SSE接收任务结果，不支持时退化为轮询
+        return new Promise((resolve, reject) => {
+            if (window.EventSource) {
+                const source = new EventSource(accepted.eventsUrl);
+                source.addEventListener('result', event => {
+                    source.close();
+                    resolve(JSON.parse(event.data).result);
+                });
+                source.onerror = () => {
+                    source.close();
+                    this.pollJob(accepted.statusUrl).then(resolve, reject);
+                };
+            } else {
+                this.pollJob(accepted.statusUrl).then(resolve, reject);
+            }
+        });
+    }
+
+    pollJob(statusUrl) {
+        return fetch(statusUrl)
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'success') {
+                    throw new Error(data.message || '任务查询失败');
+                }
+                if (data.job.status === 'success' || data.job.status === 'error') {
+                    return data.job.result;
+                }
+                return new Promise(resolve => setTimeout(resolve, 1000)).then(() => this.pollJob(statusUrl));
+            });
+    }
+
     showToast(message, type = 'info') {
         // 创建toast元素
         const toast = document.createElement('div');
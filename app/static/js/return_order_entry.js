@@ -389,8 +389,10 @@ class ReturnOrderEntryManager {
         this.jsonPreview.textContent = previewLines.join('\n');
       }
 
-      // 高亮JSON
-      hljs.highlightElement(this.jsonPreview);
+      // 高亮JSON（Prism延迟加载，未加载完成时跳过）
+      if (window.Prism) {
+        Prism.highlightElement(this.jsonPreview);
+      }
     } catch (error) {
       console.error('更新JSON预览失败:', error);
       this.jsonPreview.textContent = '// 生成预览失败: ' + error.message;
@@ -0,0 +1,180 @@
+/**
+ * 链路追踪页面JavaScript
+ * 追踪列表 + span瀑布图（缩进表示父子关系，条形表示起止时间，事件标记重连与重试）
+ */
+
+class TraceViewer {
+    constructor() {
+        this.list = document.getElementById('trace-list');
+        this.detail = document.getElementById('trace-detail');
+        this.summary = document.getElementById('trace-summary');
+        this.worker = document.getElementById('trace-worker');
+        this.filter = document.getElementById('trace-filter');
+        this.init();
+    }
+
+    init() {
+        this.filter.addEventListener('submit', (e) => {
+            e.preventDefault();
+            const traceId = document.getElementById('trace-id').value.trim();
+            if (traceId) {
+                this.showTrace(traceId);
+            }
+            this.loadTraces();
+        });
+        document.getElementById('refresh-traces').addEventListener('click', () => this.loadTraces());
+        this.list.addEventListener('click', (e) => {
+            const row = e.target.closest('tr[data-trace-id]');
+            if (row) {
+                this.list.querySelectorAll('tr.table-active').forEach(r => r.classList.remove('table-active'));
+                row.classList.add('table-active');
+                this.showTrace(row.dataset.traceId);
+            }
+        });
+        this.loadTraces();
+    }
+
+    escapeHtml(value) {
+        return String(value ?? '').replace(/[&<>"']/g, c => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[c]);
+    }
+
+    formatMs(ms) {
+        if (ms === null || ms === undefined) {
+            return '进行中';
+        }
+        return ms >= 1000 ? `${(ms / 1000).toFixed(2)}s` : `${ms.toFixed(1)}ms`;
+    }
+
+    loadTraces() {
+        const params = new URLSearchParams({ limit: 100 });
+        const name = document.getElementById('trace-name').value.trim();
+        const minMs = document.getElementById('trace-min-ms').value;
+        const status = document.getElementById('trace-status').value;
+        if (name) params.set('name', name);
+        if (minMs) params.set('min_ms', minMs);
+        if (status) params.set('status', status);
+
+        fetch(`/dashboard/get_traces?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'success') {
+                    throw new Error(data.message);
+                }
+                this.worker.textContent = `${data.traces.length}条 · 所有worker`;
+                this.renderList(data.traces);
+            })
+            .catch(error => {
+                this.list.innerHTML = `<tr><td colspan="4" class="text-center text-danger py-4">加载失败: ${this.escapeHtml(error.message)}</td></tr>`;
+            });
+    }
+
+    renderList(traces) {
+        if (!traces.length) {
+            this.list.innerHTML = '<tr><td colspan="4" class="text-center text-muted py-4">暂无追踪，提交任意订单后刷新</td></tr>';
+            return;
+        }
+        this.list.innerHTML = traces.map(trace => `
+            <tr data-trace-id="${this.escapeHtml(trace.trace_id)}" title="worker ${trace.pid}" style="cursor: pointer;">
+                <td class="text-nowrap"><small>${new Date(trace.start * 1000).toLocaleTimeString()}</small></td>
+                <td>
+                    ${trace.status === 'error'
+                        ? '<i class="fas fa-times-circle text-danger me-1"></i>'
+                        : (trace.error_spans
+                            ? `<i class="fas fa-exclamation-circle text-warning me-1" title="${trace.error_spans}个span失败（如重试）"></i>`
+                            : '<i class="fas fa-check-circle text-success me-1"></i>')}
+                    <small>${this.escapeHtml(trace.name)}</small>
+                </td>
+                <td class="text-end text-nowrap"><small>${this.formatMs(trace.duration_ms)}</small></td>
+                <td class="text-end"><small>${trace.span_count}${trace.dropped ? `+${trace.dropped}` : ''}</small></td>
+            </tr>
+        `).join('');
+    }
+
+    showTrace(traceId) {
+        fetch(`/dashboard/get_trace/${encodeURIComponent(traceId)}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'success') {
+                    throw new Error(data.message);
+                }
+                this.renderTrace(data.trace);
+            })
+            .catch(error => {
+                this.summary.textContent = '';
+                this.detail.innerHTML = `<div class="text-danger">${this.escapeHtml(error.message)}</div>`;
+            });
+    }
+
+    // 按父子关系排成深度优先的行序列
+    orderSpans(spans) {
+        const children = {};
+        const ids = new Set(spans.map(span => span.span_id));
+        spans.forEach(span => {
+            const parent = ids.has(span.parent_id) ? span.parent_id : '';
+            (children[parent] = children[parent] || []).push(span);
+        });
+        const rows = [];
+        const walk = (parentId, depth) => {
+            (children[parentId] || [])
+                .sort((a, b) => a.start_ms - b.start_ms)
+                .forEach(span => {
+                    rows.push({ span, depth });
+                    walk(span.span_id, depth + 1);
+                });
+        };
+        walk('', 0);
+        return rows;
+    }
+
+    renderTrace(trace) {
+        const total = Math.max(trace.duration_ms || 0, ...trace.spans.map(s => s.start_ms + (s.duration_ms || 0)), 0.001);
+        this.summary.textContent = `${trace.trace_id} · worker ${trace.pid} · ${this.formatMs(trace.duration_ms)} · ${trace.span_count}个span`
+            + (trace.dropped ? `（另有${trace.dropped}个超出上限未记录）` : '')
+            + (trace.remote_parent_id ? ` · 上游span ${trace.remote_parent_id}` : '');
+
+        const rows = this.orderSpans(trace.spans).map(({ span, depth }) => {
+            const left = (span.start_ms / total) * 100;
+            const width = Math.max(((span.duration_ms || 0) / total) * 100, 0.3);
+            const color = span.status === 'error' ? 'bg-danger' : (span.name.startsWith('rabbitmq') ? 'bg-warning' : 'bg-primary');
+            const events = span.events.map(event => {
+                const position = ((span.start_ms + event.offset_ms) / total) * 100;
+                const title = `${event.name} +${event.offset_ms}ms ${JSON.stringify(event.attributes)}`;
+                return `<span class="position-absolute bg-dark" title="${this.escapeHtml(title)}"
+                              style="left: ${position}%; top: 0; bottom: 0; width: 2px;"></span>`;
+            }).join('');
+            const attributes = Object.entries(span.attributes)
+                .map(([key, value]) => `${key}=${typeof value === 'object' ? JSON.stringify(value) : value}`)
+                .concat(span.events.map(event => `@${event.offset_ms}ms ${event.name} ${JSON.stringify(event.attributes)}`))
+                .concat(span.error ? [`错误: ${span.error}`] : [])
+                .join('\n');
+            return `
+                <div class="d-flex align-items-center py-1 border-bottom" title="${this.escapeHtml(attributes)}">
+                    <div class="text-truncate" style="width: 38%; padding-left: ${depth * 14}px;">
+                        <small class="${span.status === 'error' ? 'text-danger' : ''}">${this.escapeHtml(span.name)}</small>
+                    </div>
+                    <div class="position-relative flex-grow-1" style="height: 14px;">
+                        <span class="position-absolute rounded ${color}" style="left: ${left}%; width: ${width}%; top: 2px; bottom: 2px;"></span>
+                        ${events}
+                    </div>
+                    <div class="text-end text-nowrap" style="width: 70px;">
+                        <small>${this.formatMs(span.duration_ms)}</small>
+                    </div>
+                </div>
+            `;
+        }).join('');
+        this.detail.innerHTML = rows
+            + '<small class="text-muted d-block mt-2">悬停查看span属性与事件；黄色为RabbitMQ发布（每次重试一个span），黑色竖线为重连、重试等事件</small>';
+    }
+}
+
+// 初始化（作为标签页片段加载时DOM已就绪）
+let traceViewer;
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', () => {
+        traceViewer = new TraceViewer();
+    });
+} else {
+    traceViewer = new TraceViewer();
+}
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/20 10:00
+# file: assets.py
+# 静态资源打包：合并、压缩、内容哈希文件名，配合/assets路由的长期缓存
+import os
+import re
+import json
+import glob
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import rjsmin
+    import rcssmin
+except ImportError:  # pragma: no cover - 未安装时只合并不压缩
+    rjsmin = rcssmin = None
+
+logger = logging.getLogger(__name__)
+
+# 公共资源包（路径相对于app/static）
+BUNDLES = {
+    'base.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        'vendor/fontawesome/css/all.min.css',
+        'CSS/style.css',
+    ],
+    'base.js': [
+        'vendor/bootstrap/popper.min.js',
+        'vendor/bootstrap/bootstrap.min.js',
+        'vendor/chart/chart.umd.min.js',
+    ],
+    # 代码高亮（非关键资源，页面中异步/延迟加载，不阻塞首屏）
+    'highlight.css': [
+        'vendor/prism/prism-tomorrow.css',
+    ],
+    'highlight.js': [
+        'vendor/prism/prism.min.js',
+    ],
+}
+
+# 各页面脚本单独打包（js/xxx.js），只在对应页面加载
+PAGE_SCRIPTS_GLOB = 'js/*.js'
+
+SOURCE_MAP_RE = re.compile(r'^\s*//# sourceMappingURL=.*$|/\*# sourceMappingURL=.*?\*/', re.M)
+# 构建时额外写出.gz/.br预压缩文件的类型（woff2等已压缩的格式不处理）
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.svg')
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    """js/order_delivery.js -> js/order_delivery.<hash>.js"""
+    root, ext = os.path.splitext(name)
+    return f'{root}.{content_hash(data)}{ext}'
+
+
+class AssetPipeline:
+    """把BUNDLES和页面脚本构建到output_dir，文件名带内容哈希
+
+    - 已是.min的文件只去掉sourceMappingURL，其余文件用rjsmin/rcssmin压缩
+    - CSS中的相对url()（字体等）同样复制为带哈希的文件并改写引用
+    - CSS、JS另外写出最高压缩级别的.gz/.br文件
+    - 构建结果只与源文件内容有关，多个worker同时构建写出的是相同文件
+    """
+
+    def __init__(self, static_dir: str, output_dir: str, url_prefix: str = '/assets', auto_reload: bool = False):
+        self.static_dir = static_dir
+        self.output_dir = output_dir
+        self.url_prefix = url_prefix.rstrip('/')
+        self.auto_reload = auto_reload
+        self.manifest: Dict[str, str] = {}
+        self.version = ''
+        self._sources_mtime = 0.0
+        self._lock = threading.Lock()
+
+    # ==================== 构建 ====================
+    def bundles(self) -> Dict[str, List[str]]:
+        bundles = dict(BUNDLES)
+        for path in sorted(glob.glob(os.path.join(self.static_dir, PAGE_SCRIPTS_GLOB))):
+            name = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+            bundles[name] = [name]
+        return bundles
+
+    def _sources(self) -> List[str]:
+        return [os.path.join(self.static_dir, source) for sources in self.bundles().values() for source in sources]
+
+    def _latest_mtime(self) -> float:
+        return max((os.path.getmtime(path) for path in self._sources() if os.path.exists(path)), default=0.0)
+
+    def _write(self, name: str, data: bytes) -> str:
+        """写出带哈希的文件（已存在则跳过），返回相对output_dir的文件名"""
+        target_name = hashed_name(name, data)
+        target = os.path.join(self.output_dir, target_name)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f'{target}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+            if target_name.endswith(PRECOMPRESS_EXTENSIONS):
+                self._write_precompressed(target, data)
+        return target_name
+
+    @staticmethod
+    def _write_precompressed(target: str, data: bytes):
+        """写出 xxx.js.gz / xxx.js.br，/assets路由按Accept-Encoding直接返回"""
+        from app.utils.compression import ENCODINGS, ENCODING_SUFFIXES, compress
+        for encoding in ENCODINGS:
+            path = target + ENCODING_SUFFIXES[encoding]
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(compress(data, encoding, static=True))
+            os.replace(tmp_path, path)
+
+    def _rewrite_css_urls(self, css: str, source: str) -> str:
+        """把CSS中指向本地文件的相对url()改为输出目录中带哈希的文件"""
+        source_dir = os.path.dirname(os.path.join(self.static_dir, source))
+
+        def replace(match):
+            url = match.group(2)
+            if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+                return match.group(0)
+            path = os.path.normpath(os.path.join(source_dir, url.split('?')[0].split('#')[0]))
+            if not os.path.isfile(path):
+                # 例如字体的ttf备选格式未随vendor提供，浏览器会优先使用woff2
+                return match.group(0)
+            with open(path, 'rb') as f:
+                data = f.read()
+            return f'url({self._write("files/" + os.path.basename(path), data)})'
+
+        return CSS_URL_RE.sub(replace, css)
+
+    def _read_source(self, source: str) -> str:
+        with open(os.path.join(self.static_dir, source), 'r', encoding='utf-8') as f:
+            text = SOURCE_MAP_RE.sub('', f.read())
+        if source.endswith('.css'):
+            text = self._rewrite_css_urls(text, source)
+        if '.min.' in source:
+            return text
+        if source.endswith('.js') and rjsmin:
+            return rjsmin.jsmin(text, keep_bang_comments=True)
+        if source.endswith('.css') and rcssmin:
+            return rcssmin.cssmin(text, keep_bang_comments=True)
+        return text
+
+    def build(self) -> Dict[str, str]:
+        """构建全部资源包，返回 {资源名: 带哈希的文件名}"""
+        manifest = {}
+        for name, sources in self.bundles().items():
+            separator = ';\n' if name.endswith('.js') else '\n'
+            data = separator.join(self._read_source(source).strip() for source in sources).encode('utf-8')
+            manifest[name] = self._write(name, data)
+        with self._lock:
+            self.manifest = manifest
+            self.version = content_hash(json.dumps(manifest, sort_keys=True).encode('utf-8'))
+            self._sources_mtime = self._latest_mtime()
+        logger.info(f"静态资源构建完成: {len(manifest)}个资源包 -> {self.output_dir}")
+        return manifest
+
+    # ==================== 引用 ====================
+    def _reload_if_changed(self):
+        if self.auto_reload and self._latest_mtime() > self._sources_mtime:
+            self.build()
+
+    def current_version(self) -> str:
+        """当前资源清单的版本号（任一资源包内容变化时改变），用于页面缓存的键"""
+        self._reload_if_changed()
+        return self.version
+
+    def url(self, name: str) -> Optional[str]:
+        """资源包的URL；未知资源返回None"""
+        self._reload_if_changed()
+        target = self.manifest.get(name)
+        return f'{self.url_prefix}/{target}' if target else None
+
+
+_asset_pipeline = None
+
+
+def get_asset_pipeline() -> AssetPipeline:
+    """获取静态资源管道（进程内单例）"""
+    global _asset_pipeline
+    if _asset_pipeline is None:
+        from config import config
+        static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+        _asset_pipeline = AssetPipeline(static_dir, config.ASSET_BUILD_DIR, auto_reload=config.ASSET_AUTO_RELOAD)
+    return _asset_pipeline
+
+
+def init_assets(app):
+    """启动时构建资源包，并注册模板函数asset_url(filename)
+
+    asset_url与url_for('static', filename=...)用法相同：资源包返回带哈希的/assets地址，其他文件回退到/static
+    """
+    from flask import url_for
+    pipeline = get_asset_pipeline()
+    try:
+        pipeline.build()
+    except Exception as e:
+        logger.error(f"静态资源构建失败: {str(e)}")
+
+    def asset_url(filename: str) -> str:
+        return pipeline.url(filename) or url_for('static', filename=filename)
+
+    app.jinja_env.globals['asset_url'] = asset_url
+    return pipeline
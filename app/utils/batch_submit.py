@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/23 10:00
+# file: batch_submit.py
+# 批量提交：各提交接口的JSON请求体为数组时，逐条校验、按块在一个事务中推送，返回逐条结果（大批量时NDJSON流式返回）
+import json
+import time
+import logging
+from typing import Any, Callable, Dict, Iterator, List
+
+from flask import request, jsonify, Response, stream_with_context
+
+from config import config
+from app.utils.schema import ValidationError
+from app.utils.output_schema import check_output, resolve_mode
+from app.utils.dry_run import is_dry_run, NDJSON_MIMETYPE
+from app.utils.push_history import extract_business_keys
+from app.utils.rabbitmq import push_batch
+from app.utils.timing import stage
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStats:
+    """批量提交的汇总统计"""
+
+    STATUSES = ('published', 'dry_run', 'invalid', 'failed', 'error')
+
+    def __init__(self, queue_name: str, total: int, dry_run: bool, validation: str):
+        self.queue_name = queue_name
+        self.total = total
+        self.dry_run = dry_run
+        self.validation = validation
+        self.started = time.time()
+        self.counts = dict.fromkeys(self.STATUSES, 0)
+
+    def add(self, result: Dict[str, Any]):
+        self.counts[result['status']] += 1
+
+    @property
+    def ok(self) -> bool:
+        return not (self.counts['invalid'] or self.counts['failed'] or self.counts['error'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'queue': self.queue_name,
+            'count': self.total,
+            'dry_run': self.dry_run,
+            'validation': self.validation,
+            **{f'{status}_count': count for status, count in self.counts.items()},
+            'elapsed': round(time.time() - self.started, 3)
+        }
+
+
+def _keys(message: Dict[str, Any]) -> Dict[str, str]:
+    """结果中附带的业务单号（与推送历史的检索字段相同）"""
+    return dict(extract_business_keys(message, config.PUSH_HISTORY_KEY_FIELDS, max_values=len(config.PUSH_HISTORY_KEY_FIELDS)))
+
+
+def iter_batch(queue_name: str, items: List[Any], build: Callable[[Dict[str, Any]], Dict[str, Any]],
+               dry_run: bool, validation: str, stats: BatchStats) -> Iterator[Dict[str, Any]]:
+    """逐条构建并校验，合格的报文攒满BATCH_PUBLISH_CHUNK条后一次推送；一条出错不影响其他条"""
+    chunk: List[Dict[str, Any]] = []
+
+    def flush():
+        if not chunk:
+            return
+        if dry_run:
+            success = True
+        else:
+            # 已按本次的模式逐条校验过，推送时不再重复校验
+            success = push_batch(queue_name, [entry.pop('_message') for entry in chunk], validation='off')
+        for entry in chunk:
+            if dry_run:
+                entry['status'] = 'dry_run'
+                entry['data'] = entry.pop('_message')
+            else:
+                entry['status'] = 'published' if success else 'failed'
+                if not success:
+                    entry['message'] = '消息推送失败，请检查RabbitMQ连接'
+            stats.add(entry)
+            yield entry
+        chunk.clear()
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            result = {'index': index, 'status': 'invalid', 'message': '每条订单必须为JSON对象'}
+            stats.add(result)
+            yield result
+            continue
+        try:
+            message = build(item)
+            with stage('validate'):
+                schema_errors = check_output(queue_name, message, validation)
+        except ValidationError as e:
+            result = {'index': index, 'status': 'invalid', 'message': str(e), 'errors': e.errors}
+            stats.add(result)
+            yield result
+            continue
+        except ValueError as e:
+            result = {'index': index, 'status': 'invalid', 'message': f'参数格式错误: {str(e)}'}
+            stats.add(result)
+            yield result
+            continue
+        except Exception as e:
+            logger.error(f"批量提交第{index}条处理异常: {str(e)}")
+            result = {'index': index, 'status': 'error', 'message': f'系统错误: {str(e)}'}
+            stats.add(result)
+            yield result
+            continue
+
+        entry = {'index': index, 'keys': _keys(message), '_message': message}
+        if schema_errors:
+            entry['schema_errors'] = schema_errors
+        chunk.append(entry)
+        if len(chunk) >= config.BATCH_PUBLISH_CHUNK:
+            yield from flush()
+    yield from flush()
+
+
+def submit_batch(queue_name: str, items: List[Any], build: Callable[[Dict[str, Any]], Dict[str, Any]]):
+    """批量提交入口：items为JSON数组，build(item)把一条输入构建为最终报文（校验失败抛出ValidationError）
+
+    - 演练模式（?dryRun=true）逐条返回最终报文，不推送
+    - ?validation=strict|warn|off 覆盖本次的输出结构校验模式
+    - 条数超过BATCH_INLINE_MAX或Accept为NDJSON时流式返回NDJSON：每行一条结果，最后一行为汇总
+    """
+    if not items:
+        raise ValueError('批量提交的订单列表不能为空')
+    if len(items) > config.BATCH_SUBMIT_MAX:
+        raise ValueError(f'单次批量提交不能超过{config.BATCH_SUBMIT_MAX}条')
+    dry_run = is_dry_run()
+    validation = resolve_mode(request.args.get('validation'))
+    stats = BatchStats(queue_name, len(items), dry_run, validation)
+    logger.info(f"批量提交开始: queue={queue_name}, 条数={len(items)}, 演练={dry_run}, 校验模式={validation}")
+
+    if NDJSON_MIMETYPE in request.headers.get('Accept', '') or len(items) > config.BATCH_INLINE_MAX:
+        def stream():
+            for result in iter_batch(queue_name, items, build, dry_run, validation, stats):
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+            logger.info(f"批量提交完成: {stats.to_dict()}")
+            yield json.dumps({'summary': stats.to_dict()}, ensure_ascii=False) + '\n'
+        return Response(stream_with_context(stream()), mimetype=NDJSON_MIMETYPE)
+
+    results = list(iter_batch(queue_name, items, build, dry_run, validation, stats))
+    logger.info(f"批量提交完成: {stats.to_dict()}")
+    return jsonify({
+        'status': 'success' if stats.ok else 'error',
+        'message': '批量提交完成' if stats.ok else '部分订单未通过校验或推送失败，详见results',
+        'summary': stats.to_dict(),
+        'results': results
+    })
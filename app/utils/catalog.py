@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/13 09:40
+# file: catalog.py
+# 商品/店铺/仓库基础数据目录模块
+import os
+import csv
+import json
+import time
+import hashlib
+import random
+import sqlite3
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 各类基础数据的主键字段
+SKU_KEY = 'sku_code'
+STORE_KEY = 'store_id'
+WAREHOUSE_KEY = 'warehouse_code'
+
+DEFAULT_CATALOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fixtures', 'catalog')
+
+
+class WeightedSampler:
+    """基于别名法（Vose Alias Method）的加权随机采样器
+
+    构建 O(n)，单次采样 O(1)，适合在大量SKU中按热度反复抽样
+    """
+
+    __slots__ = ('items', '_prob', '_alias')
+
+    def __init__(self, items: Sequence[Dict[str, Any]], weights: Sequence[float]):
+        self.items = list(items)
+        n = len(self.items)
+        self._prob = [0.0] * n
+        self._alias = [0] * n
+        if n == 0:
+            return
+
+        total = float(sum(weights))
+        if total <= 0:
+            # 权重全为0时退化为均匀分布
+            weights = [1.0] * n
+            total = float(n)
+        scaled = [w * n / total for w in weights]
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            g = large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = g
+            scaled[g] = scaled[g] + scaled[s] - 1.0
+            (small if scaled[g] < 1.0 else large).append(g)
+        for i in large + small:
+            self._prob[i] = 1.0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def sample(self, rng: Optional[random.Random] = None) -> Optional[Dict[str, Any]]:
+        """加权抽取一条记录，rng可传入带种子的随机源以保证可复现"""
+        if not self.items:
+            return None
+        rng = rng or random
+        i = int(rng.random() * len(self.items))
+        return self.items[i] if rng.random() < self._prob[i] else self.items[self._alias[i]]
+
+    def sample_many(self, count: int, rng: Optional[random.Random] = None) -> List[Dict[str, Any]]:
+        """加权抽取count条记录（有放回）"""
+        return [self.sample(rng) for _ in range(count)]
+
+
+class CatalogSnapshot:
+    """一次加载得到的只读目录快照，包含所有索引与采样器
+
+    version为全部记录的内容哈希：来源文件变化但内容相同时不变，种子生成的结果可据此判断能否复现
+    """
+
+    def __init__(self, skus: List[Dict[str, Any]], stores: List[Dict[str, Any]],
+                 warehouses: List[Dict[str, Any]], source: str, source_mtime: float = 0.0):
+        self.source = source
+        self.source_mtime = source_mtime
+        self.loaded_at = time.time()
+        self.version = content_version(skus, stores, warehouses)
+        self.skus = skus
+        self.stores = stores
+        self.warehouses = warehouses
+
+        # 主键索引
+        self.skus_by_code = {sku[SKU_KEY]: sku for sku in skus}
+        self.stores_by_id = {store[STORE_KEY]: store for store in stores}
+        self.warehouses_by_code = {wh[WAREHOUSE_KEY]: wh for wh in warehouses}
+
+        # 二级索引：按仓库、按店铺分组
+        self.skus_by_warehouse: Dict[str, List[Dict[str, Any]]] = {}
+        self.skus_by_store: Dict[str, List[Dict[str, Any]]] = {}
+        for sku in skus:
+            if sku.get('warehouse_code'):
+                self.skus_by_warehouse.setdefault(sku['warehouse_code'], []).append(sku)
+            if sku.get('store_id'):
+                self.skus_by_store.setdefault(sku['store_id'], []).append(sku)
+
+        # 采样器
+        self.sku_sampler = _build_sampler(skus)
+        self.store_sampler = _build_sampler(stores)
+        self.warehouse_sampler = _build_sampler(warehouses)
+        self.sku_sampler_by_warehouse = {code: _build_sampler(rows) for code, rows in self.skus_by_warehouse.items()}
+        self.sku_sampler_by_store = {code: _build_sampler(rows) for code, rows in self.skus_by_store.items()}
+
+    # ==================== 采样 ====================
+    def sample_skus(self, count: int = 1, warehouse_code: Optional[str] = None, store_id: Optional[str] = None,
+                    rng: Optional[random.Random] = None) -> List[Dict[str, Any]]:
+        """按权重抽取SKU，可限定仓库或店铺"""
+        if warehouse_code:
+            sampler = self.sku_sampler_by_warehouse.get(warehouse_code)
+        elif store_id:
+            sampler = self.sku_sampler_by_store.get(str(store_id))
+        else:
+            sampler = self.sku_sampler
+        if not sampler:
+            return []
+        return sampler.sample_many(count, rng)
+
+    def sample_store(self, rng: Optional[random.Random] = None) -> Optional[Dict[str, Any]]:
+        return self.store_sampler.sample(rng)
+
+    def sample_warehouse(self, rng: Optional[random.Random] = None) -> Optional[Dict[str, Any]]:
+        return self.warehouse_sampler.sample(rng)
+
+    def version_info(self) -> Dict[str, Any]:
+        """快照版本（写入数据集元数据与批量生成结果）"""
+        return {'source': self.source, 'mtime': self.source_mtime, 'version': self.version}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'source': self.source,
+            'source_mtime': self.source_mtime,
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'sku_count': len(self.skus),
+            'store_count': len(self.stores),
+            'warehouse_count': len(self.warehouses),
+            'warehouses': {code: len(rows) for code, rows in self.skus_by_warehouse.items()},
+            'stores': {code: len(rows) for code, rows in self.skus_by_store.items()}
+        }
+
+
+def content_version(*tables: List[Dict[str, Any]]) -> str:
+    """基础数据内容哈希（16位十六进制）"""
+    digest = hashlib.blake2b(digest_size=8)
+    for rows in tables:
+        for row in rows:
+            digest.update(json.dumps(row, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+            digest.update(b'\n')
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def _build_sampler(rows: List[Dict[str, Any]]) -> WeightedSampler:
+    return WeightedSampler(rows, [row.get('weight', 1.0) for row in rows])
+
+
+def _normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """去除空白，统一编码字段为字符串、权重为浮点数"""
+    normalized = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip()
+        if key == 'weight':
+            try:
+                normalized[key] = float(value) if value not in (None, '') else 1.0
+            except (TypeError, ValueError):
+                normalized[key] = 1.0
+        else:
+            normalized[key] = str(value).strip() if value is not None else ''
+    normalized.setdefault('weight', 1.0)
+    return normalized
+
+
+def _load_csv(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return [_normalize_row(row) for row in csv.DictReader(f)]
+
+
+def _load_sqlite_table(conn: sqlite3.Connection, table: str) -> List[Dict[str, Any]]:
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    if not exists:
+        return []
+    return [_normalize_row(dict(row)) for row in conn.execute(f'SELECT * FROM {table}')]
+
+
+def synthesize_skus(count: int, warehouses: List[Dict[str, Any]], stores: List[Dict[str, Any]],
+                    zipf_s: float = 1.1, seed: int = 0) -> List[Dict[str, Any]]:
+    """生成count个合成SKU，权重服从Zipf分布（第k个SKU权重为 1/k^s），模拟真实的长尾热度"""
+    rng = random.Random(seed)
+    warehouse_codes = [wh[WAREHOUSE_KEY] for wh in warehouses] or ['DCN']
+    store_ids = [store[STORE_KEY] for store in stores] or ['215']
+    skus = []
+    for k in range(1, count + 1):
+        warehouse_code = warehouse_codes[rng.randrange(len(warehouse_codes))]
+        owner_code = next((wh.get('owner_code') for wh in warehouses if wh[WAREHOUSE_KEY] == warehouse_code), 'XIER')
+        sku_code = f'69{k:011d}'
+        skus.append({
+            'sku_code': sku_code,
+            'item_id': sku_code,
+            'item_name': f'合成商品{k}',
+            'owner_code': owner_code or 'XIER',
+            'warehouse_code': warehouse_code,
+            'store_id': store_ids[rng.randrange(len(store_ids))],
+            'weight': 1.0 / (k ** zipf_s)
+        })
+    return skus
+
+
+class Catalog:
+    """基础数据目录：从CSV目录或SQLite文件加载，支持不停机热加载
+
+    读取方只持有快照引用，重新加载时整体替换快照，读路径无需加锁
+    """
+
+    def __init__(self, source: Optional[str] = None, synthetic_sku_count: int = 0, reload_interval: int = 0):
+        self.source = source or DEFAULT_CATALOG_DIR
+        self.synthetic_sku_count = synthetic_sku_count
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._source_mtime = None
+        self._last_check = 0.0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self.reload()
+
+    def _current_mtime(self) -> float:
+        if os.path.isdir(self.source):
+            mtimes = [os.path.getmtime(os.path.join(self.source, name))
+                      for name in ('skus.csv', 'stores.csv', 'warehouses.csv')
+                      if os.path.exists(os.path.join(self.source, name))]
+            return max(mtimes) if mtimes else 0.0
+        return os.path.getmtime(self.source) if os.path.exists(self.source) else 0.0
+
+    def _load(self, mtime: float = 0.0) -> CatalogSnapshot:
+        if os.path.isdir(self.source):
+            skus = _load_csv(os.path.join(self.source, 'skus.csv'))
+            stores = _load_csv(os.path.join(self.source, 'stores.csv'))
+            warehouses = _load_csv(os.path.join(self.source, 'warehouses.csv'))
+        elif self.source.endswith(('.db', '.sqlite', '.sqlite3')):
+            conn = sqlite3.connect(f'file:{self.source}?mode=ro', uri=True)
+            conn.row_factory = sqlite3.Row
+            try:
+                skus = _load_sqlite_table(conn, 'skus')
+                stores = _load_sqlite_table(conn, 'stores')
+                warehouses = _load_sqlite_table(conn, 'warehouses')
+            finally:
+                conn.close()
+        else:
+            raise ValueError(f'不支持的基础数据来源: {self.source}（需为CSV目录或SQLite文件）')
+
+        if self.synthetic_sku_count > 0:
+            skus = skus + synthesize_skus(self.synthetic_sku_count, warehouses, stores)
+        return CatalogSnapshot(skus, stores, warehouses, self.source, mtime)
+
+    def reload(self) -> Dict[str, Any]:
+        """重新加载基础数据，失败时保留旧快照"""
+        with self._lock:
+            mtime = self._current_mtime()
+            snapshot = self._load(mtime)
+            self._snapshot = snapshot
+            self._source_mtime = mtime
+            self._last_check = time.time()
+        logger.info(f"基础数据目录加载完成: {snapshot.stats()['sku_count']}个SKU, 来源: {self.source}")
+        return snapshot.stats()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """获取当前快照；配置了reload_interval时按间隔检查来源文件是否变化"""
+        if self.reload_interval > 0 and time.time() - self._last_check >= self.reload_interval:
+            self._last_check = time.time()
+            try:
+                if self._current_mtime() != self._source_mtime:
+                    self.reload()
+            except Exception as e:
+                logger.error(f"基础数据目录自动重载失败，继续使用旧数据: {str(e)}")
+        return self._snapshot
+
+    # ==================== 查询 ====================
+    def get_sku(self, sku_code: str) -> Optional[Dict[str, Any]]:
+        return self.snapshot.skus_by_code.get(sku_code)
+
+    def get_store(self, store_id: str) -> Optional[Dict[str, Any]]:
+        return self.snapshot.stores_by_id.get(str(store_id))
+
+    def get_warehouse(self, warehouse_code: str) -> Optional[Dict[str, Any]]:
+        return self.snapshot.warehouses_by_code.get(warehouse_code)
+
+    def skus_in_warehouse(self, warehouse_code: str) -> List[Dict[str, Any]]:
+        return self.snapshot.skus_by_warehouse.get(warehouse_code, [])
+
+    def skus_in_store(self, store_id: str) -> List[Dict[str, Any]]:
+        return self.snapshot.skus_by_store.get(str(store_id), [])
+
+    # ==================== 采样 ====================
+    def sample_skus(self, count: int = 1, warehouse_code: Optional[str] = None, store_id: Optional[str] = None,
+                    rng: Optional[random.Random] = None) -> List[Dict[str, Any]]:
+        """按权重抽取SKU，可限定仓库或店铺"""
+        return self.snapshot.sample_skus(count, warehouse_code, store_id, rng)
+
+    def sample_store(self, rng: Optional[random.Random] = None) -> Optional[Dict[str, Any]]:
+        return self.snapshot.sample_store(rng)
+
+    def sample_warehouse(self, rng: Optional[random.Random] = None) -> Optional[Dict[str, Any]]:
+        return self.snapshot.sample_warehouse(rng)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.snapshot.stats()
+
+
+# 全局基础数据目录实例
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """获取基础数据目录实例（单例模式）"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                from config import config
+                _catalog = Catalog(
+                    source=getattr(config, 'CATALOG_SOURCE', None),
+                    synthetic_sku_count=getattr(config, 'CATALOG_SYNTHETIC_SKU_COUNT', 0),
+                    reload_interval=getattr(config, 'CATALOG_RELOAD_INTERVAL', 0)
+                )
+    return _catalog
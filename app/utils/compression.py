@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/21 15:00
+# file: compression.py
+# 响应压缩：按Accept-Encoding选择brotli/gzip，流式响应（SSE、NDJSON）逐块压缩并立即刷新
+import gzip
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 未安装时只使用gzip
+    brotli = None
+
+# 客户端可接受时优先使用brotli
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+# 预压缩文件的后缀
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# 动态响应的压缩级别（兼顾速度）；构建时预压缩的静态资源使用最高级别
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+
+def choose_encoding(accept_encodings, encodings: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """按请求的Accept-Encoding（request.accept_encodings）选择编码，q值相同时按encodings的顺序"""
+    return accept_encodings.best_match(list(encodings)) if accept_encodings else None
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    """逐块压缩并刷新，每个事件都能立即到达客户端；关闭时同时关闭原始迭代器"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """压缩后的响应使用不同的强ETag（原ETag-编码）"""
+    return f'{etag}-{encoding}'
+
+
+class VariantCache:
+    """带强ETag的响应（如页面缓存）的压缩结果缓存，按 (ETag, 编码) 复用，总字节数有上限"""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Tuple[str, str], bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, etag: str, encoding: str, data: bytes) -> bytes:
+        key = (etag, encoding)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+        compressed = compress(data, encoding)
+        if len(compressed) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = compressed
+                    self._bytes += len(compressed)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return compressed
+
+
+def init_compression(app):
+    """注册after_request压缩钩子
+
+    - 只压缩COMPRESSION_MIMETYPES中的类型，非流式响应小于COMPRESSION_MIN_SIZE时不压缩
+    - 流式响应（SSE、NDJSON）逐块压缩；文件响应（direct_passthrough）由各自路由处理
+    - 带强ETag的响应压缩结果进入VariantCache，If-None-Match匹配压缩后的ETag时返回304
+    - 可压缩类型的304响应同样带 Vary: Accept-Encoding
+    """
+    from flask import request
+
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+    mimetypes = frozenset(app.config.get('COMPRESSION_MIMETYPES', ()))
+    min_size = app.config.get('COMPRESSION_MIN_SIZE', 1024)
+    variants = VariantCache(app.config.get('COMPRESSION_CACHE_BYTES', 16 * 1024 * 1024))
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304 and response.mimetype in mimetypes:
+            # 304（如render_cached对未压缩ETag的确认）也要声明随Accept-Encoding变化，与200响应一致
+            response.vary.add('Accept-Encoding')
+            return response
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.mimetype not in mimetypes or request.method == 'HEAD'):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if not encoding:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            tag = encoded_etag(etag, encoding)
+            if request.if_none_match.contains(tag):
+                response.status_code = 304
+                response.set_data(b'')
+                response.headers.pop('Content-Length', None)
+                response.set_etag(tag)
+                return response
+            response.set_data(variants.get_or_compress(etag, encoding, data))
+            response.set_etag(tag)
+        else:
+            response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -2,60 +2,294 @@
 # time: 2025/8/1 11:30
 # file: dashboard_data.py
 # 仪表盘数据管理模块
-import time
+import os
 import json
-from datetime import datetime
-from typing import List, Dict, Any
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional
+
+from app.utils.metrics import get_queue_metrics
+from app.utils.push_history import PushHistory, PushRecord, extract_business_keys
+from app.utils.shared_store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+MEMO_KEY = 'memo'
 
 
 class DashboardDataManager:
-    """仪表盘数据管理器"""
+    """仪表盘数据管理器
+
+    数据保存在共享SQLite存储中，所有worker看到同一份菜单统计、备忘录、推送历史、队列指标、慢请求和追踪：
+    - 菜单计数、推送记录、有变化的指标桶、慢请求和追踪先写进程内缓冲，由后台线程每STORE_FLUSH_INTERVAL秒合并为一个事务写回
+    - 推送记录另有独立的待写回队列（与展示用的环形缓冲区无关），积压超过STORE_FLUSH_WATERMARK条时立即唤醒写回线程，
+      超过STORE_PENDING_MAX条时丢弃最旧的记录并计入dropped
+    - 备忘录直接写入（低频操作）
+    - 读取结果缓存STORE_CACHE_TTL秒，仪表盘轮询不会每次都访问数据库
+    """
     _instance = None
+    _init_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(DashboardDataManager, cls).__new__(cls)
-            # 初始化数据存储
-            cls._instance.rabbitmq_logs = []  # RabbitMQ请求记录
-            cls._instance.memo_content = ""  # 备忘录内容
-            cls._instance.menu_stats = {}  # 菜单请求次数统计
+            with cls._init_lock:
+                if cls._instance is None:
+                    from config import config
+                    instance = super(DashboardDataManager, cls).__new__(cls)
+                    # 初始化数据存储
+                    instance.push_history = PushHistory(  # RabbitMQ请求记录（本进程最近的记录，环形缓冲区）
+                        capacity=config.PUSH_HISTORY_CAPACITY,
+                        max_bytes=config.PUSH_HISTORY_MAX_BYTES,
+                        max_record_bytes=config.PUSH_HISTORY_MAX_RECORD_BYTES
+                    )
+                    instance.store = SharedStore(config.DASHBOARD_STORE_PATH)
+                    instance.flush_interval = config.STORE_FLUSH_INTERVAL
+                    instance.cache_ttl = config.STORE_CACHE_TTL
+                    instance.key_fields = tuple(config.PUSH_HISTORY_KEY_FIELDS)
+                    instance.flush_watermark = config.STORE_FLUSH_WATERMARK
+                    instance.pending_max = config.STORE_PENDING_MAX
+                    instance.slow_capacity = max(config.SLOW_REQUEST_LOG_SIZE, 0)
+                    instance.trace_capacity = max(config.TRACE_BUFFER_SIZE, 0)
+                    instance._lock = threading.Lock()
+                    instance._pending_records = deque()  # 尚未写回的推送记录
+                    instance._dropped_records = 0  # 待写回队列超出上限而丢弃的推送记录数
+                    instance._pending_menu = {}  # 尚未写回的菜单计数增量
+                    instance._pending_slow = []  # 尚未写回的慢请求（最多slow_capacity条，超出丢弃最旧的）
+                    instance._pending_traces = OrderedDict()  # 尚未写回的追踪（按trace_id，最多trace_capacity条）
+                    instance._cache = {}
+                    instance._pid = None
+                    instance._wakeup = threading.Event()
+                    cls._instance = instance
         return cls._instance
 
-    def log_rabbitmq_request(self, queue_name: str, message: Dict[str, Any], success: bool):
-        """记录RabbitMQ请求"""
-        log_entry = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'queue_name': queue_name,
-            'message': message,
-            'success': success,
-            'message_str': json.dumps(message, ensure_ascii=False)
+    # ==================== 写回 ====================
+    def _ensure_flusher(self):
+        """当前进程首次写入时启动写回线程（fork后的子进程会重新启动自己的线程）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # 父进程未写回的数据由父进程负责，子进程丢弃继承来的缓冲
+            self._pending_menu = {}
+            self._pending_slow = []
+            self._pending_traces = OrderedDict()
+            self._pending_records = deque()
+            self._cache = {}
+            self._wakeup = threading.Event()
+            self._pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name='dashboard-store-flusher', daemon=True).start()
+            atexit.register(self._flush_quietly)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush_quietly()
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"仪表盘数据写回失败: {str(e)}")
+
+    def flush(self):
+        """把缓冲的菜单计数、推送记录、指标桶、慢请求和追踪合并为一个事务写入共享存储"""
+        from config import config
+        queue_metrics = get_queue_metrics()
+        with self._lock:
+            menu_counts, self._pending_menu = self._pending_menu, {}
+            slow_requests, self._pending_slow = self._pending_slow, []
+            traces = list(self._pending_traces.values())
+            records, self._pending_records = list(self._pending_records), deque()
+        metric_rows, metric_keys = queue_metrics.collect_dirty()
+        if not menu_counts and not records and not metric_rows and not slow_requests and not traces:
+            return
+        try:
+            self.store.write_batch(
+                menu_counts, records, self._pid,
+                history_capacity=config.STORE_HISTORY_CAPACITY,
+                history_max_bytes=config.STORE_HISTORY_MAX_BYTES,
+                metric_rows=metric_rows,
+                metric_cutoffs=queue_metrics.cutoffs(),
+                slow_requests=slow_requests,
+                slow_request_capacity=config.SLOW_REQUEST_LOG_SIZE,
+                traces=[trace[1] for trace in traces],
+                trace_capacity=config.TRACE_BUFFER_SIZE
+            )
+        except Exception:
+            # 写回失败时把计数、推送记录、指标桶和慢请求放回缓冲，下一轮重试；追踪写成功前一直留在缓冲中
+            queue_metrics.mark_dirty(metric_keys)
+            with self._lock:
+                self._pending_slow[:0] = slow_requests
+                self._trim_pending_slow()
+                for menu_name, count in menu_counts.items():
+                    self._pending_menu[menu_name] = self._pending_menu.get(menu_name, 0) + count
+                self._pending_records.extendleft(reversed(records))
+                self._trim_pending_records()
+            raise
+        with self._lock:
+            # 写回期间同一trace_id又有新的一段时保留新的
+            for trace in traces:
+                if self._pending_traces.get(trace[0]['trace_id']) is trace:
+                    del self._pending_traces[trace[0]['trace_id']]
+        self._cache = {}
+
+    def _cached(self, key, loader):
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+        value = loader()
+        self._cache[key] = (now + self.cache_ttl, value)
+        return value
+
+    # ==================== 推送历史 ====================
+    def _trim_pending_records(self):
+        """待写回队列超出上限时丢弃最旧的记录（调用方持有self._lock）"""
+        overflow = len(self._pending_records) - self.pending_max
+        if overflow > 0:
+            for _ in range(overflow):
+                self._pending_records.popleft()
+            self._dropped_records += overflow
+            logger.warning(f"推送记录写回积压超过{self.pending_max}条，已丢弃最旧的{overflow}条")
+
+    def log_rabbitmq_request(self, queue_name: str, message: Any, success: bool,
+                             elapsed_ms: Optional[float] = None):
+        """记录RabbitMQ请求（只保存编码后的报文，同时提取业务单号供检索）
+
+        每条记录都进入待写回队列，积压达到水位线时立即唤醒写回线程，不等下一个写回间隔
+        """
+        self._ensure_flusher()
+        keys = extract_business_keys(message, self.key_fields) if isinstance(message, (dict, list)) else ()
+        record = self.push_history.append(queue_name, message, success, elapsed_ms, keys)
+        with self._lock:
+            self._pending_records.append(record)
+            self._trim_pending_records()
+            backlog = len(self._pending_records)
+        if backlog >= self.flush_watermark:
+            self._wakeup.set()
+
+    def _to_records(self, rows) -> List[PushRecord]:
+        keys = self.store.history_keys([row[0] for row in rows])
+        return [PushRecord(seq, ts, queue, bool(ok), elapsed_ms, body, size, bool(truncated), tuple(keys.get(seq, ())))
+                for seq, ts, queue, ok, elapsed_ms, size, truncated, body in rows]
+
+    def get_rabbitmq_logs(self, limit: int = 50, queue_name: Optional[str] = None,
+                          success: Optional[bool] = None, include_message: bool = True) -> List[Dict[str, Any]]:
+        """获取最近的RabbitMQ请求记录（时间倒序，来自共享存储）"""
+        records = self._cached(('logs', limit, queue_name, success),
+                               lambda: self._to_records(self.store.search_history(limit, queue_name=queue_name,
+                                                                                  success=success)))
+        return [record.to_dict(include_message) for record in records]
+
+    def search_rabbitmq_logs(self, limit: int = 50, cursor: Optional[int] = None, include_message: bool = False,
+                             **filters) -> Dict[str, Any]:
+        """检索推送记录（游标分页），filters见SharedStore.search_history"""
+        rows = self.store.search_history(limit + 1, before=cursor, **filters)
+        has_more = len(rows) > limit
+        records = self._to_records(rows[:limit])
+        return {
+            'logs': [record.to_dict(include_message) for record in records],
+            'next_cursor': records[-1].seq if has_more else None
         }
-        self.rabbitmq_logs.append(log_entry)
-        # 限制日志数量，保持最新的1000条
-        if len(self.rabbitmq_logs) > 1000:
-            self.rabbitmq_logs.pop(0)
 
+    def get_rabbitmq_log(self, seq: int) -> Optional[Dict[str, Any]]:
+        """按序号获取单条推送记录（含报文）"""
+        row = self.store.get_history(seq)
+        return self._to_records([row])[0].to_dict() if row else None
+
+    def get_push_stats(self) -> Dict[str, Any]:
+        """推送历史统计：共享存储中的条数/字节数，本进程环形缓冲区状态，以及待写回条数和因积压丢弃的条数"""
+        from config import config
+        stats = dict(self._cached('push_stats', self.store.history_stats))
+        stats.update({'capacity': config.STORE_HISTORY_CAPACITY, 'max_bytes': config.STORE_HISTORY_MAX_BYTES,
+                      'local': self.push_history.stats(), 'pending': len(self._pending_records),
+                      'dropped': self._dropped_records})
+        return stats
+
+    # ==================== 慢请求 ====================
+    def log_slow_request(self, entry: Dict[str, Any]):
+        """记录慢请求（合并后批量写回），entry中附带处理该请求的worker的pid"""
+        self._ensure_flusher()
+        entry = dict(entry, pid=os.getpid())
+        with self._lock:
+            self._pending_slow.append((entry['time'], entry['path'], json.dumps(entry, ensure_ascii=False)))
+            self._trim_pending_slow()
+
+    def _trim_pending_slow(self):
+        """共享存储只保留最近slow_capacity条，写回持续失败时缓冲也只保留这么多（调用方持有self._lock）"""
+        overflow = len(self._pending_slow) - self.slow_capacity
+        if overflow > 0:
+            del self._pending_slow[:overflow]
+
+    def get_slow_requests(self, limit: int = 50, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """最近的慢请求（时间倒序，所有worker），path为路径前缀"""
+        return [json.loads(entry) for entry in self.store.recent_slow_requests(limit, path)]
+
+    # ==================== 追踪 ====================
+    def log_trace(self, data: Dict[str, Any]):
+        """记录结束的追踪（合并后批量写回），同一trace_id只保留最后一段"""
+        self._ensure_flusher()
+        summary = {key: value for key, value in data.items() if key != 'spans'}
+        row = (data['trace_id'], data['name'], data['duration_ms'], data['status'],
+               json.dumps(summary, ensure_ascii=False, default=str),
+               json.dumps(data['spans'], ensure_ascii=False, default=str))
+        with self._lock:
+            self._pending_traces.pop(data['trace_id'], None)
+            self._pending_traces[data['trace_id']] = (data, row)
+            # 写回持续失败时缓冲不超过共享存储保留的条数，丢弃最旧的
+            while len(self._pending_traces) > self.trace_capacity:
+                self._pending_traces.popitem(last=False)
+
+    def get_traces(self, limit: int = 50, name: Optional[str] = None, min_ms: float = 0,
+                   status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """最近的追踪概要（不含span明细，新的在前，所有worker）"""
+        return [json.loads(summary) for summary in self.store.recent_traces(limit, name, min_ms, status)]
 
+    def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """单条追踪（含全部span）：先查本进程尚未写回的缓冲，再查共享存储"""
+        with self._lock:
+            pending = self._pending_traces.get(trace_id)
+        if pending is not None:
+            return pending[0]
+        row = self.store.get_trace(trace_id)
+        if row is None:
+            return None
+        trace = json.loads(row[0])
+        trace['spans'] = json.loads(row[1])
+        return trace
 
+    # ==================== 备忘录 ====================
     def save_memo(self, content: str):
         """保存备忘录内容"""
-        self.memo_content = content
+        self.store.set_value(MEMO_KEY, content)
+        self._cache.pop('memo', None)
 
     def get_memo(self) -> str:
         """获取备忘录内容"""
-        return self.memo_content
+        return self._cached('memo', lambda: self.store.get_value(MEMO_KEY, ''))
 
+    # ==================== 菜单统计 ====================
     def increment_menu_count(self, menu_name: str):
-        """增加菜单请求次数"""
-        if menu_name not in self.menu_stats:
-            self.menu_stats[menu_name] = 0
-        self.menu_stats[menu_name] += 1
+        """增加菜单请求次数（合并后批量写回）"""
+        self._ensure_flusher()
+        with self._lock:
+            self._pending_menu[menu_name] = self._pending_menu.get(menu_name, 0) + 1
 
     def get_menu_stats(self) -> Dict[str, int]:
-        """获取菜单请求统计"""
-        return self.menu_stats
+        """获取菜单请求统计（共享存储中的计数加上本进程尚未写回的增量）"""
+        stats = dict(self._cached('menu_stats', self.store.get_menu_stats))
+        with self._lock:
+            for menu_name, count in self._pending_menu.items():
+                stats[menu_name] = stats.get(menu_name, 0) + count
+        return stats
 
 
 def get_dashboard_data_manager() -> DashboardDataManager:
     """获取仪表盘数据管理器实例"""
-    return DashboardDataManager()
\ No newline at end of file
+    return DashboardDataManager()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/15 10:00
+# file: dry_run.py
+# 演练模式（dry-run）工具：完整构建并校验报文，但不推送到RabbitMQ
+import json
+import time
+import logging
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from flask import request, jsonify, Response, stream_with_context
+
+from app.utils.output_schema import check_output, validate_output, resolve_mode
+from app.utils.timing import stage
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def request_flag(names, values: Dict[str, Any] = None) -> bool:
+    """判断请求中的开关参数是否为真：查询参数、表单或JSON（values）中任一名称取值为true/1/yes/on"""
+    sources = [request.args, request.form]
+    if values is not None:
+        sources.append(values)
+    elif request.is_json:
+        body = request.get_json(silent=True)
+        # 批量提交的请求体为数组，开关只从查询参数读取
+        if isinstance(body, dict):
+            sources.append(body)
+    for source in sources:
+        for key in names:
+            value = source.get(key)
+            if value is True or (isinstance(value, str) and value.lower() in TRUE_VALUES):
+                return True
+    return False
+
+
+def is_dry_run(values: Dict[str, Any] = None) -> bool:
+    """判断当前请求是否为演练模式（dryRun / dry_run）"""
+    return request_flag(('dryRun', 'dry_run'), values)
+
+
+def dry_run_response(queue_name: str, message: Dict[str, Any], **extra):
+    """单条消息的演练结果：返回最终报文和大小，不推送
+
+    与实际推送相同地按输出结构校验：strict模式下抛出OutputValidationError，warn模式下在schema_errors中返回
+    """
+    with stage('validate'):
+        schema_errors = check_output(queue_name, message)
+    if schema_errors:
+        extra['schema_errors'] = schema_errors
+    body = json.dumps(message, ensure_ascii=False)
+    logger.info(f"演练模式，跳过推送: queue={queue_name}, 报文长度={len(body.encode('utf-8'))}字节")
+    return jsonify({
+        'status': 'success',
+        'message': '演练模式：报文已构建并校验，未推送',
+        'dry_run': True,
+        'queue': queue_name,
+        'size': len(body.encode('utf-8')),
+        'data': message,
+        **extra
+    })
+
+
+def get_path(data: Any, path: str) -> List[Any]:
+    """按点路径取值，'[]' 表示展开列表，例如 callbackResponse.orderLines[].itemCode"""
+    values = [data]
+    for part in path.split('.'):
+        expand = part.endswith('[]')
+        key = part[:-2] if expand else part
+        next_values = []
+        for value in values:
+            child = value.get(key) if isinstance(value, dict) else None
+            if expand:
+                next_values.extend(child if isinstance(child, list) and child else [None])
+            else:
+                next_values.append(child)
+        values = next_values
+    return values
+
+
+def check_required(message: Dict[str, Any], required_fields: Iterable[str]) -> List[str]:
+    """检查必填字段，返回缺失或为空的字段路径列表"""
+    missing = []
+    for path in required_fields:
+        if any(value is None or value == '' for value in get_path(message, path)):
+            missing.append(path)
+    return missing
+
+
+class DryRunStats:
+    """批量演练的汇总统计"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.count = 0
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.invalid_count = 0
+        self.invalid_samples: List[Dict[str, Any]] = []
+        self.queues: Dict[str, int] = {}
+
+    def add(self, index: int, queue_name: str, encoded: bytes, missing: List[str],
+            schema_errors: Optional[List[Dict[str, Any]]] = None):
+        self.count += 1
+        self.total_bytes += len(encoded)
+        self.max_bytes = max(self.max_bytes, len(encoded))
+        self.queues[queue_name] = self.queues.get(queue_name, 0) + 1
+        if missing or schema_errors:
+            self.invalid_count += 1
+            if len(self.invalid_samples) < 20:
+                sample = {'index': index, 'missing': missing}
+                if schema_errors:
+                    sample['schema_errors'] = [error['message'] for error in schema_errors[:5]]
+                self.invalid_samples.append(sample)
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.started
+        return {
+            'count': self.count,
+            'valid_count': self.count - self.invalid_count,
+            'invalid_count': self.invalid_count,
+            'invalid_samples': self.invalid_samples,
+            'queues': self.queues,
+            'total_bytes': self.total_bytes,
+            'avg_bytes': round(self.total_bytes / self.count, 1) if self.count else 0,
+            'max_bytes': self.max_bytes,
+            'elapsed': round(elapsed, 3),
+            'messages_per_second': round(self.count / elapsed, 1) if elapsed > 0 else None
+        }
+
+
+def iter_dry_run(messages: Iterable[Tuple[int, str, Dict[str, Any]]], required_fields: Iterable[str], stats: DryRunStats,
+                 validation: Optional[str] = None) -> Iterator[Tuple[int, str, Dict[str, Any], bytes, List[str], List[Dict[str, Any]]]]:
+    """逐条编码并校验消息（必填字段 + 队列输出结构），同时累计统计；演练只报告不合格的报文，不中断"""
+    required_fields = list(required_fields)
+    validate = resolve_mode(validation) != 'off'
+    for index, queue_name, message in messages:
+        encoded = json.dumps(message, ensure_ascii=False).encode('utf-8')
+        missing = check_required(message, required_fields)
+        schema_errors = validate_output(queue_name, message) if validate else []
+        stats.add(index, queue_name, encoded, missing, schema_errors)
+        yield index, queue_name, message, encoded, missing, schema_errors
+
+
+def ndjson_response(messages: Iterable[Tuple[int, str, Dict[str, Any]]], required_fields: Iterable[str],
+                    validation: Optional[str] = None, **extra) -> Response:
+    """以NDJSON流式返回演练结果：每行一条消息，最后一行为汇总统计（extra一并写入最后一行）"""
+    stats = DryRunStats()
+
+    def stream():
+        for index, queue_name, message, _, missing, schema_errors in iter_dry_run(messages, required_fields, stats, validation):
+            line = {'index': index, 'queue': queue_name, 'data': message}
+            if missing:
+                line['missing'] = missing
+            if schema_errors:
+                line['schema_errors'] = schema_errors
+            yield json.dumps(line, ensure_ascii=False) + '\n'
+        yield json.dumps({'summary': stats.to_dict(), **extra}, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(stream()), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/14 09:30
+# file: generation.py
+# 数据生成上下文与批量生成器注册模块
+import uuid
+import random
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+
+from app.utils.catalog import get_catalog, CatalogSnapshot
+from app.utils.id_generator import next_code
+
+logger = logging.getLogger(__name__)
+
+# 种子模式默认基准时钟与消息间隔
+DEFAULT_BASE_TIME = '2025-01-01 00:00:00'
+DEFAULT_INTERVAL_MS = 1000
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def derive_seed(seed: Any, index: int, salt: str = '') -> int:
+    """由运行种子和消息序号派生出该消息独立的64位种子"""
+    digest = hashlib.blake2b(f'{seed}:{index}:{salt}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def seed_tag(seed: Any) -> str:
+    """种子的6位base36标签，拼入编码以区分不同批次"""
+    value = derive_seed(seed, -1, 'tag') % (36 ** 6)
+    chars = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    tag = ''
+    for _ in range(6):
+        value, rem = divmod(value, 36)
+        tag = chars[rem] + tag
+    return tag
+
+
+def parse_base_time(value: Optional[str]) -> datetime:
+    """解析基准时钟，支持 'YYYY-MM-DD HH:MM:SS' 与ISO格式"""
+    if not value:
+        return datetime.strptime(DEFAULT_BASE_TIME, TIME_FORMAT)
+    try:
+        return datetime.strptime(value, TIME_FORMAT)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+class GenerationContext:
+    """实时生成上下文：编码取自ID生成器，时间取当前时间，随机数不可复现
+
+    基础数据快照在首次采样时取一次（或由调用方传入，一次批量生成共用同一快照），之后目录热加载不影响本上下文
+    """
+
+    seeded = False
+
+    def __init__(self, index: int = 0, catalog: Optional[CatalogSnapshot] = None):
+        self.index = index
+        self.rng = random.Random()
+        self._catalog = catalog
+
+    @property
+    def catalog(self) -> CatalogSnapshot:
+        if self._catalog is None:
+            self._catalog = get_catalog().snapshot
+        return self._catalog
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def format_time(self, fmt: str = TIME_FORMAT, offset_seconds: float = 0) -> str:
+        return (self.now() + timedelta(seconds=offset_seconds)).strftime(fmt)
+
+    def code(self, code_type: str) -> str:
+        return next_code(code_type)
+
+    def uuid(self) -> str:
+        return str(uuid.uuid4())
+
+    def quantity(self, low: int = 1, high: int = 10) -> int:
+        return self.rng.randint(low, high)
+
+    def choice(self, options: List[Any]) -> Any:
+        return options[self.rng.randrange(len(options))]
+
+    def sample_skus(self, count: int, warehouse_code: Optional[str] = None,
+                    store_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.catalog.sample_skus(count, warehouse_code=warehouse_code, store_id=store_id, rng=self.rng)
+
+    def sample_store(self) -> Optional[Dict[str, Any]]:
+        return self.catalog.sample_store(rng=self.rng)
+
+    def sample_warehouse(self) -> Optional[Dict[str, Any]]:
+        return self.catalog.sample_warehouse(rng=self.rng)
+
+    def describe(self) -> Dict[str, Any]:
+        return {'mode': 'live', 'index': self.index}
+
+
+class SeededGenerationContext(GenerationContext):
+    """种子生成上下文：运行种子 + 消息序号完全决定所有生成值
+
+    - 随机源由 (seed, index) 派生，第i条消息无需先生成前i-1条，可拆分到多个进程复现
+    - 时间 = 基准时钟 + index * 间隔，同一条消息内多次取时间结果一致
+    - 编码 = 前缀 + 种子标签 + 10位消息序号（同类型第k个编码再追加k），同一种子内唯一
+    - 基础数据：同一种子只有在基础数据版本（CatalogSnapshot.version）相同时才能复现
+    """
+
+    seeded = True
+
+    def __init__(self, seed: Any, index: int, base_time: Optional[str] = None,
+                 interval_ms: int = DEFAULT_INTERVAL_MS, catalog: Optional[CatalogSnapshot] = None):
+        super().__init__(index, catalog)
+        self.seed = seed
+        self.base_time = parse_base_time(base_time)
+        self.interval_ms = interval_ms
+        self.rng = random.Random(derive_seed(seed, index))
+        self._tag = seed_tag(seed)
+        self._code_counters: Dict[str, int] = {}
+
+    def now(self) -> datetime:
+        return self.base_time + timedelta(milliseconds=self.index * self.interval_ms)
+
+    def code(self, code_type: str) -> str:
+        from config import config
+        prefix = getattr(config, 'ID_CODE_FORMATS', {}).get(code_type, {}).get('prefix', '')
+        k = self._code_counters.get(code_type, 0)
+        self._code_counters[code_type] = k + 1
+        return f'{prefix}{self._tag}{self.index:010d}{k if k else ""}'
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'mode': 'seeded',
+            'seed': self.seed,
+            'index': self.index,
+            'base_time': self.base_time.strftime(TIME_FORMAT),
+            'interval_ms': self.interval_ms,
+            'catalog_version': self.catalog.version
+        }
+
+
+def make_context(seed: Any = None, index: int = 0, base_time: Optional[str] = None,
+                 interval_ms: Optional[int] = None, catalog: Optional[CatalogSnapshot] = None) -> GenerationContext:
+    """根据是否提供种子返回实时或种子上下文"""
+    if seed is None or seed == '':
+        return GenerationContext(index, catalog)
+    return SeededGenerationContext(seed, int(index), base_time, int(interval_ms or DEFAULT_INTERVAL_MS), catalog)
+
+
+def context_from_request(values: Dict[str, Any]) -> GenerationContext:
+    """从请求参数（表单或JSON）中读取 seed / messageIndex / baseTime / intervalMs"""
+    return make_context(
+        seed=values.get('seed'),
+        index=int(values.get('messageIndex') or 0),
+        base_time=values.get('baseTime'),
+        interval_ms=values.get('intervalMs')
+    )
+
+
+# ==================== 批量生成器注册 ====================
+# 生成器签名: fn(ctx, params) -> message，params为批量请求中的公共参数
+_generators: Dict[str, Dict[str, Any]] = {}
+
+
+def register_generator(message_type: str, queue_name: str, description: str = '',
+                       required_fields: Tuple[str, ...] = ()):
+    """注册某消息类型的批量生成器（装饰器）
+
+    required_fields为必填字段点路径，'[]' 表示展开列表，演练模式下据此校验生成结果
+    """
+    def decorator(fn: Callable[[GenerationContext, Dict[str, Any]], Dict[str, Any]]):
+        _generators[message_type] = {
+            'fn': fn,
+            'queue': queue_name,
+            'description': description or (fn.__doc__ or '').strip(),
+            'required_fields': tuple(required_fields)
+        }
+        return fn
+    return decorator
+
+
+def get_generator(message_type: str) -> Optional[Dict[str, Any]]:
+    return _generators.get(message_type)
+
+
+def list_generators() -> Dict[str, Dict[str, str]]:
+    return {name: {'queue': gen['queue'], 'description': gen['description'], 'required_fields': list(gen['required_fields'])}
+            for name, gen in _generators.items()}
+
+
+def generate_message(message_type: str, index: int, params: Optional[Dict[str, Any]] = None,
+                     seed: Any = None, base_time: Optional[str] = None, interval_ms: Optional[int] = None,
+                     catalog: Optional[CatalogSnapshot] = None) -> Tuple[str, Dict[str, Any]]:
+    """生成第index条消息，返回 (队列名, 消息)"""
+    generator = _generators.get(message_type)
+    if generator is None:
+        raise ValueError(f'不支持的消息类型: {message_type}')
+    ctx = make_context(seed, index, base_time, interval_ms, catalog)
+    return generator['queue'], generator['fn'](ctx, params or {})
+
+
+def generate_messages(message_type: str, count: int, params: Optional[Dict[str, Any]] = None,
+                      seed: Any = None, start_index: int = 0, base_time: Optional[str] = None,
+                      interval_ms: Optional[int] = None,
+                      catalog: Optional[CatalogSnapshot] = None) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+    """惰性生成 [start_index, start_index + count) 区间内的消息，返回 (序号, 队列名, 消息)
+
+    整个区间使用同一个基础数据快照（未传入时取调用时的当前快照），生成过程中目录热加载不会混入新数据
+    """
+    catalog = catalog or get_catalog().snapshot
+    for index in range(start_index, start_index + count):
+        queue_name, message = generate_message(message_type, index, params, seed, base_time, interval_ms, catalog)
+        yield index, queue_name, message
+
+
+def sample_order_lines(ctx: GenerationContext, params: Dict[str, Any],
+                       warehouse_code: Optional[str] = None) -> List[Tuple[Dict[str, Any], int]]:
+    """按批量参数抽取订单明细：返回 [(SKU记录, 数量), ...]
+
+    params支持: lines（明细行数，默认1）、quantity_min / quantity_max（数量区间，默认1~10）
+    """
+    line_count = int(params.get('lines', 1))
+    low = int(params.get('quantity_min', 1))
+    high = int(params.get('quantity_max', 10))
+    skus = ctx.sample_skus(line_count, warehouse_code=warehouse_code)
+    if not skus:
+        # 指定仓库下没有SKU时退化为全局采样
+        skus = ctx.sample_skus(line_count)
+    return [(sku, ctx.quantity(low, high)) for sku in skus]
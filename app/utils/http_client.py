@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/16 09:30
+# file: http_client.py
+# SRM网关HTTP客户端：进程内共享连接池，长连接复用，分离的连接/读取超时与幂等重试
+import os
+import threading
+import logging
+from typing import Dict, Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.utils.timing import stage
+
+logger = logging.getLogger(__name__)
+
+# 只对幂等方法重试读超时和网关错误；POST只在连接阶段失败（请求未发出）时重试
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class GatewayClient:
+    """SRM网关客户端
+
+    - 每个进程一个requests.Session，urllib3连接池本身线程安全，多线程共享同一个池
+    - 连接保持长连接，突发的库存调整只在首次请求时做TLS握手
+    - 基础地址按环境从配置映射中取，便于切换到本地替身服务
+    """
+
+    def __init__(self, base_urls: Dict[str, str], connect_timeout: float = 3.05, read_timeout: float = 30,
+                 pool_maxsize: int = 20, max_retries: int = 2, backoff_factor: float = 0.3):
+        self.base_urls = dict(base_urls)
+        self.timeout = (connect_timeout, read_timeout)
+        self.pid = os.getpid()
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=len(self.base_urls) or 1, pool_maxsize=pool_maxsize,
+                              max_retries=retry, pool_block=False)
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def base_url(self, env: str) -> str:
+        if env not in self.base_urls:
+            raise ValueError(f'不支持的网关环境: {env}，可选: {", ".join(self.base_urls)}')
+        return self.base_urls[env].rstrip('/')
+
+    def url(self, env: str, path: str) -> str:
+        return f'{self.base_url(env)}/{path.lstrip("/")}'
+
+    def post_json(self, env: str, path: str, payload: Dict[str, Any],
+                  timeout: Optional[tuple] = None) -> Dict[str, Any]:
+        """POST JSON并返回解析后的响应，HTTP错误抛出requests异常"""
+        with stage('gateway'):
+            response = self.session.post(self.url(env, path), json=payload, timeout=timeout or self.timeout)
+        logger.info(f"网关响应状态码: {response.status_code}, 耗时: {response.elapsed.total_seconds():.3f}秒")
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
+
+
+# 全局网关客户端实例
+_gateway_client = None
+_gateway_client_lock = threading.Lock()
+
+
+def get_gateway_client() -> GatewayClient:
+    """获取SRM网关客户端实例（单例模式，fork后的子进程重新建立连接池）"""
+    global _gateway_client
+    if _gateway_client is None or _gateway_client.pid != os.getpid():
+        with _gateway_client_lock:
+            if _gateway_client is None or _gateway_client.pid != os.getpid():
+                from config import config
+                _gateway_client = GatewayClient(
+                    base_urls=config.SRM_GATEWAY_URLS,
+                    connect_timeout=config.SRM_CONNECT_TIMEOUT,
+                    read_timeout=config.SRM_READ_TIMEOUT,
+                    pool_maxsize=config.SRM_POOL_MAXSIZE,
+                    max_retries=config.SRM_MAX_RETRIES,
+                    backoff_factor=config.SRM_RETRY_BACKOFF
+                )
+                logger.info(f"SRM网关客户端初始化完成: pid={os.getpid()}, 环境={list(config.SRM_GATEWAY_URLS)}")
+    return _gateway_client
+
+
+def close_gateway_client():
+    """关闭网关客户端连接池（应用关闭时调用）"""
+    global _gateway_client
+    if _gateway_client:
+        _gateway_client.close()
+        _gateway_client = None
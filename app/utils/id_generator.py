@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/12 10:20
+# file: id_generator.py
+# 业务编码生成模块（Snowflake风格：时间戳 + 分片号 + 序列号）
+import os
+import time
+import threading
+import tempfile
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Iterator, Tuple
+
+try:
+    import fcntl  # 类Unix系统：flock文件锁，用于跨进程分片租约
+except ImportError:  # pragma: no cover - Windows开发环境
+    fcntl = None
+
+try:
+    import msvcrt  # Windows：锁定分片文件的首字节
+except ImportError:
+    msvcrt = None
+
+logger = logging.getLogger(__name__)
+
+# 位分配：41位毫秒时间戳 | 10位分片号 | 12位序列号
+TIMESTAMP_BITS = 41
+SHARD_BITS = 10
+SEQUENCE_BITS = 12
+MAX_SHARD_ID = (1 << SHARD_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+SHARD_SHIFT = SEQUENCE_BITS
+TIMESTAMP_SHIFT = SHARD_BITS + SEQUENCE_BITS
+
+# 自定义纪元：2025-01-01 00:00:00 UTC
+DEFAULT_EPOCH_MS = 1735689600000
+# 时间戳高水位租约：每次落盘预留1秒，重启后从租约之后开始，防止时钟回拨或借用未来时间导致重复
+LEASE_MS = 1000
+
+
+class IdRange:
+    """一次性预留的ID区间，迭代时无需加锁"""
+
+    def __init__(self, generator: 'IdGenerator', segments: List[Tuple[int, int, int]]):
+        self._generator = generator
+        # 每段为 (时间戳, 起始序列号, 数量)
+        self._segments = segments
+
+    def __len__(self) -> int:
+        return sum(count for _, _, count in self._segments)
+
+    def __iter__(self) -> Iterator[int]:
+        base = self._generator.shard_id << SHARD_SHIFT
+        for ts, seq_start, count in self._segments:
+            prefix = (ts << TIMESTAMP_SHIFT) | base
+            for seq in range(seq_start, seq_start + count):
+                yield prefix | seq
+
+    def codes(self, code_type: str) -> Iterator[str]:
+        """按编码类型格式化区间内的全部ID"""
+        for snowflake_id in self:
+            yield self._generator.format_code(code_type, snowflake_id)
+
+
+class IdGenerator:
+    """进程内唯一的ID生成器
+
+    - 分片号：显式指定时直接使用；否则通过文件锁在 [shard_base, shard_base + shard_count)
+      内租用一个空闲分片，同一台机器上的多个gunicorn worker因此拿到不同分片号，
+      多台机器通过不同的shard_base错开
+    - 时间戳：逻辑时钟，只增不减；单毫秒序列号耗尽时借用下一毫秒
+    - 重启：分片文件中记录时间戳高水位，重启后从高水位之后继续
+    """
+
+    def __init__(self, shard_id: Optional[int] = None, shard_base: int = 0, shard_count: int = 64,
+                 state_dir: Optional[str] = None, epoch_ms: int = DEFAULT_EPOCH_MS,
+                 code_formats: Optional[Dict[str, Dict[str, str]]] = None):
+        self.epoch_ms = epoch_ms
+        self.shard_base = shard_base
+        self.shard_count = shard_count
+        self.state_dir = state_dir or os.path.join(tempfile.gettempdir(), 'toms_id_shards')
+        self.code_formats = code_formats or {}
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._lease_file = None
+        self._last_ts = 0
+        self._sequence = 0
+        self._persisted_ts = 0
+
+        if shard_id is not None:
+            if not 0 <= shard_id <= MAX_SHARD_ID:
+                raise ValueError(f'分片号必须在0到{MAX_SHARD_ID}之间: {shard_id}')
+            self.shard_id = shard_id
+            self._open_shard_file(shard_id, lock=False)
+        else:
+            self.shard_id = self._acquire_shard()
+
+        # 从高水位恢复逻辑时钟
+        self._last_ts = max(self._now(), self._read_high_water())
+        self._persist_high_water(self._last_ts)
+        logger.info(f"ID生成器初始化完成: shard_id={self.shard_id}, pid={self.pid}, state_dir={self.state_dir}")
+
+    # ==================== 分片租约 ====================
+    def _shard_path(self, shard_id: int) -> str:
+        return os.path.join(self.state_dir, f'shard_{shard_id}.lock')
+
+    @staticmethod
+    def _try_lock(handle) -> bool:
+        """非阻塞独占锁定分片文件（进程退出时由系统释放），已被其他进程占用时返回False"""
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def _open_shard_file(self, shard_id: int, lock: bool) -> bool:
+        os.makedirs(self.state_dir, exist_ok=True)
+        handle = open(self._shard_path(shard_id), 'a+')
+        if lock and not self._try_lock(handle):
+            handle.close()
+            return False
+        self._lease_file = handle
+        return True
+
+    def _acquire_shard(self) -> int:
+        """在状态目录中租用第一个未被占用的分片号（进程退出时锁自动释放）"""
+        if fcntl is None and msvcrt is None:
+            # 没有文件锁时多个进程可能拿到同一分片而生成重复ID，不做退化处理
+            raise RuntimeError('当前平台不支持文件锁，无法自动租用ID分片号')
+
+        for shard_id in range(self.shard_base, min(self.shard_base + self.shard_count, MAX_SHARD_ID + 1)):
+            if self._open_shard_file(shard_id, lock=True):
+                return shard_id
+        raise RuntimeError(f'没有可用的ID分片号，状态目录: {self.state_dir}')
+
+    def _read_high_water(self) -> int:
+        try:
+            self._lease_file.seek(0)
+            content = self._lease_file.read().strip()
+            return int(content) if content else 0
+        except (OSError, ValueError):
+            return 0
+
+    def _persist_high_water(self, ts: int):
+        """写入时间戳高水位（附带租约），最多每秒落盘一次"""
+        lease = ts + LEASE_MS
+        try:
+            self._lease_file.seek(0)
+            self._lease_file.truncate()
+            self._lease_file.write(str(lease))
+            self._lease_file.flush()
+            os.fsync(self._lease_file.fileno())
+            self._persisted_ts = lease
+        except OSError as e:
+            logger.error(f"写入ID高水位失败: {str(e)}")
+
+    def close(self):
+        """释放分片租约"""
+        if self._lease_file:
+            try:
+                self._lease_file.close()
+            except OSError:
+                pass
+            self._lease_file = None
+
+    # ==================== ID分配 ====================
+    def _now(self) -> int:
+        return int(time.time() * 1000) - self.epoch_ms
+
+    def _allocate(self, count: int) -> List[Tuple[int, int, int]]:
+        """在锁内分配count个序列号，返回 (时间戳, 起始序列号, 数量) 段列表"""
+        segments = []
+        with self._lock:
+            now = self._now()
+            if now > self._last_ts:
+                self._last_ts = now
+                self._sequence = 0
+            remaining = count
+            while remaining > 0:
+                available = MAX_SEQUENCE + 1 - self._sequence
+                if available <= 0:
+                    # 当前毫秒序列号耗尽，借用下一毫秒
+                    self._last_ts += 1
+                    self._sequence = 0
+                    available = MAX_SEQUENCE + 1
+                taken = min(available, remaining)
+                segments.append((self._last_ts, self._sequence, taken))
+                self._sequence += taken
+                remaining -= taken
+            if self._last_ts >= self._persisted_ts:
+                self._persist_high_water(self._last_ts)
+        return segments
+
+    def next_id(self) -> int:
+        """生成单个64位ID"""
+        ts, seq, _ = self._allocate(1)[0]
+        return (ts << TIMESTAMP_SHIFT) | (self.shard_id << SHARD_SHIFT) | seq
+
+    def reserve(self, count: int) -> IdRange:
+        """一次性预留count个ID，批量生成时只加一次锁"""
+        if count <= 0:
+            raise ValueError(f'预留数量必须大于0: {count}')
+        return IdRange(self, self._allocate(count))
+
+    # ==================== 业务编码 ====================
+    def parse_id(self, snowflake_id: int) -> Dict[str, int]:
+        """拆解ID为时间戳、分片号和序列号"""
+        return {
+            'ts': (snowflake_id >> TIMESTAMP_SHIFT) + self.epoch_ms,
+            'shard': (snowflake_id >> SHARD_SHIFT) & MAX_SHARD_ID,
+            'seq': snowflake_id & MAX_SEQUENCE
+        }
+
+    def format_code(self, code_type: str, snowflake_id: int) -> str:
+        """按编码类型的前缀和格式模板生成业务编码
+
+        模板可用字段: prefix, id, ts, shard, seq, date, time
+        """
+        code_format = self.code_formats.get(code_type, {})
+        template = code_format.get('format', '{prefix}{id}')
+        parts = self.parse_id(snowflake_id)
+        moment = datetime.fromtimestamp(parts['ts'] / 1000)
+        return template.format(
+            prefix=code_format.get('prefix', ''),
+            id=snowflake_id,
+            ts=parts['ts'],
+            shard=parts['shard'],
+            seq=parts['seq'],
+            date=moment.strftime('%Y%m%d'),
+            time=moment.strftime('%H%M%S')
+        )
+
+    def next_code(self, code_type: str) -> str:
+        """生成单个业务编码"""
+        return self.format_code(code_type, self.next_id())
+
+    def reserve_codes(self, code_type: str, count: int) -> List[str]:
+        """批量生成业务编码"""
+        return list(self.reserve(count).codes(code_type))
+
+
+def validate_code_format(template: str):
+    """校验格式模板能保证唯一性：必须包含id，或同时包含ts、shard、seq"""
+    if '{id' in template:
+        return
+    if all(f'{{{field}' in template for field in ('ts', 'shard', 'seq')):
+        return
+    raise ValueError(f'编码格式必须包含{{id}}或同时包含{{ts}}、{{shard}}、{{seq}}: {template}')
+
+
+# 全局ID生成器实例
+_id_generator = None
+_id_generator_lock = threading.Lock()
+
+
+def get_id_generator() -> IdGenerator:
+    """获取ID生成器实例（单例模式，fork后的子进程会重新租用分片）"""
+    global _id_generator
+    if _id_generator is None or _id_generator.pid != os.getpid():
+        with _id_generator_lock:
+            if _id_generator is None or _id_generator.pid != os.getpid():
+                from config import config
+                code_formats = getattr(config, 'ID_CODE_FORMATS', {})
+                for code_format in code_formats.values():
+                    validate_code_format(code_format.get('format', '{prefix}{id}'))
+                _id_generator = IdGenerator(
+                    shard_base=getattr(config, 'ID_SHARD_BASE', 0),
+                    shard_count=getattr(config, 'ID_SHARD_COUNT', 64),
+                    state_dir=getattr(config, 'ID_STATE_DIR', None),
+                    code_formats=code_formats
+                )
+    return _id_generator
+
+
+def next_code(code_type: str) -> str:
+    """生成单个业务编码（便捷函数）"""
+    return get_id_generator().next_code(code_type)
+
+
+def reserve_codes(code_type: str, count: int) -> List[str]:
+    """批量生成业务编码（便捷函数）"""
+    return get_id_generator().reserve_codes(code_type, count)
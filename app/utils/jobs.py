@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/16 14:00
+# file: jobs.py
+# 后台任务模块：耗时的外部调用放到线程池执行，立即返回任务ID，结果通过轮询或SSE获取
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('success', 'error')
+
+
+class JobStore:
+    """任务状态存储
+
+    每个任务一个JSON文件，原子替换写入。状态落在文件里而不是进程内存，
+    多个gunicorn worker之间提交和轮询可以落在不同的worker上。
+    """
+
+    def __init__(self, state_dir: Optional[str] = None, ttl: int = 3600, cleanup_interval: float = 60):
+        self.state_dir = state_dir or os.path.join(tempfile.gettempdir(), 'toms_jobs')
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        if not job_id.isalnum():
+            raise ValueError(f'任务ID不合法: {job_id}')
+        return os.path.join(self.state_dir, f'{job_id}.json')
+
+    def _write(self, job: Dict[str, Any]):
+        path = self._path(job['jobId'])
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def create(self, kind: str, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        now = datetime.now().isoformat()
+        job = {
+            'jobId': uuid.uuid4().hex,
+            'kind': kind,
+            'status': 'queued',
+            'version': 0,
+            'meta': meta or {},
+            'created': now,
+            'updated': now,
+            'result': None,
+            'httpStatus': None
+        }
+        self._write(job)
+        return job
+
+    def update(self, job_id: str, **fields) -> Dict[str, Any]:
+        job = self.get(job_id) or {'jobId': job_id, 'version': 0}
+        job.update(fields)
+        job['version'] = job.get('version', 0) + 1
+        job['updated'] = datetime.now().isoformat()
+        self._write(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_jobs(self) -> list:
+        """全部任务（逐个读取任务文件，只用于管理类接口）"""
+        try:
+            names = os.listdir(self.state_dir)
+        except OSError:
+            return []
+        jobs = []
+        for name in names:
+            if name.endswith('.json'):
+                job = self.get(name[:-len('.json')])
+                if job is not None:
+                    jobs.append(job)
+        return jobs
+
+    def watch(self, job_id: str, timeout: float = 60, interval: float = 0.2,
+              heartbeat: float = 15) -> Iterator[Optional[Dict[str, Any]]]:
+        """状态变化时产出任务；超过heartbeat秒无变化时产出None作为心跳，任务结束或超时后停止"""
+        deadline = time.time() + timeout
+        last_version = None
+        last_emit = time.time()
+        while time.time() < deadline:
+            job = self.get(job_id)
+            if job is None:
+                return
+            if job.get('version') != last_version:
+                last_version = job.get('version')
+                last_emit = time.time()
+                yield job
+                if job['status'] in FINISHED_STATUSES:
+                    return
+            elif time.time() - last_emit >= heartbeat:
+                last_emit = time.time()
+                yield None
+            time.sleep(interval)
+
+    def cleanup(self, force: bool = False):
+        """删除超过ttl的任务文件；需要遍历整个目录，每cleanup_interval秒最多执行一次（force时立即执行）"""
+        now = time.time()
+        if not force and now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+        expire_before = now - self.ttl
+        try:
+            names = os.listdir(self.state_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.path.getmtime(path) < expire_before:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+# 全局任务存储与线程池
+_job_store = None
+_executor = None
+_executor_pid = None
+_jobs_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """获取任务存储实例（单例模式）"""
+    global _job_store
+    if _job_store is None:
+        with _jobs_lock:
+            if _job_store is None:
+                from config import config
+                _job_store = JobStore(config.JOB_STATE_DIR, config.JOB_RESULT_TTL, config.JOB_CLEANUP_INTERVAL)
+    return _job_store
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """获取后台线程池（每个进程一个，fork后重新创建）"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _jobs_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                from config import config
+                _executor = ThreadPoolExecutor(max_workers=config.JOB_EXECUTOR_WORKERS, thread_name_prefix='toms-job')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def submit_job(kind: str, fn: Callable[..., Tuple[Dict[str, Any], int]], *args,
+               meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """提交后台任务，fn返回 (响应数据, HTTP状态码)，与同步接口的返回一致"""
+    store = get_job_store()
+    store.cleanup()
+    job = store.create(kind, meta)
+    job_id = job['jobId']
+
+    def run():
+        store.update(job_id, status='running')
+        try:
+            result, http_status = fn(*args)
+            status = 'success' if http_status < 400 else 'error'
+        except Exception as e:
+            logger.error(f"后台任务执行异常: job_id={job_id}, kind={kind}, 错误: {str(e)}", exc_info=True)
+            result, http_status, status = {'status': 'error', 'message': f'请求处理失败: {str(e)}'}, 500, 'error'
+        store.update(job_id, status=status, result=result, httpStatus=http_status)
+        logger.info(f"后台任务完成: job_id={job_id}, kind={kind}, 状态={status}")
+
+    get_executor().submit(run)
+    logger.info(f"后台任务已提交: job_id={job_id}, kind={kind}")
+    return job
+
+
+def close_executor():
+    """关闭后台线程池（应用关闭时调用）"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/19 10:00
+# file: live_feed.py
+# 仪表盘实时推送：每个worker一个后台线程轮询共享存储，事件只序列化一次后分发给所有SSE连接
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from typing import Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """格式化为SSE文本帧"""
+    frame = f"id: {event_id}\n" if event_id is not None else ''
+    return frame + f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    """单个SSE连接的有界发送队列；消费过慢时被断开，浏览器重连后重新获取快照"""
+
+    __slots__ = ('queue', 'closed')
+
+    def __init__(self, maxsize: int):
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+    def offer(self, frame: Optional[str]) -> bool:
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        self.closed = True
+        with self.queue.mutex:
+            self.queue.queue.clear()
+        self.offer(None)
+
+
+class LiveFeed:
+    """实时事件源
+
+    - 有订阅者时启动轮询线程，每interval秒从共享存储读取增量：新推送记录、队列吞吐、菜单统计变化、备忘录、连接状态
+    - 每个worker只轮询一次数据库，与打开的仪表盘数量无关
+    - 队列指标读取所有worker写回的桶，延迟settle秒（写回间隔）推送，保证该秒各worker的数据都已写回
+    - 事件：snapshot（连接时全量）、push、throughput、metrics、stats、memo、connection
+    """
+
+    def __init__(self, interval: float = 1.0, window: float = 60, queue_size: int = 100, recent: int = 20,
+                 settle: float = 1.0):
+        self.interval = interval
+        self.window = window
+        self.queue_size = queue_size
+        self.recent = recent
+        self.settle = settle
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._pid = None
+        self._event_id = 0
+        self._reset_state()
+
+    def _reset_state(self):
+        self._last_seq = None
+        self._menu_stats = None
+        self._memo = None
+        self._connection = None
+        self._window_events = deque()  # (ts, queue_name) 最近window秒内的推送
+        self._throughput = {}
+        self._metrics_second = None  # 已推送的最后一个完整秒
+
+    # ==================== 订阅 ====================
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork后的子进程不继承父进程的订阅者和线程
+                self._subscribers = set()
+                self._thread = None
+                self._pid = os.getpid()
+            self._subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._reset_state()
+                self._thread = threading.Thread(target=self._loop, name='dashboard-live-feed', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def stream(self, subscriber: Subscriber, heartbeat: float = 15, max_seconds: float = 1800) -> Iterator[str]:
+        """SSE响应体：先发送快照，再转发事件；超过max_seconds后结束，由浏览器自动重连"""
+        try:
+            yield 'retry: 3000\n\n'
+            yield self.snapshot()
+            deadline = time.time() + max_seconds
+            while time.time() < deadline and not subscriber.closed:
+                try:
+                    frame = subscriber.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def snapshot(self) -> str:
+        from app.utils.dashboard_data import get_dashboard_data_manager
+        from app.utils.rabbitmq import connection_state
+        manager = get_dashboard_data_manager()
+        return format_event('snapshot', {
+            'menu_stats': manager.get_menu_stats(),
+            'memo': manager.get_memo(),
+            'pushes': manager.get_rabbitmq_logs(limit=self.recent, include_message=False),
+            'throughput': self._throughput,
+            'connection': {'state': connection_state(), 'pid': os.getpid()},
+            'subscribers': self.subscriber_count()
+        }, self._event_id)
+
+    # ==================== 分发 ====================
+    def _publish(self, event: str, data: Any):
+        self._event_id += 1
+        frame = format_event(event, data, self._event_id)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if not subscriber.offer(frame):
+                logger.warning("仪表盘实时连接消费过慢，已断开")
+                subscriber.close()
+                self.unsubscribe(subscriber)
+
+    def _loop(self):
+        pid = os.getpid()
+        while True:
+            with self._lock:
+                if not self._subscribers or self._pid != pid:
+                    self._thread = None
+                    return
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"仪表盘实时数据轮询失败: {str(e)}")
+            time.sleep(self.interval)
+
+    def _tick(self):
+        from app.utils.dashboard_data import get_dashboard_data_manager, MEMO_KEY
+        from app.utils.metrics import shared_series, ALL_QUEUES
+        from app.utils.rabbitmq import connection_state
+        store = get_dashboard_data_manager().store
+        now = time.time()
+
+        # 新推送记录（所有worker写回共享存储的记录）
+        if self._last_seq is None:
+            self._last_seq = store.max_history_seq()
+        rows = store.history_after(self._last_seq)
+        tick_counts = {}
+        if rows:
+            self._last_seq = rows[-1][0]
+            keys = store.history_keys([row[0] for row in rows])
+            pushes = []
+            for seq, ts, queue_name, success, elapsed_ms, size, truncated in rows:
+                keys_by_name = {}
+                for name, value in keys.get(seq, ()):
+                    keys_by_name.setdefault(name, []).append(value)
+                pushes.append({
+                    'seq': seq,
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)),
+                    'queue_name': queue_name,
+                    'success': bool(success),
+                    'elapsed_ms': elapsed_ms,
+                    'size': size,
+                    'truncated': bool(truncated),
+                    'keys': keys_by_name
+                })
+                tick_counts[queue_name] = tick_counts.get(queue_name, 0) + 1
+                self._window_events.append((ts, queue_name))
+            self._publish('push', pushes)
+
+        # 队列吞吐：本轮新增条数 + 最近window秒条数
+        while self._window_events and self._window_events[0][0] < now - self.window:
+            self._window_events.popleft()
+        window_counts = {}
+        for _, queue_name in self._window_events:
+            window_counts[queue_name] = window_counts.get(queue_name, 0) + 1
+        throughput = {name: {'tick': tick_counts.get(name, 0), 'window': count, 'per_second': round(count / self.window, 3)}
+                      for name, count in window_counts.items()}
+        if throughput != self._throughput:
+            self._throughput = throughput
+            self._publish('throughput', {'window_seconds': self.window, 'queues': throughput})
+
+        # 所有worker合并的按秒指标：每个完整秒推送一次（没有推送的秒也发送，便于图表及时反映吞吐下降）
+        last_second = int(now - self.settle) - 1
+        if self._metrics_second is None:
+            self._metrics_second = last_second - 1
+        if last_second > self._metrics_second:
+            span = min(last_second - self._metrics_second, 60)
+            self._metrics_second = last_second
+            series = shared_series('second', span=span, end=last_second)
+            series = {name: points for name, points in series.items()
+                      if name == ALL_QUEUES or any(point['count'] for point in points)}
+            if series:
+                self._publish('metrics', {'resolution': 'second', 'series': series})
+
+        # 菜单统计只发送变化的部分
+        menu_stats = store.get_menu_stats()
+        if self._menu_stats is not None:
+            changed = {name: count for name, count in menu_stats.items() if self._menu_stats.get(name) != count}
+            if changed:
+                self._publish('stats', {'changed': changed})
+        self._menu_stats = menu_stats
+
+        memo = store.get_value(MEMO_KEY, '')
+        if self._memo is not None and memo != self._memo:
+            self._publish('memo', {'memo': memo})
+        self._memo = memo
+
+        state = connection_state()
+        if self._connection is not None and state != self._connection:
+            self._publish('connection', {'state': state, 'pid': os.getpid()})
+        self._connection = state
+
+
+_live_feed = None
+_live_feed_lock = threading.Lock()
+
+
+def get_live_feed() -> LiveFeed:
+    """获取实时事件源（进程内单例）"""
+    global _live_feed
+    if _live_feed is None:
+        with _live_feed_lock:
+            if _live_feed is None:
+                from config import config
+                _live_feed = LiveFeed(interval=config.LIVE_FEED_INTERVAL, window=config.LIVE_FEED_WINDOW,
+                                      queue_size=config.LIVE_FEED_QUEUE_SIZE, settle=config.STORE_FLUSH_INTERVAL)
+    return _live_feed
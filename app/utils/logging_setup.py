@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/17 15:00
+# file: logging_setup.py
+# 统一日志配置：请求线程只把日志记录放入队列，格式化和写文件由后台监听线程完成
+import os
+import re
+import json
+import time
+import queue
+import sys
+import random
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+from typing import Any, Dict, Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_NAME = 'toms'
+# 日志文件写法：process 每个进程各自滚动 toms.<pid>.log；watched 共用 toms.log，由外部logrotate滚动
+FILE_MODES = ('process', 'watched')
+PROCESS_LOG_PATTERN = re.compile(rf'^{LOG_NAME}\.\d+\.log(\.\d+)?$')
+
+_setup_lock = threading.Lock()
+_queue_handler = None
+
+
+class Payload:
+    """延迟序列化的报文，只有日志级别启用时才转成JSON并截断，未启用的级别不做任何序列化
+
+    记录进入队列前由AsyncQueueHandler.prepare在调用线程中转成字符串，
+    避免监听线程序列化时报文（请求中的字典）已被修改或正在被并发修改。
+
+    用法: logger.debug("最终推送给RabbitMQ的报文: %s", payload(message_data))
+    """
+
+    __slots__ = ('obj', 'max_chars')
+
+    def __init__(self, obj: Any, max_chars: int):
+        self.obj = obj
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        try:
+            text = json.dumps(self.obj, ensure_ascii=False, default=str)
+        except Exception:
+            try:
+                text = repr(self.obj)
+            except Exception as e:
+                text = f'(报文序列化失败: {e!r})'
+        if self.max_chars and len(text) > self.max_chars:
+            return f'{text[:self.max_chars]}...(已截断，共{len(text)}字符)'
+        return text
+
+
+class OmittedPayload:
+    """未被采样的报文占位"""
+
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        return '(报文未采样)'
+
+
+_OMITTED = OmittedPayload()
+_payload_max_chars = 2000
+_payload_sample_rate = 1.0
+
+
+def payload(obj: Any):
+    """包装需要记录的报文：按LOG_PAYLOAD_SAMPLE_RATE采样，按LOG_PAYLOAD_MAX_CHARS截断"""
+    if _payload_sample_rate < 1.0 and random.random() >= _payload_sample_rate:
+        return _OMITTED
+    return Payload(obj, _payload_max_chars)
+
+
+class _BoundedQueueListener(QueueListener):
+    """队列有上限时停止监听要等待空位放入结束标记，而不是在队列已满时抛出queue.Full"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """不在请求线程中格式化的QueueHandler
+
+    标准QueueHandler.prepare会先格式化整条消息（为跨进程队列准备），这里的队列只在进程内使用，
+    只把Payload参数在调用线程中转成字符串（报文内容固定在记录时刻），格式化、拼接和写文件由监听线程完成。
+    队列有上限，监听线程跟不上（如磁盘阻塞）时丢弃新记录并计数，不阻塞请求线程也不无限占用内存。
+    监听线程在fork后的子进程（如gunicorn --preload）中会自动重新启动。
+    """
+
+    def __init__(self, log_queue: queue.Queue, handlers):
+        super().__init__(log_queue)
+        self.handlers = handlers
+        self.dropped = 0
+        self._pid = None
+        self._listener = None
+        self._lock = threading.Lock()
+        self._ensure_listener()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._listener = _BoundedQueueListener(self.queue, *self.handlers, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if isinstance(args, tuple) and any(isinstance(arg, Payload) for arg in args):
+            record.args = tuple(str(arg) if isinstance(arg, Payload) else arg for arg in args)
+        elif isinstance(args, Payload):
+            record.args = (str(args),)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                # 队列已满时日志本身写不进去，直接提示到标准错误
+                sys.stderr.write(f'日志队列已满，已丢弃{self.dropped}条日志\n')
+
+    def emit(self, record: logging.LogRecord):
+        self._ensure_listener()
+        super().emit(record)
+
+    def stop(self):
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+class ProcessRotatingFileHandler(RotatingFileHandler):
+    """按进程分文件的滚动日志：写入 <目录>/toms.<pid>.log
+
+    RotatingFileHandler的滚动（重命名文件）不是多进程安全的，多个gunicorn worker写同一个文件时会互相改名，
+    日志丢失或写进已滚动的文件；每个进程一个文件后滚动只涉及本进程。fork后的子进程在第一次写日志时切换到自己的文件。
+    """
+
+    def __init__(self, directory: str, maxBytes: int = 0, backupCount: int = 0, encoding: Optional[str] = None):
+        self.directory = directory
+        self._pid = os.getpid()
+        super().__init__(self._path(), maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f'{LOG_NAME}.{self._pid}.log')
+
+    def emit(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            # 继承自父进程的文件句柄不再使用，改写本进程的文件
+            self.acquire()
+            try:
+                self._pid = os.getpid()
+                self.stream = None
+                self.baseFilename = os.path.abspath(self._path())
+            finally:
+                self.release()
+        super().emit(record)
+
+
+def prune_process_logs(directory: str, retention_days: float):
+    """删除超过保留天数未写入的按进程日志（已退出的worker留下的文件）"""
+    if retention_days <= 0:
+        return
+    expire_before = time.time() - retention_days * 86400
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if not PROCESS_LOG_PATTERN.match(name):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < expire_before:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def parse_levels(value: Optional[str]) -> Dict[str, str]:
+    """解析 'pika:WARNING,app.routes:DEBUG' 形式的模块日志级别"""
+    levels = {}
+    for item in (value or '').split(','):
+        if ':' in item:
+            name, level = item.split(':', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(config) -> logging.Handler:
+    """配置根日志（可重复调用，只生效一次）
+
+    - 根日志级别 LOG_LEVEL，模块级别 LOG_LEVELS（配置中的字典，环境变量可追加覆盖）
+    - 输出到控制台，LOG_DIR非空时同时写入日志文件：LOG_FILE_MODE=process（默认）每个进程按大小滚动各自的
+      toms.<pid>.log；watched 共用 toms.log，文件被外部logrotate改名或删除后自动重新打开
+    """
+    global _queue_handler, _payload_max_chars, _payload_sample_rate
+    with _setup_lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        _payload_max_chars = config.LOG_PAYLOAD_MAX_CHARS
+        _payload_sample_rate = config.LOG_PAYLOAD_SAMPLE_RATE
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = []
+        console = logging.StreamHandler()
+        console.setFormatter(formatter)
+        handlers.append(console)
+        if config.LOG_DIR:
+            if config.LOG_FILE_MODE not in FILE_MODES:
+                raise ValueError(f'LOG_FILE_MODE取值必须为: {", ".join(FILE_MODES)}')
+            os.makedirs(config.LOG_DIR, exist_ok=True)
+            if config.LOG_FILE_MODE == 'watched':
+                file_handler = WatchedFileHandler(os.path.join(config.LOG_DIR, f'{LOG_NAME}.log'), encoding='utf-8')
+            else:
+                prune_process_logs(config.LOG_DIR, config.LOG_RETENTION_DAYS)
+                file_handler = ProcessRotatingFileHandler(
+                    config.LOG_DIR,
+                    maxBytes=config.LOG_MAX_BYTES,
+                    backupCount=config.LOG_BACKUP_COUNT,
+                    encoding='utf-8'
+                )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        _queue_handler = AsyncQueueHandler(queue.Queue(config.LOG_QUEUE_SIZE), handlers)
+        root.addHandler(_queue_handler)
+        root.setLevel(config.LOG_LEVEL.upper())
+
+        levels = dict(config.LOG_LEVELS)
+        levels.update(parse_levels(os.getenv('LOG_LEVELS')))
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(level.upper())
+
+        atexit.register(_queue_handler.stop)
+        return _queue_handler
+
+
+def dropped_log_count() -> int:
+    """本进程因日志队列已满而丢弃的日志条数"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/19 15:00
+# file: metrics.py
+# 队列推送指标：按秒、按分钟的固定大小滚动时间序列，每次推送O(1)增量更新
+# 各worker把有变化的桶随仪表盘写回写入共享存储，读取时按队列、时间合并所有worker的桶
+import os
+import json
+import time
+import bisect
+import threading
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收集超出上界的样本
+LATENCY_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+ALL_QUEUES = '*'
+
+
+class Bucket:
+    """一个时间桶：推送次数、失败次数、延迟总和与延迟直方图"""
+
+    __slots__ = ('start', 'count', 'failures', 'latency_sum', 'histogram')
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, start: Optional[int]):
+        self.start = start
+        self.count = 0
+        self.failures = 0
+        self.latency_sum = 0.0
+        self.histogram = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+
+    def add(self, success: bool, elapsed_ms: float):
+        self.count += 1
+        if not success:
+            self.failures += 1
+        self.latency_sum += elapsed_ms
+        self.histogram[bisect.bisect_left(LATENCY_BOUNDS_MS, elapsed_ms)] += 1
+
+    def merge(self, count: int, failures: int, latency_sum: float, histogram: List[int]):
+        """合并另一个worker同一时间桶的数据"""
+        self.count += count
+        self.failures += failures
+        self.latency_sum += latency_sum
+        for index, n in enumerate(histogram[:len(self.histogram)]):
+            self.histogram[index] += n
+
+    def quantile(self, q: float) -> Optional[float]:
+        """由直方图估算分位数（桶内线性插值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, n in enumerate(self.histogram):
+            if n and cumulative + n >= rank:
+                lower = LATENCY_BOUNDS_MS[index - 1] if index else 0
+                upper = LATENCY_BOUNDS_MS[index] if index < len(LATENCY_BOUNDS_MS) else LATENCY_BOUNDS_MS[-1] * 2
+                return round(lower + (upper - lower) * (rank - cumulative) / n, 1)
+            cumulative += n
+        return float(LATENCY_BOUNDS_MS[-1])
+
+    def to_point(self, start: int) -> Dict[str, Any]:
+        return {
+            't': start,
+            'count': self.count,
+            'failures': self.failures,
+            'avg_ms': round(self.latency_sum / self.count, 1) if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p90_ms': self.quantile(0.9),
+            'p99_ms': self.quantile(0.99)
+        }
+
+
+EMPTY_BUCKET = Bucket()
+
+
+class RollingSeries:
+    """固定槽位数的滚动时间序列，槽位按 (时间 // width) % size 复用，过期槽位在写入时重置"""
+
+    __slots__ = ('width', 'size', 'buckets')
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self.buckets = [Bucket() for _ in range(size)]
+
+    def add(self, ts: float, success: bool, elapsed_ms: float) -> int:
+        """写入一个样本，返回所在桶的起始时间"""
+        start = int(ts) // self.width * self.width
+        bucket = self.buckets[(start // self.width) % self.size]
+        if bucket.start != start:
+            bucket.reset(start)
+        bucket.add(success, elapsed_ms)
+        return start
+
+    def get(self, start: int) -> Optional[Bucket]:
+        bucket = self.buckets[(start // self.width) % self.size]
+        return bucket if bucket.start == start else None
+
+    def points(self, end: int, count: int) -> List[Dict[str, Any]]:
+        """返回截止end（不含）的最近count个桶，没有数据的桶补零"""
+        end = end // self.width * self.width
+        count = min(count, self.size)
+        points = []
+        for start in range(end - count * self.width, end, self.width):
+            bucket = self.buckets[(start // self.width) % self.size]
+            points.append((bucket if bucket.start == start else EMPTY_BUCKET).to_point(start))
+        return points
+
+
+class QueueMetrics:
+    """各队列（以及全部队列汇总 '*'）的按秒/按分钟时间序列
+
+    本进程的桶只覆盖本worker的推送；记录时同时登记变化的桶，由仪表盘写回线程取走写入共享存储
+    """
+
+    RESOLUTIONS = {'second': 1, 'minute': 60}
+
+    def __init__(self, second_buckets: int = 300, minute_buckets: int = 60):
+        self.sizes = {'second': second_buckets, 'minute': minute_buckets}
+        self._series: Dict[str, Dict[str, RollingSeries]] = {}
+        self._dirty = set()  # 尚未写入共享存储的桶 (时间粒度, 队列, 起始时间)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _queue_series(self, queue_name: str) -> Dict[str, RollingSeries]:
+        series = self._series.get(queue_name)
+        if series is None:
+            series = {name: RollingSeries(width, self.sizes[name]) for name, width in self.RESOLUTIONS.items()}
+            self._series[queue_name] = series
+        return series
+
+    def record(self, queue_name: str, success: bool, elapsed_ms: float, ts: Optional[float] = None):
+        """记录一次推送"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for name in (queue_name, ALL_QUEUES):
+                for resolution, series in self._queue_series(name).items():
+                    self._dirty.add((resolution, name, series.add(ts, success, elapsed_ms)))
+
+    def collect_dirty(self) -> Tuple[List[Tuple], List[Tuple]]:
+        """取走有变化的桶，返回 (写入共享存储的行, 桶键)
+
+        行中是桶的当前累计值而不是增量，重复写入同一行是幂等的；写入失败时用mark_dirty放回重试
+        """
+        with self._lock:
+            keys, self._dirty = list(self._dirty), set()
+            rows = []
+            for resolution, name, start in keys:
+                bucket = self._series[name][resolution].get(start)
+                if bucket is not None:
+                    rows.append((resolution, name, start, bucket.count, bucket.failures, bucket.latency_sum,
+                                 json.dumps(bucket.histogram, separators=(',', ':'))))
+        return rows, keys
+
+    def mark_dirty(self, keys: Iterable[Tuple]):
+        with self._lock:
+            self._dirty.update(keys)
+
+    def cutoffs(self, now: Optional[float] = None) -> Dict[str, int]:
+        """各时间粒度在共享存储中保留的最早桶起始时间"""
+        now = int(time.time() if now is None else now)
+        return {name: now - width * self.sizes[name] for name, width in self.RESOLUTIONS.items()}
+
+    def queues(self) -> List[str]:
+        return sorted(name for name in self._series if name != ALL_QUEUES)
+
+    def window(self, resolution: str, span: Optional[int] = None, end: Optional[float] = None) -> Tuple[int, int, int]:
+        """返回 (桶宽度, 起始时间, 结束时间)：截止end所在桶（含）的最近span个桶，end默认为当前时间"""
+        if resolution not in self.RESOLUTIONS:
+            raise ValueError(f'不支持的时间粒度: {resolution}')
+        width = self.RESOLUTIONS[resolution]
+        span = self.sizes[resolution] if span is None else max(1, min(span, self.sizes[resolution]))
+        end = int(time.time() if end is None else end) // width * width + width
+        return width, end - span * width, end
+
+    def series(self, resolution: str = 'second', span: Optional[int] = None, queue_name: Optional[str] = None,
+               end: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """返回本worker各队列截止end所在桶（含）的最近span个桶，end默认为当前时间"""
+        width, start, end = self.window(resolution, span, end)
+        span = (end - start) // width
+        with self._lock:
+            names = [queue_name] if queue_name else list(self._series)
+            return {name: self._series[name][resolution].points(end, span) for name in names if name in self._series}
+
+
+_queue_metrics = None
+_queue_metrics_lock = threading.Lock()
+
+
+def get_queue_metrics() -> QueueMetrics:
+    """获取队列指标（进程内单例，fork后的子进程重新计数）"""
+    global _queue_metrics
+    if _queue_metrics is None or _queue_metrics._pid != os.getpid():
+        with _queue_metrics_lock:
+            if _queue_metrics is None or _queue_metrics._pid != os.getpid():
+                from config import config
+                _queue_metrics = QueueMetrics(config.METRICS_SECOND_BUCKETS, config.METRICS_MINUTE_BUCKETS)
+    return _queue_metrics
+
+
+# ==================== 跨worker汇总 ====================
+def merge_rows(rows: Iterable[Tuple], width: int, start: int, end: int,
+               queue_name: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """把共享存储中各worker的桶（queue_name, start, count, failures, latency_sum, histogram）按队列、时间合并
+
+    未指定队列时总是包含全部队列汇总 '*'，没有数据的桶补零
+    """
+    buckets: Dict[Tuple[str, int], Bucket] = {}
+    for name, bucket_start, count, failures, latency_sum, histogram in rows:
+        bucket = buckets.get((name, bucket_start))
+        if bucket is None:
+            bucket = buckets[(name, bucket_start)] = Bucket()
+            bucket.start = bucket_start
+        bucket.merge(count, failures, latency_sum, json.loads(histogram))
+    names = {name for name, _ in buckets}
+    names.add(queue_name or ALL_QUEUES)
+    return {name: [buckets.get((name, t), EMPTY_BUCKET).to_point(t) for t in range(start, end, width)]
+            for name in sorted(names)}
+
+
+def shared_series(resolution: str = 'second', span: Optional[int] = None, queue_name: Optional[str] = None,
+                  end: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """所有worker合并后的时间序列（来自共享存储，参数同QueueMetrics.series）"""
+    from app.utils.dashboard_data import get_dashboard_data_manager
+    width, start, end = get_queue_metrics().window(resolution, span, end)
+    rows = get_dashboard_data_manager().store.metric_rows(resolution, start, end, queue_name)
+    return merge_rows(rows, width, start, end, queue_name)
+
+
+def shared_queues() -> List[str]:
+    """共享存储中有指标的队列（所有worker）"""
+    from app.utils.dashboard_data import get_dashboard_data_manager
+    return [name for name in get_dashboard_data_manager().store.metric_queues() if name != ALL_QUEUES]
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/22 16:00
+# file: output_schema.py
+# 出站报文结构：按队列注册OMS约定的报文结构（JSON Schema子集），启动时编译为校验函数，推送前逐条校验
+import re
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils.schema import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# 校验模式：strict 不合格的报文不推送；warn 记录警告后照常推送；off 不校验
+MODES = ('strict', 'warn', 'off')
+
+# 常用字段片段
+CODE = {'type': 'string', 'minLength': 1}  # 单号、编码等非空字符串
+QTY = {'type': ['string', 'number'], 'pattern': r'^\d+(\.\d+)?$', 'minimum': 0}  # 数量：非负数字或数字字符串
+DATETIME = {'type': 'string', 'pattern': r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$'}  # 服务端生成的时间
+NUMBER = {'type': 'number', 'minimum': 0}  # 必须为数值类型的数量、尺寸
+
+# 仓储回传报文的公共部分：出库单/入库单头与订单行
+DELIVERY_ORDER = {
+    'type': 'object',
+    'required': ['deliveryOrderCode', 'warehouseCode'],
+    'properties': {'deliveryOrderCode': CODE, 'warehouseCode': CODE, 'operateTime': DATETIME, 'orderConfirmTime': DATETIME}
+}
+ENTRY_ORDER = {
+    'type': 'object',
+    'required': ['entryOrderCode', 'warehouseCode'],
+    'properties': {'entryOrderCode': CODE, 'warehouseCode': CODE, 'operateTime': DATETIME, 'orderConfirmTime': DATETIME}
+}
+ORDER_LINES = {
+    'type': 'array',
+    'minItems': 1,
+    'items': {'type': 'object', 'required': ['itemCode', 'actualQty'], 'properties': {'itemCode': CODE, 'actualQty': QTY}}
+}
+
+JSON_TYPES = {
+    'string': lambda v: isinstance(v, str),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'null': lambda v: v is None
+}
+
+KEYWORDS = frozenset(('type', 'properties', 'required', 'additionalProperties', 'items', 'minItems', 'maxItems',
+                      'minLength', 'maxLength', 'pattern', 'enum', 'minimum', 'maximum', 'description'))
+
+MAX_ERRORS = 50
+
+
+class OutputValidationError(ValidationError):
+    """出站报文不符合队列的输出结构，errors中field为报文内的路径（如 callbackResponse.orderLines[0].itemCode）"""
+
+    def __init__(self, queue_name: str, errors: List[Dict[str, Any]]):
+        self.queue_name = queue_name
+        super().__init__(errors)
+        self.args = (f'报文不符合队列 {queue_name} 的输出结构: {self.args[0]}',)
+
+
+def format_path(path) -> str:
+    """路径以 (父路径, 键) 链表传递，只在出错时拼接为字符串"""
+    parts = []
+    while path:
+        path, key = path
+        parts.append(f'[{key}]' if isinstance(key, int) else key)
+    text = ''
+    for part in reversed(parts):
+        text += part if part.startswith('[') or not text else '.' + part
+    return text or '$'
+
+
+def _type_name(value: Any) -> str:
+    for name, test in JSON_TYPES.items():
+        if name != 'integer' and test(value):
+            return name
+    return type(value).__name__
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any, Any, List[Dict[str, Any]]], None]:
+    """编译为 check(value, path, errors)，不合格时向errors追加 {'field', 'row', 'message'}
+
+    支持 type、properties、required、additionalProperties(false)、items、minItems/maxItems、
+    minLength/maxLength、pattern、enum、minimum/maximum；出现其他关键字时在注册时报错
+    """
+    unknown = set(schema) - KEYWORDS
+    if unknown:
+        raise ValueError(f'不支持的输出结构关键字: {", ".join(sorted(unknown))}')
+
+    checks: List[Callable[[Any, Any, List[Dict[str, Any]]], bool]] = []
+
+    def fail(errors, path, message):
+        if len(errors) < MAX_ERRORS:
+            text = format_path(path)
+            errors.append({'field': text, 'row': None, 'message': f'{text}: {message}'})
+        return False
+
+    types = schema.get('type')
+    if types is not None:
+        names = (types,) if isinstance(types, str) else tuple(types)
+        tests = tuple(JSON_TYPES[name] for name in names)
+        expected = '/'.join(names)
+
+        def check_type(value, path, errors):
+            for test in tests:
+                if test(value):
+                    return True
+            return fail(errors, path, f'类型应为{expected}，实际为{_type_name(value)}')
+        checks.append(check_type)
+
+    if 'enum' in schema:
+        choices = tuple(schema['enum'])
+        checks.append(lambda value, path, errors: value in choices
+                      or fail(errors, path, f'取值必须为: {", ".join(map(str, choices))}'))
+
+    min_length, max_length, pattern = schema.get('minLength'), schema.get('maxLength'), schema.get('pattern')
+    if min_length is not None or max_length is not None or pattern is not None:
+        regex = re.compile(pattern) if pattern is not None else None
+
+        def check_string(value, path, errors):
+            if not isinstance(value, str):
+                return True
+            if min_length is not None and len(value) < min_length:
+                return fail(errors, path, '不能为空' if min_length == 1 else f'长度不能小于{min_length}')
+            if max_length is not None and len(value) > max_length:
+                return fail(errors, path, f'长度不能超过{max_length}')
+            if regex is not None and not regex.search(value):
+                return fail(errors, path, f'格式不正确: {value!r}')
+            return True
+        checks.append(check_string)
+
+    minimum, maximum = schema.get('minimum'), schema.get('maximum')
+    if minimum is not None or maximum is not None:
+        def check_range(value, path, errors):
+            # 数字字符串按数值比较（格式由pattern校验）
+            try:
+                number = float(value) if isinstance(value, str) else value
+            except ValueError:
+                return True
+            if not isinstance(number, (int, float)) or isinstance(number, bool):
+                return True
+            if minimum is not None and number < minimum:
+                return fail(errors, path, f'不能小于{minimum}')
+            if maximum is not None and number > maximum:
+                return fail(errors, path, f'不能大于{maximum}')
+            return True
+        checks.append(check_range)
+
+    properties = {key: compile_schema(child) for key, child in schema.get('properties', {}).items()}
+    required = tuple(schema.get('required', ()))
+    closed = schema.get('additionalProperties') is False
+    if properties or required or closed:
+        property_items = tuple(properties.items())
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return True
+            for key in required:
+                if key not in value:
+                    fail(errors, (path, key), '缺少字段')
+            for key, check in property_items:
+                if key in value:
+                    check(value[key], (path, key), errors)
+            if closed:
+                for key in value:
+                    if key not in properties:
+                        fail(errors, (path, key), '不允许的字段')
+            return True
+        checks.append(check_object)
+
+    min_items, max_items = schema.get('minItems'), schema.get('maxItems')
+    item_check = compile_schema(schema['items']) if 'items' in schema else None
+    if item_check is not None or min_items is not None or max_items is not None:
+        def check_array(value, path, errors):
+            if not isinstance(value, list):
+                return True
+            if min_items is not None and len(value) < min_items:
+                fail(errors, path, f'至少需要{min_items}项')
+            if max_items is not None and len(value) > max_items:
+                fail(errors, path, f'最多{max_items}项')
+            if item_check is not None:
+                for index, item in enumerate(value):
+                    item_check(item, (path, index), errors)
+                    if len(errors) >= MAX_ERRORS:
+                        break
+            return True
+        checks.append(check_array)
+
+    checks = tuple(checks)
+
+    def check(value, path, errors):
+        # 类型不符时不再检查其内部结构
+        for step in checks:
+            if step(value, path, errors) is False:
+                return
+    return check
+
+
+# ==================== 队列注册 ====================
+_schemas: Dict[str, Dict[str, Any]] = {}
+
+
+def register_output_schema(queue_name: str, schema: Dict[str, Any]):
+    """注册队列的输出结构并立即编译（路由模块导入时完成）；多个消息类型共用同一队列时只注册一次"""
+    _schemas[queue_name] = {'schema': schema, 'check': compile_schema(schema)}
+
+
+def list_output_schemas() -> Dict[str, Dict[str, Any]]:
+    return {queue_name: entry['schema'] for queue_name, entry in _schemas.items()}
+
+
+def validate_output(queue_name: str, message: Any) -> List[Dict[str, Any]]:
+    """按队列的输出结构校验报文，返回错误列表；未注册结构的队列不校验"""
+    entry = _schemas.get(queue_name)
+    if entry is None:
+        return []
+    errors: List[Dict[str, Any]] = []
+    entry['check'](message, None, errors)
+    return errors
+
+
+def resolve_mode(mode: Optional[str] = None) -> str:
+    """校验模式，未指定时取配置OUTPUT_SCHEMA_MODE"""
+    if mode in (None, ''):
+        from config import config
+        mode = config.OUTPUT_SCHEMA_MODE
+    mode = str(mode).lower()
+    if mode not in MODES:
+        raise ValueError(f'validation取值必须为: {", ".join(MODES)}')
+    return mode
+
+
+def check_output(queue_name: str, message: Any, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    """推送前校验：strict模式下不合格时抛出OutputValidationError，warn模式下记录警告并返回错误列表"""
+    mode = resolve_mode(mode)
+    if mode == 'off':
+        return []
+    errors = validate_output(queue_name, message)
+    if errors:
+        if mode == 'strict':
+            raise OutputValidationError(queue_name, errors)
+        logger.warning(f"报文不符合队列 {queue_name} 的输出结构（warn模式，继续推送）: "
+                       f"{'；'.join(error['message'] for error in errors[:5])}")
+    return errors
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/21 10:00
+# file: page_cache.py
+# 页面渲染缓存：各蓝图首页只在预设参数、模板或静态资源变化时重新渲染，响应带强ETag，重复请求返回304
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from flask import current_app, render_template, request, make_response
+
+
+def context_version(context: Dict[str, Any]) -> str:
+    """模板参数（预设参数等）的版本号：参数内容的哈希"""
+    data = json.dumps(context, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+
+class PageCache:
+    """按 (模板名, 参数版本, 静态资源版本) 缓存渲染结果的LRU缓存
+
+    - 模板对象随缓存条目保存，模板重新加载（TEMPLATES_AUTO_RELOAD）后条目自动失效
+    - ETag由渲染结果计算，内容不变时各worker、重启前后的ETag都相同
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str, str], Tuple[Any, bytes, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str, str], template) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not template:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Tuple[str, str, str], template, body: bytes) -> str:
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._entries[key] = (template, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses}
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> PageCache:
+    """获取页面渲染缓存（进程内单例）"""
+    global _page_cache
+    if _page_cache is None:
+        with _page_cache_lock:
+            if _page_cache is None:
+                from config import config
+                _page_cache = PageCache(config.PAGE_CACHE_SIZE)
+    return _page_cache
+
+
+def render_cached(template_name: str, **context):
+    """用法同render_template，返回带强ETag的响应；请求的If-None-Match匹配时返回304
+
+    页面只依赖传入的模板参数和静态资源地址，不能使用request、session等每次请求不同的数据
+    """
+    from app.utils.assets import get_asset_pipeline
+    if not current_app.config.get('PAGE_CACHE_ENABLED', True):
+        return render_template(template_name, **context)
+
+    template = current_app.jinja_env.get_template(template_name)
+    key = (template_name, context_version(context), get_asset_pipeline().current_version())
+    cache = get_page_cache()
+    cached = cache.get(key, template)
+    if cached is None:
+        body = render_template(template, **context).encode('utf-8')
+        etag = cache.put(key, template, body)
+    else:
+        body, etag = cached
+
+    response = make_response(body)
+    response.mimetype = 'text/html'
+    response.set_etag(etag)
+    # 允许浏览器缓存，但每次使用前都要用ETag向服务器确认
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
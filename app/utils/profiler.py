@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/24 10:00
+# file: profiler.py
+# 按需性能剖析：在运行中的worker上做一次限时/限请求数的剖析（采样或cProfile），汇总为折叠栈与热点函数表
+import os
+import sys
+import time
+import cProfile
+import pstats
+import sysconfig
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sample', 'cprofile')
+# 采样范围：requests 只采样正在处理请求的线程；all 采样全部线程（含空闲的worker线程、日志线程等）
+THREAD_SCOPES = ('requests', 'all')
+
+MAX_DEPTH = 128  # 采样栈的最大深度（从栈顶开始截取）
+STDLIB_DIR = sysconfig.get_paths()['stdlib'] + os.sep
+
+
+def _short_path(filename: str) -> str:
+    """文件路径缩短为项目内相对路径、site-packages下的包路径或标准库内的路径"""
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        index = filename.rfind(marker)
+        if index >= 0:
+            return filename[index + len(marker):]
+    for prefix in (os.getcwd() + os.sep, STDLIB_DIR):
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def _label(filename: str, line: int, name: str) -> str:
+    return f'{name} ({_short_path(filename)}:{line})'
+
+
+class ProfileSession:
+    """一次剖析：持续到seconds秒或处理完max_requests个请求（先到为准），同一worker同一时间只有一个
+
+    - sample: 后台线程每interval秒读取 sys._current_frames()，按调用栈计数；
+      请求线程不需要任何钩子，开销只在采样线程（gevent下看不到各协程的栈，请使用cprofile）
+    - cprofile: 逐个请求在cProfile下执行并合并统计；同一时间只剖析一个请求（cProfile按线程安装，
+      Python 3.12起同一时间只允许一个剖析器），其余并发请求照常处理、不计入
+    """
+
+    def __init__(self, mode: str = 'sample', seconds: float = 10, max_requests: Optional[int] = None,
+                 interval: float = 0.005, threads: str = 'requests'):
+        if mode not in MODES:
+            raise ValueError(f'mode取值必须为: {", ".join(MODES)}')
+        if threads not in THREAD_SCOPES:
+            raise ValueError(f'threads取值必须为: {", ".join(THREAD_SCOPES)}')
+        self.mode = mode
+        self.seconds = seconds
+        self.max_requests = max_requests
+        self.interval = interval
+        self.threads = threads
+        self.requests = 0
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._active = set()  # 正在处理请求的线程
+        self._skip = set()  # 不采样的线程（采样线程、发起剖析的请求线程）
+        self._stacks: Counter = Counter()
+        self._stats: Optional[pstats.Stats] = None
+        self._profiling = threading.Lock()  # cprofile模式下同一时间只剖析一个请求
+
+    # ==================== 请求钩子 ====================
+    def request_started(self):
+        """before_request中调用；cprofile模式下返回本请求的剖析器（未轮到时为None）"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._active.add(ident)
+        if self.mode != 'cprofile' or not self._profiling.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 已有其他剖析工具在运行（如调试器），本请求不剖析
+            self._profiling.release()
+            return None
+        return profile
+
+    def request_finished(self, profile: Optional[cProfile.Profile] = None):
+        """teardown_request中调用：合并本请求的统计并计数，达到max_requests时结束剖析"""
+        ident = threading.get_ident()
+        if profile is not None:
+            profile.disable()
+            self._profiling.release()
+        with self._lock:
+            self._active.discard(ident)
+            if profile is not None:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+            if self.mode == 'sample' or profile is not None:
+                self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self._done.set()
+
+    # ==================== 采样 ====================
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            idents = set(self._active) if self.threads == 'requests' else set(frames)
+        idents -= self._skip
+        for ident in idents:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self._stacks[tuple(stack)] += 1
+        self.samples += 1
+
+    def _sampler(self):
+        self._skip.add(threading.get_ident())
+        while not self._done.wait(self.interval):
+            try:
+                self._sample()
+            except Exception as e:
+                logger.error(f"性能采样失败: {str(e)}")
+                self._done.set()
+
+    def run(self) -> 'ProfileSession':
+        """在当前线程阻塞等待剖析结束（发起剖析的请求线程本身不计入）"""
+        self._skip.add(threading.get_ident())
+        self.started = time.time()
+        sampler = None
+        if self.mode == 'sample':
+            sampler = threading.Thread(target=self._sampler, name='profiler-sampler', daemon=True)
+            sampler.start()
+        self._done.wait(self.seconds)
+        self._done.set()
+        if sampler is not None:
+            sampler.join()
+        self.elapsed = time.time() - self.started
+        return self
+
+    # ==================== 结果 ====================
+    def collapsed(self) -> List[Tuple[str, int]]:
+        """折叠栈（flamegraph.pl / speedscope 格式）：[('根;...;叶', 权重)]
+
+        sample模式权重为样本数；cprofile模式没有完整调用栈，输出 调用方;被调用方 两层，权重为被调用方经该调用方的自身耗时（微秒）
+        """
+        lines: Counter = Counter()
+        if self.mode == 'sample':
+            labels: Dict[Any, str] = {}
+            for stack, count in self._stacks.items():
+                names = []
+                for code in stack:
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _label(code.co_filename, code.co_firstlineno, code.co_name)
+                    names.append(label)
+                lines[';'.join(names)] += count
+        elif self._stats is not None:
+            for (filename, line, name), (_, _, _, _, callers) in self._stats.stats.items():
+                callee = _label(filename, line, name)
+                for (caller_file, caller_line, caller_name), caller_stats in callers.items():
+                    weight = int(caller_stats[2] * 1_000_000)
+                    if weight:
+                        lines[f'{_label(caller_file, caller_line, caller_name)};{callee}'] += weight
+        return lines.most_common()
+
+    def top(self, limit: int = 30) -> List[Dict[str, Any]]:
+        """热点函数表：sample模式按自身样本数排序（self为位于栈顶的样本，total为出现在栈中的样本），cprofile模式按自身耗时排序"""
+        if self.mode == 'sample':
+            own: Counter = Counter()
+            total: Counter = Counter()
+            for stack, count in self._stacks.items():
+                own[stack[-1]] += count
+                for code in set(stack):
+                    total[code] += count
+            samples = sum(self._stacks.values()) or 1
+            return [{
+                'function': code.co_name,
+                'file': _short_path(code.co_filename),
+                'line': code.co_firstlineno,
+                'self': own[code],
+                'total': total[code],
+                'self_pct': round(own[code] * 100 / samples, 1),
+                'total_pct': round(total[code] * 100 / samples, 1)
+            } for code, _ in sorted(total.items(), key=lambda item: (own[item[0]], item[1]), reverse=True)[:limit]]
+        if self._stats is None:
+            return []
+        rows = sorted(self._stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [{
+            'function': name,
+            'file': _short_path(filename),
+            'line': line,
+            'calls': calls,
+            'primitive_calls': primitive,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3)
+        } for (filename, line, name), (primitive, calls, tottime, cumtime, _) in rows]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'pid': os.getpid(),
+            'mode': self.mode,
+            'threads': self.threads if self.mode == 'sample' else None,
+            'interval_ms': round(self.interval * 1000, 3) if self.mode == 'sample' else None,
+            'seconds': round(self.elapsed, 3),
+            'requests': self.requests,
+            'samples': self.samples if self.mode == 'sample' else None,
+            'stack_samples': sum(self._stacks.values()) if self.mode == 'sample' else None
+        }
+
+
+# ==================== 当前剖析 ====================
+# 未在剖析时请求钩子只读取这一个变量
+_session: Optional[ProfileSession] = None
+_session_lock = threading.Lock()
+
+
+def current_session() -> Optional[ProfileSession]:
+    return _session
+
+
+def run_session(session: ProfileSession) -> ProfileSession:
+    """在本worker上执行一次剖析（阻塞到结束），已有剖析在进行时抛出RuntimeError"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            raise RuntimeError('本worker已有剖析在进行中')
+        _session = session
+    logger.warning(f"开始性能剖析: pid={os.getpid()}, mode={session.mode}, seconds={session.seconds}, "
+                   f"max_requests={session.max_requests}")
+    try:
+        return session.run()
+    finally:
+        with _session_lock:
+            _session = None
+        logger.warning(f"性能剖析结束: {session.summary()}")
+
+
+def init_profiler(app):
+    """注册剖析钩子；PROFILER_TOKEN未配置时不注册任何钩子（剖析接口返回404），请求路径上没有额外开销"""
+    if not app.config.get('PROFILER_TOKEN'):
+        return
+    from flask import g
+
+    @app.before_request
+    def profiler_request_started():
+        session = _session
+        if session is not None:
+            g._profiler = (session, session.request_started())
+
+    @app.teardown_request
+    def profiler_request_finished(exc=None):
+        entry = g.pop('_profiler', None)
+        if entry is not None:
+            session, profile = entry
+            session.request_finished(profile)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/18 10:00
+# file: push_history.py
+# 推送历史环形缓冲区：固定容量 + 总字节预算，追加与淘汰均为O(1)
+import json
+import time
+import threading
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Tuple
+
+
+class PushRecord:
+    """单条推送记录，只保存编码后的报文字节和少量元数据"""
+
+    __slots__ = ('seq', 'ts', 'queue_name', 'success', 'elapsed_ms', 'body', 'size', 'truncated', 'keys')
+
+    def __init__(self, seq: int, ts: float, queue_name: str, success: bool, elapsed_ms: Optional[float],
+                 body: bytes, size: int, truncated: bool, keys: Tuple[Tuple[str, str], ...] = ()):
+        self.seq = seq
+        self.ts = ts
+        self.queue_name = queue_name
+        self.success = success
+        self.elapsed_ms = elapsed_ms
+        self.body = body
+        self.size = size
+        self.truncated = truncated
+        self.keys = keys  # 推送时提取的业务单号 ((字段名, 值), ...)
+
+    def message(self) -> Any:
+        """解码报文；被截断的报文无法解析时返回原始文本"""
+        text = self.body.decode('utf-8', errors='replace')
+        if self.truncated:
+            return text
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+
+    def to_dict(self, include_message: bool = True) -> Dict[str, Any]:
+        record = {
+            'seq': self.seq,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.ts)),
+            'queue_name': self.queue_name,
+            'success': self.success,
+            'elapsed_ms': self.elapsed_ms,
+            'size': self.size,
+            'truncated': self.truncated
+        }
+        if self.keys:
+            keys = {}
+            for name, value in self.keys:
+                keys.setdefault(name, []).append(value)
+            record['keys'] = keys
+        if include_message:
+            record['message'] = self.message()
+        return record
+
+
+def encode_message(message: Any) -> bytes:
+    if isinstance(message, bytes):
+        return message
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def extract_business_keys(message: Any, names: Iterable[str], max_values: int = 20) -> Tuple[Tuple[str, str], ...]:
+    """在报文（任意层级）中查找业务单号字段，返回去重后的 ((字段名, 值), ...)"""
+    names = frozenset(names)
+    found = []
+    seen = set()
+    stack = [message]
+    while stack and len(found) < max_values:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for name, value in node.items():
+                if name in names and isinstance(value, (str, int)) and value != '':
+                    value = str(value)
+                    if value not in seen:
+                        seen.add(value)
+                        found.append((name, value))
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return tuple(found)
+
+
+class PushHistory:
+    """推送历史环形缓冲区
+
+    - 槽位数组固定为capacity，head指向最旧记录，写满后覆盖最旧记录
+    - 同时按max_bytes限制报文总字节数，超出时从最旧记录开始淘汰
+    - 单条报文超过max_record_bytes时只保留前缀并标记truncated
+    """
+
+    def __init__(self, capacity: int = 1000, max_bytes: int = 8 * 1024 * 1024,
+                 max_record_bytes: int = 256 * 1024):
+        if capacity <= 0:
+            raise ValueError(f'容量必须大于0: {capacity}')
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.max_record_bytes = min(max_record_bytes, max_bytes)
+        self._slots: List[Optional[PushRecord]] = [None] * capacity
+        self._head = 0
+        self._count = 0
+        self._bytes = 0
+        self._seq = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _evict_oldest(self):
+        record = self._slots[self._head]
+        self._slots[self._head] = None
+        self._bytes -= len(record.body)
+        self._head = (self._head + 1) % self.capacity
+        self._count -= 1
+        self._evicted += 1
+
+    def append(self, queue_name: str, message: Any, success: bool,
+               elapsed_ms: Optional[float] = None, keys: Tuple[Tuple[str, str], ...] = ()) -> PushRecord:
+        """追加一条推送记录，message可以是字典或已编码的bytes"""
+        body = encode_message(message)
+        size = len(body)
+        truncated = size > self.max_record_bytes
+        if truncated:
+            body = body[:self.max_record_bytes]
+        with self._lock:
+            while self._count and (self._count >= self.capacity or self._bytes + len(body) > self.max_bytes):
+                self._evict_oldest()
+            self._seq += 1
+            record = PushRecord(self._seq, time.time(), queue_name, success, elapsed_ms, body, size, truncated, keys)
+            self._slots[(self._head + self._count) % self.capacity] = record
+            self._count += 1
+            self._bytes += len(body)
+            return record
+
+    def _iter_newest(self) -> Iterator[PushRecord]:
+        for offset in range(self._count - 1, -1, -1):
+            yield self._slots[(self._head + offset) % self.capacity]
+
+    def latest(self, limit: int = 50, queue_name: Optional[str] = None,
+               success: Optional[bool] = None) -> List[PushRecord]:
+        """按时间倒序返回最近的记录"""
+        records = []
+        with self._lock:
+            for record in self._iter_newest():
+                if queue_name and record.queue_name != queue_name:
+                    continue
+                if success is not None and record.success != success:
+                    continue
+                records.append(record)
+                if len(records) >= limit:
+                    break
+        return records
+
+    def get(self, seq: int) -> Optional[PushRecord]:
+        """按序号取记录（序号连续，可直接定位槽位）"""
+        with self._lock:
+            if not self._count:
+                return None
+            oldest = self._slots[self._head].seq
+            offset = seq - oldest
+            if 0 <= offset < self._count:
+                return self._slots[(self._head + offset) % self.capacity]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._head = 0
+            self._count = 0
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'count': self._count,
+                'capacity': self.capacity,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'total_appended': self._seq,
+                'evicted': self._evicted
+            }
@@ -4,16 +4,18 @@ import time
 import logging
 import threading
 import os
+import queue
+from contextlib import contextmanager
 from typing import Dict, Any, Optional, List
+from app.utils.logging_setup import payload
+from app.utils.output_schema import check_output
+from app.utils.timing import stage
+from app.utils.tracing import start_span, add_event, inject
 from pika.exceptions import (AMQPConnectionError, StreamLostError, 
                             ChannelClosedByBroker, ConnectionClosedByBroker, 
                             UnroutableError)
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 日志由 app.utils.logging_setup 统一配置
 logger = logging.getLogger(__name__)
 
 
@@ -33,6 +35,8 @@ class RabbitMQConfig:
         self.retry_delay = int(os.environ.get('RABBITMQ_RETRY_DELAY', '2'))
         self.publish_timeout = int(os.environ.get('RABBITMQ_PUBLISH_TIMEOUT', '5'))
         self.message_ttl = int(os.environ.get('RABBITMQ_MESSAGE_TTL', '86400000'))  # 默认24小时
+        self.pool_size = int(os.environ.get('RABBITMQ_POOL_SIZE', '8'))  # 每个进程最多同时使用的连接数（gthread下取线程数）
+        self.pool_timeout = float(os.environ.get('RABBITMQ_POOL_TIMEOUT', '30'))  # 连接全部占用时的最长等待秒数
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -47,12 +51,30 @@ class RabbitMQConfig:
             'MAX_RETRIES': self.max_retries,
             'RETRY_DELAY': self.retry_delay,
             'PUBLISH_TIMEOUT': self.publish_timeout,
-            'MESSAGE_TTL': self.message_ttl
+            'MESSAGE_TTL': self.message_ttl,
+            'POOL_SIZE': self.pool_size,
+            'POOL_TIMEOUT': self.pool_timeout
         }
 
 
+class _ChannelSlot:
+    """连接池中的一个槽位：一个BlockingConnection及其通道，同一时间只被一个线程使用"""
+
+    __slots__ = ('connection', 'channel', 'tx_channel')
+
+    def __init__(self):
+        self.connection = None
+        self.channel = None
+        self.tx_channel = None  # 批量发布使用的事务通道（与确认模式的通道分开）
+
+
 class RabbitMQManager:
-    """RabbitMQ连接管理器，实现可靠的消息发布机制"""
+    """RabbitMQ连接管理器，实现可靠的消息发布机制
+
+    pika的BlockingConnection不是线程安全的：每次发布从连接池借出一个槽位，
+    在本线程独占使用期间，self.connection / self.channel 指向该槽位的连接和通道。
+    槽位按需创建，最多POOL_SIZE个；gthread下各线程并发发布，gevent下socket被打补丁，等待确认时让出协程。
+    """
     # 队列配置映射 - 可考虑移到配置文件中
     QUEUE_CONFIG = {
         'oms_sales_order_download_queue': {
@@ -68,11 +90,83 @@ class RabbitMQManager:
 
     def __init__(self, config: Dict[str, Any]):
         self.config = config
-        self.connection = None
-        self.channel = None
         self._connection_params = None
-        self._lock = threading.RLock()  # 添加线程锁确保线程安全
+        self._lock = threading.RLock()  # 保护初始化和连接池扩容
         self._initialized = False
+        self._pool = queue.LifoQueue()  # 空闲槽位，后进先出以复用最近使用（仍然活跃）的连接
+        self._slots: List[_ChannelSlot] = []
+        self._current = threading.local()
+        self._closed = False
+
+    # ==================== 连接池 ====================
+    @property
+    def connection(self):
+        slot = getattr(self._current, 'slot', None)
+        return slot.connection if slot else None
+
+    @connection.setter
+    def connection(self, value):
+        self._current.slot.connection = value
+
+    @property
+    def channel(self):
+        slot = getattr(self._current, 'slot', None)
+        return slot.channel if slot else None
+
+    @channel.setter
+    def channel(self, value):
+        self._current.slot.channel = value
+
+    def _acquire_slot(self) -> _ChannelSlot:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._slots) < self.config.get('POOL_SIZE', 8):
+                slot = _ChannelSlot()
+                self._slots.append(slot)
+                return slot
+        try:
+            return self._pool.get(timeout=self.config.get('POOL_TIMEOUT', 30))
+        except queue.Empty:
+            raise ConnectionError(f"RabbitMQ连接池已满（{len(self._slots)}个连接均在使用中）")
+
+    @contextmanager
+    def borrow(self):
+        """借出一个槽位给当前线程（可重入：重试时复用同一个槽位）"""
+        if getattr(self._current, 'slot', None) is not None:
+            yield self._current.slot
+            return
+        if self._closed:
+            raise ConnectionError("RabbitMQ管理器已关闭")
+        slot = self._acquire_slot()
+        self._current.slot = slot
+        try:
+            yield slot
+        finally:
+            self._current.slot = None
+            self._pool.put(slot)
+
+    @staticmethod
+    def _close_quietly(resource):
+        """关闭通道或连接，已断开时忽略异常"""
+        try:
+            if resource is not None and not resource.is_closed:
+                resource.close()
+        except Exception as e:
+            logger.debug(f"关闭RabbitMQ通道/连接时出错: {str(e)}")
+
+    def _discard_slot(self, slot: _ChannelSlot):
+        """关闭并丢弃槽位的通道和连接（重试前调用，避免旧的BlockingConnection及其socket、心跳泄漏），下次使用时重新连接"""
+        for resource in (slot.tx_channel, slot.channel, slot.connection):
+            self._close_quietly(resource)
+        slot.tx_channel = slot.channel = slot.connection = None
+
+    def pool_stats(self) -> Dict[str, int]:
+        open_count = sum(1 for slot in self._slots if slot.connection is not None and slot.connection.is_open)
+        return {'size': len(self._slots), 'idle': self._pool.qsize(), 'open': open_count,
+                'max_size': self.config.get('POOL_SIZE', 8)}
 
     def _create_connection_params(self):
         """创建连接参数"""
@@ -101,96 +195,95 @@ class RabbitMQManager:
         return self._initialized
 
     def connect(self) -> bool:
-        """建立连接，支持重试机制"""
-        with self._lock:
-            # 确保已初始化
-            if not self._initialized:
-                self.initialize()
-
-            max_retries = self.config.get('MAX_RETRIES', 3)
-            retry_delay = self.config.get('RETRY_DELAY', 2)
-
-            for attempt in range(max_retries):
-                try:
-                    logger.info(f"尝试连接RabbitMQ (第{attempt + 1}次)...")
-                    self.connection = pika.BlockingConnection(self._connection_params)
-                    self.channel = self.connection.channel()
-                    logger.info("RabbitMQ连接成功！")
-                    return True
-
-                except (AMQPConnectionError, StreamLostError, ConnectionClosedByBroker) as e:
-                    logger.error(f"RabbitMQ连接失败 (第{attempt + 1}次): {str(e)}")
-                    logger.error(f"连接信息: HOST={self.config['HOST']}, PORT={self.config['PORT']}, VHOST={self.config['VHOST']}")
-                    if attempt < max_retries - 1:
-                        logger.info(f"等待{retry_delay}秒后重试...")
-                        time.sleep(retry_delay)
-                    else:
-                        logger.error("RabbitMQ连接失败，已达到最大重试次数")
-                        return False
+        """为当前借出的槽位建立连接，支持重试机制"""
+        # 确保已初始化
+        if not self._initialized:
+            self.initialize()
+
+        max_retries = self.config.get('MAX_RETRIES', 3)
+        retry_delay = self.config.get('RETRY_DELAY', 2)
+
+        for attempt in range(max_retries):
+            try:
+                logger.info(f"尝试连接RabbitMQ (第{attempt + 1}次)...")
+                add_event('rabbitmq.connect', attempt=attempt + 1)
+                self.connection = pika.BlockingConnection(self._connection_params)
+                self.channel = self.connection.channel()
+                logger.info("RabbitMQ连接成功！")
+                return True
 
-                except Exception as e:
-                    logger.error(f"未知连接错误: {str(e)}")
-                    logger.error(f"连接信息: HOST={self.config['HOST']}, PORT={self.config['PORT']}, VHOST={self.config['VHOST']}")
+            except (AMQPConnectionError, StreamLostError, ConnectionClosedByBroker) as e:
+                logger.error(f"RabbitMQ连接失败 (第{attempt + 1}次): {str(e)}")
+                add_event('rabbitmq.connect_failed', attempt=attempt + 1, error=str(e))
+                logger.error(f"连接信息: HOST={self.config['HOST']}, PORT={self.config['PORT']}, VHOST={self.config['VHOST']}")
+                if attempt < max_retries - 1:
+                    logger.info(f"等待{retry_delay}秒后重试...")
+                    time.sleep(retry_delay)
+                else:
+                    logger.error("RabbitMQ连接失败，已达到最大重试次数")
                     return False
 
+            except Exception as e:
+                logger.error(f"未知连接错误: {str(e)}")
+                logger.error(f"连接信息: HOST={self.config['HOST']}, PORT={self.config['PORT']}, VHOST={self.config['VHOST']}")
+                return False
+
     def ensure_connection(self) -> bool:
         """确保连接有效"""
-        with self._lock:
-            if not self.connection or self.connection.is_closed:
-                logger.info("RabbitMQ连接已关闭，尝试重新连接...")
-                return self.connect()
-            return True
+        if not self.connection or self.connection.is_closed:
+            logger.info("RabbitMQ连接已关闭，尝试重新连接...")
+            return self.connect()
+        return True
 
     def ensure_channel(self) -> bool:
         """确保通道有效"""
-        with self._lock:
-            if not self.ensure_connection():
-                return False
+        if not self.ensure_connection():
+            return False
 
-            if not self.channel or self.channel.is_closed:
-                logger.info("RabbitMQ通道已关闭，尝试重新创建...")
-                try:
-                    self.channel = self.connection.channel()
-                    logger.info("RabbitMQ通道重新创建成功")
-                    return True
-                except Exception as e:
-                    logger.error(f"无法重新创建RabbitMQ通道: {str(e)}")
-                    return False
-            return True
+        if not self.channel or self.channel.is_closed:
+            logger.info("RabbitMQ通道已关闭，尝试重新创建...")
+            add_event('rabbitmq.channel_reopen')
+            try:
+                self.channel = self.connection.channel()
+                logger.info("RabbitMQ通道重新创建成功")
+                return True
+            except Exception as e:
+                logger.error(f"无法重新创建RabbitMQ通道: {str(e)}")
+                return False
+        return True
 
     def ensure_queue_exists(self, queue_name: str, queue_arguments: Optional[Dict] = None):
         """确保队列存在"""
         try:
-            with self._lock:
-                if not self.ensure_channel():
-                    raise ConnectionError("无法确保RabbitMQ通道有效")
-
-                if queue_arguments is None:
-                    # 根据队列名称获取默认配置
-                    queue_config = self.QUEUE_CONFIG.get(queue_name, {})
-                    if queue_config and 'dead_letter_exchange' in queue_config and 'dead_letter_routing_key' in queue_config:
-                        queue_arguments = {
-                            'x-dead-letter-exchange': queue_config['dead_letter_exchange'],
-                            'x-dead-letter-routing-key': queue_config['dead_letter_routing_key'],
-                            'durable': True
-                        }
-                    else:
-                        # 不设置死信参数
-                        queue_arguments = {
-                            'durable': True
-                        }
+            if not self.ensure_channel():
+                raise ConnectionError("无法确保RabbitMQ通道有效")
+
+            if queue_arguments is None:
+                # 根据队列名称获取默认配置
+                queue_config = self.QUEUE_CONFIG.get(queue_name, {})
+                if queue_config and 'dead_letter_exchange' in queue_config and 'dead_letter_routing_key' in queue_config:
+                    queue_arguments = {
+                        'x-dead-letter-exchange': queue_config['dead_letter_exchange'],
+                        'x-dead-letter-routing-key': queue_config['dead_letter_routing_key'],
+                        'durable': True
+                    }
                 else:
-                    # 确保durable属性为True
-                    queue_arguments['durable'] = True
-                    # 保留原有代码逻辑，不添加额外参数
-                    pass
+                    # 不设置死信参数
+                    queue_arguments = {
+                        'durable': True
+                    }
+            else:
+                # 确保durable属性为True
+                queue_arguments['durable'] = True
+                # 保留原有代码逻辑，不添加额外参数
+                pass
 
             self.channel.queue_declare(
                 queue=queue_name,
                 durable=True,
                 arguments=queue_arguments
             )
-            logger.info(f"队列 {queue_name} 声明成功")
+            logger.debug(f"队列 {queue_name} 声明成功")
 
         except ChannelClosedByBroker as e:
             logger.error(f"队列声明失败: {str(e)}")
@@ -204,6 +297,8 @@ class RabbitMQManager:
     def publish_message(self, queue_name: str, message: Dict[str, Any], retry_count: int = 0) -> bool:
         """发布消息到队列，带可靠确认机制和重试逻辑
 
+        每次尝试记录为一个追踪span（重试在上一次尝试的span之下），重连、重试原因记录为span事件
+
         Args:
             queue_name: 队列名称
             message: 要推送的消息字典
@@ -212,21 +307,34 @@ class RabbitMQManager:
         Returns:
             bool: 推送是否成功
         """
+        with start_span('rabbitmq.publish_message', queue=queue_name, attempt=retry_count) as span:
+            success = self._publish_message(queue_name, message, retry_count)
+            if span is not None:
+                span.set('success', success)
+                if not success:
+                    span.record_error('发布失败')
+            return success
+
+    def _publish_message(self, queue_name: str, message: Dict[str, Any], retry_count: int) -> bool:
         try:
-            with self._lock:
-                if not self.ensure_channel():
+            with self.borrow() as slot:
+                with stage('connect'):
+                    channel_ok = self.ensure_channel()
+                if not channel_ok:
                     logger.error("无法确保RabbitMQ通道有效")
                     return False
 
                 # 确保队列存在
-                logger.info(f"确保队列 {queue_name} 存在...")
+                logger.debug(f"确保队列 {queue_name} 存在...")
                 try:
-                    self.ensure_queue_exists(queue_name)
+                    with stage('declare'):
+                        self.ensure_queue_exists(queue_name)
                 except Exception as e:
                     logger.error(f"确保队列存在失败: {str(e)}")
                     if retry_count < self.config.get('MAX_RETRIES', 3):
                         logger.info(f"尝试重新连接并重试 (第{retry_count + 1}次)...")
-                        self.connection = None  # 强制重新连接
+                        add_event('retry', reason='declare_failed', error=str(e))
+                        self._discard_slot(slot)  # 关闭旧连接，强制重新连接
                         time.sleep(self.config.get('RETRY_DELAY', 2))
                         return self.publish_message(queue_name, message, retry_count + 1)
                     return False
@@ -234,7 +342,7 @@ class RabbitMQManager:
                 try:
                     # 启用发布确认
                     self.channel.confirm_delivery()
-                    logger.info(f"已启用发布确认模式")
+                    logger.debug(f"已启用发布确认模式")
                 except Exception as e:
                     # 如果是确认模式已经启用的错误，记录警告但继续执行
                     if "confirmation was already enabled" in str(e):
@@ -244,29 +352,33 @@ class RabbitMQManager:
                         return False
 
                 # 发布消息
-                logger.info(f"准备发布消息到队列: {queue_name}")
-                message_body = json.dumps(message, ensure_ascii=False)
+                logger.debug(f"准备发布消息到队列: {queue_name}")
+                with stage('encode'):
+                    message_body = json.dumps(message, ensure_ascii=False)
                 start_time = time.time()
                 confirmed = False
                 publish_timeout = self.config.get('PUBLISH_TIMEOUT', 5)
 
                 try:
-                    self.channel.basic_publish(
-                        exchange='',
-                        routing_key=queue_name,
-                        body=message_body,
-                        properties=pika.BasicProperties(
-                            delivery_mode=2,  # 消息持久化
-                            content_type='application/json'
-                        ),
-                        mandatory=True  # 确保消息被路由到队列，否则返回
-                    )
-                    logger.info(f"basic_publish调用完成，消息长度: {len(message_body)}字节")
+                    with stage('publish'):
+                        self.channel.basic_publish(
+                            exchange='',
+                            routing_key=queue_name,
+                            body=message_body,
+                            properties=pika.BasicProperties(
+                                delivery_mode=2,  # 消息持久化
+                                content_type='application/json',
+                                headers=inject()  # 追踪上下文（traceparent），消费方可延续追踪
+                            ),
+                            mandatory=True  # 确保消息被路由到队列，否则返回
+                        )
+                    logger.debug(f"basic_publish调用完成，消息长度: {len(message_body)}字节")
                 except UnroutableError as e:
                     logger.error(f"消息无法路由到队列 {queue_name}: {str(e)}")
                     # 尝试重新声明队列并重试
                     if retry_count < self.config.get('MAX_RETRIES', 3):
                         logger.info(f"尝试重新声明队列并重试 (第{retry_count + 1}次)...")
+                        add_event('retry', reason='unroutable', error=str(e))
                         time.sleep(self.config.get('RETRY_DELAY', 2))
                         return self.publish_message(queue_name, message, retry_count + 1)
                     return False
@@ -275,33 +387,35 @@ class RabbitMQManager:
                     # 尝试重新连接并重试
                     if retry_count < self.config.get('MAX_RETRIES', 3):
                         logger.info(f"尝试重新连接并重试 (第{retry_count + 1}次)...")
-                        self.connection = None  # 强制重新连接
+                        add_event('retry', reason='publish_error', error=str(e))
+                        self._discard_slot(slot)  # 关闭旧连接，强制重新连接
                         time.sleep(self.config.get('RETRY_DELAY', 2))
                         return self.publish_message(queue_name, message, retry_count + 1)
                     return False
 
                 # 等待确认，最多等待publish_timeout秒
-                while time.time() - start_time < publish_timeout:
-                    try:
-                        # 处理网络事件，检查是否有确认消息
-                        self.connection.process_data_events(time_limit=0.1)
-                        # 对于pika 1.3.2，我们无法直接检查单个消息的确认状态
-                        # 但如果连接仍然活跃，我们假设消息已被确认
-                        if self.connection and not self.connection.is_closed:
-                            confirmed = True
+                with stage('confirm'):
+                    while time.time() - start_time < publish_timeout:
+                        try:
+                            # 处理网络事件，检查是否有确认消息
+                            self.connection.process_data_events(time_limit=0.1)
+                            # 对于pika 1.3.2，我们无法直接检查单个消息的确认状态
+                            # 但如果连接仍然活跃，我们假设消息已被确认
+                            if self.connection and not self.connection.is_closed:
+                                confirmed = True
+                                break
+                        except Exception as e:
+                            logger.error(f"处理数据事件异常: {str(e)}")
                             break
-                    except Exception as e:
-                        logger.error(f"处理数据事件异常: {str(e)}")
-                        break
 
                 if not confirmed:
                     logger.error(f"消息发布到队列 {queue_name} 未确认，超时: {publish_timeout}秒")
                     # 关闭连接，强制下次重新连接
-                    if self.connection and not self.connection.is_closed:
-                        self.connection.close()
+                    self._discard_slot(slot)
                     # 尝试重试
                     if retry_count < self.config.get('MAX_RETRIES', 3):
                         logger.info(f"消息未确认，尝试重试 (第{retry_count + 1}次)...")
+                        add_event('retry', reason='confirm_timeout', timeout=publish_timeout)
                         time.sleep(self.config.get('RETRY_DELAY', 2))
                         return self.publish_message(queue_name, message, retry_count + 1)
                     return False
@@ -315,74 +429,195 @@ class RabbitMQManager:
             # 尝试重试
             if retry_count < self.config.get('MAX_RETRIES', 3):
                 logger.info(f"异常，尝试重试 (第{retry_count + 1}次)...")
+                add_event('retry', reason='exception', error=str(e))
                 time.sleep(self.config.get('RETRY_DELAY', 2))
                 return self.publish_message(queue_name, message, retry_count + 1)
             return False
 
-    def close(self):
-        """关闭连接"""
-        try:
-            with self._lock:
-                if self.channel and not self.channel.is_closed:
-                    self.channel.close()
-                    logger.info("RabbitMQ通道已关闭")
-                if self.connection and not self.connection.is_closed:
-                    self.connection.close()
-                    logger.info("RabbitMQ连接已关闭")
-        except Exception as e:
-            logger.error(f"关闭连接时出错: {str(e)}")
+    def publish_batch(self, queue_name: str, messages: List[Dict[str, Any]], retry_count: int = 0) -> bool:
+        """在一个AMQP事务中发布一批消息：逐条写出不等待确认，tx_commit一次往返确认整批
+
+        确认模式下pika每条消息都要等待broker确认，批量提交改用事务通道；整批要么全部入队，要么全部失败（可整批重试）
+        """
+        with start_span('rabbitmq.publish_batch', queue=queue_name, count=len(messages), attempt=retry_count) as span:
+            success = self._publish_batch(queue_name, messages, retry_count)
+            if span is not None:
+                span.set('success', success)
+                if not success:
+                    span.record_error('批量发布失败')
+            return success
+
+    def _publish_batch(self, queue_name: str, messages: List[Dict[str, Any]], retry_count: int) -> bool:
+        with self.borrow() as slot:
+            try:
+                with stage('connect'):
+                    channel_ok = self.ensure_channel()
+                if not channel_ok:
+                    logger.error("无法确保RabbitMQ通道有效")
+                    return False
+                with stage('declare'):
+                    self.ensure_queue_exists(queue_name)
+                    if slot.tx_channel is None or slot.tx_channel.is_closed:
+                        slot.tx_channel = self.connection.channel()
+                        slot.tx_channel.tx_select()
+                with stage('encode'):
+                    bodies = [json.dumps(message, ensure_ascii=False) for message in messages]
+                with stage('publish'):
+                    properties = pika.BasicProperties(delivery_mode=2, content_type='application/json', headers=inject())
+                    for body in bodies:
+                        slot.tx_channel.basic_publish(exchange='', routing_key=queue_name, body=body, properties=properties)
+                with stage('confirm'):
+                    slot.tx_channel.tx_commit()
+                logger.info(f"批量发布已提交到队列 {queue_name}: {len(messages)}条")
+                return True
+            except Exception as e:
+                logger.error(f"批量发布失败: queue={queue_name}, 条数={len(messages)}, 错误: {str(e)}")
+                # 未提交的事务不会入队：关闭事务通道，重新连接后整批重试（重试时复用同一个槽位）
+                self._close_quietly(slot.tx_channel)
+                slot.tx_channel = None
+                if retry_count < self.config.get('MAX_RETRIES', 3):
+                    logger.info(f"批量发布重试 (第{retry_count + 1}次)...")
+                    add_event('retry', reason='batch_failed', error=str(e))
+                    self._discard_slot(slot)  # 关闭旧连接，强制重新连接
+                    time.sleep(self.config.get('RETRY_DELAY', 2))
+                    return self.publish_batch(queue_name, messages, retry_count + 1)
+                return False
+
+    def close(self, timeout: float = 0):
+        """关闭连接池中的全部连接；timeout>0时先等待借出的槽位归还（正在进行的发布完成）"""
+        self._closed = True
+        deadline = time.time() + timeout
+        while self._pool.qsize() < len(self._slots) and time.time() < deadline:
+            time.sleep(0.05)
+        with self._lock:
+            slots = list(self._slots)
+        for slot in slots:
+            self._discard_slot(slot)
+        if slots:
+            logger.info(f"RabbitMQ连接已关闭: {len(slots)}个")
 
 
 # 全局RabbitMQ管理器实例
 _rabbitmq_manager = None
+_rabbitmq_manager_pid = None
+_rabbitmq_manager_lock = threading.Lock()
 
 
 def get_rabbitmq_manager() -> RabbitMQManager:
-    """获取RabbitMQ管理器实例（单例模式）"""
-    global _rabbitmq_manager
-    if _rabbitmq_manager is None:
-        # 从环境变量加载配置
-        config = RabbitMQConfig().to_dict()
-        _rabbitmq_manager = RabbitMQManager(config)
-        _rabbitmq_manager.initialize()
+    """获取RabbitMQ管理器实例（单例模式，fork后的子进程重新创建，不复用父进程的连接）"""
+    global _rabbitmq_manager, _rabbitmq_manager_pid
+    if _rabbitmq_manager is None or _rabbitmq_manager_pid != os.getpid():
+        with _rabbitmq_manager_lock:
+            if _rabbitmq_manager is None or _rabbitmq_manager_pid != os.getpid():
+                # 从环境变量加载配置
+                config = RabbitMQConfig().to_dict()
+                manager = RabbitMQManager(config)
+                manager.initialize()
+                _rabbitmq_manager, _rabbitmq_manager_pid = manager, os.getpid()
     return _rabbitmq_manager
 
 
-def push_message(queue_name: str, message: Dict[str, Any]) -> bool:
+def reset_after_fork():
+    """丢弃从父进程继承的管理器（不关闭：连接socket仍属于父进程），供gunicorn post_fork调用"""
+    global _rabbitmq_manager, _rabbitmq_manager_pid
+    _rabbitmq_manager, _rabbitmq_manager_pid = None, None
+
+
+def push_message(queue_name: str, message: Dict[str, Any], validation: Optional[str] = None) -> bool:
     """
     推送消息到指定队列
 
     Args:
         queue_name: 队列名称
         message: 要推送的消息字典
+        validation: 输出结构校验模式 strict / warn / off，默认取配置OUTPUT_SCHEMA_MODE
 
     Returns:
         bool: 推送是否成功
+
+    Raises:
+        OutputValidationError: strict模式下报文不符合队列的输出结构（不推送）
     """
-    # 输出最终推送给RabbitMQ的JSON数据到终端
-    print("\n=== 推送给RabbitMQ的JSON数据 ===")
-    print(json.dumps(message, ensure_ascii=False, indent=2))
-    print("================================\n")
+    with start_span('push_message', queue=queue_name) as span:
+        with stage('validate'):
+            check_output(queue_name, message, validation)
+
+        # 报文在DEBUG级别记录，序列化与截断在日志线程中完成
+        logger.debug("推送给RabbitMQ的JSON数据: queue=%s, 报文=%s", queue_name, payload(message))
+
+        manager = get_rabbitmq_manager()
+        try:
+            # 记录消息推送开始时间
+            start_time = time.time()
+            success = manager.publish_message(queue_name, message)
+            # 记录消息推送耗时
+            elapsed_time = time.time() - start_time
+            logger.info(f"消息推送耗时: {elapsed_time:.2f}秒，结果: {'成功' if success else '失败'}")
+            with stage('record'):
+                record_push(queue_name, message, success, elapsed_time)
+
+            return success
+        except Exception as e:
+            logger.error(f"推送消息失败: {str(e)}")
+            if span is not None:
+                span.record_error(e)
+            return False
+
 
-    manager = get_rabbitmq_manager()
+def push_batch(queue_name: str, messages: List[Dict[str, Any]], validation: Optional[str] = None) -> bool:
+    """在一个事务中推送一批消息到同一队列，返回整批是否成功
+
+    validation同push_message：strict模式下任一报文不合格时抛出OutputValidationError，整批不推送
+    """
+    with start_span('push_batch', queue=queue_name, count=len(messages)) as span:
+        with stage('validate'):
+            for message in messages:
+                check_output(queue_name, message, validation)
+        if not messages:
+            return True
+
+        manager = get_rabbitmq_manager()
+        try:
+            start_time = time.time()
+            success = manager.publish_batch(queue_name, messages)
+            elapsed_time = time.time() - start_time
+            logger.info(f"批量推送耗时: {elapsed_time:.2f}秒，{len(messages)}条，结果: {'成功' if success else '失败'}")
+            # 推送历史与指标按条记录，耗时按整批平均分摊
+            with stage('record'):
+                for message in messages:
+                    record_push(queue_name, message, success, elapsed_time / len(messages))
+            return success
+        except Exception as e:
+            logger.error(f"批量推送消息失败: {str(e)}")
+            if span is not None:
+                span.record_error(e)
+            return False
+
+
+def record_push(queue_name: str, message: Dict[str, Any], success: bool, elapsed_time: float):
+    """写入仪表盘推送历史和队列指标，失败不影响推送结果"""
     try:
-        # 记录消息推送开始时间
-        start_time = time.time()
-        success = manager.publish_message(queue_name, message)
-        # 记录消息推送耗时
-        elapsed_time = time.time() - start_time
-        logger.info(f"消息推送耗时: {elapsed_time:.2f}秒，结果: {'成功' if success else '失败'}")
-
-        return success
+        from app.utils.dashboard_data import get_dashboard_data_manager
+        from app.utils.metrics import get_queue_metrics
+        elapsed_ms = round(elapsed_time * 1000, 1)
+        get_queue_metrics().record(queue_name, success, elapsed_ms)
+        get_dashboard_data_manager().log_rabbitmq_request(queue_name, message, success, elapsed_ms)
     except Exception as e:
-        logger.error(f"推送消息失败: {str(e)}")
-        return False
+        logger.error(f"记录推送历史失败: {str(e)}")
+
+
+def connection_state() -> str:
+    """当前进程的RabbitMQ连接状态：idle（尚未使用）/ connected / disconnected"""
+    manager = _rabbitmq_manager
+    if manager is None or _rabbitmq_manager_pid != os.getpid() or not manager._slots:
+        return 'idle'
+    return 'connected' if manager.pool_stats()['open'] else 'disconnected'
 
 
-def close_rabbitmq_connection():
-    """关闭RabbitMQ连接（应用关闭时调用）"""
+def close_rabbitmq_connection(timeout: float = 0):
+    """关闭RabbitMQ连接（应用关闭时调用），timeout为等待进行中发布完成的秒数"""
     global _rabbitmq_manager
-    if _rabbitmq_manager:
-        _rabbitmq_manager.close()
+    if _rabbitmq_manager and _rabbitmq_manager_pid == os.getpid():
+        _rabbitmq_manager.close(timeout)
         _rabbitmq_manager = None
         logger.info("RabbitMQ管理器已重置")
\ No newline at end of file
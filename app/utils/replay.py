@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/15 15:00
+# file: replay.py
+# 数据集导出与回放模块：生成结果写入压缩NDJSON文件，按速率或原始节奏重放到队列
+import os
+import re
+import gzip
+import json
+import mmap
+import time
+import uuid
+import tempfile
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl  # 类Unix系统：flock文件锁，保证同一数据集同时只有一个回放（跨worker）
+except ImportError:  # pragma: no cover - Windows开发环境
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+from app.utils.jobs import JobStore
+
+logger = logging.getLogger(__name__)
+
+# 数据集文件名只允许字母数字、下划线、中划线和点，防止路径穿越
+DATASET_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_\-.]+\.ndjson(\.gz)?$')
+# 每回放多少条写一次断点
+CHECKPOINT_EVERY = 100
+# 运行中的任务每隔多少秒写一次进度并检查停止标记
+PROGRESS_INTERVAL = 1.0
+# 运行中的任务超过该秒数没有写进度，视为所在worker已退出
+STALE_AFTER = 30
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+def dataset_path(dataset_dir: str, name: str) -> str:
+    """校验数据集文件名并返回完整路径"""
+    if not DATASET_NAME_PATTERN.match(name or ''):
+        raise ValueError(f'数据集文件名不合法（需以.ndjson或.ndjson.gz结尾）: {name}')
+    return os.path.join(dataset_dir, name)
+
+
+def list_datasets(dataset_dir: str) -> list:
+    """列出数据集目录下的文件及其头信息"""
+    if not os.path.isdir(dataset_dir):
+        return []
+    datasets = []
+    for name in sorted(os.listdir(dataset_dir)):
+        if not DATASET_NAME_PATTERN.match(name):
+            continue
+        path = os.path.join(dataset_dir, name)
+        datasets.append({
+            'name': name,
+            'size': os.path.getsize(path),
+            'modified': datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d %H:%M:%S'),
+            'meta': read_meta(path),
+            'checkpoint': read_checkpoint(path)
+        })
+    return datasets
+
+
+# ==================== 导出 ====================
+def export_dataset(path: str, messages: Iterable[Tuple[int, str, Dict[str, Any]]],
+                   meta: Optional[Dict[str, Any]] = None, interval_ms: int = 1000) -> Dict[str, Any]:
+    """将 (序号, 队列名, 消息) 写入NDJSON文件，.gz结尾时gzip压缩
+
+    首行为 {"meta": {...}}，其后每行 {"i": 序号, "q": 队列名, "t": 相对毫秒, "d": 消息}；
+    t = (序号 - 首条序号) * interval_ms，与种子模式的消息时间一致，回放时按speed倍数还原该节奏
+    先写临时文件再原子替换，生成中途失败不会留下半个数据集
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    opener = gzip.open if path.endswith('.gz') else open
+    count = 0
+    raw_bytes = 0
+    first_index = None
+    started = time.time()
+    try:
+        with opener(tmp_path, 'wb') as f:
+            header = {'meta': dict(meta or {}, created=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))}
+            f.write((json.dumps(header, ensure_ascii=False) + '\n').encode('utf-8'))
+            for index, queue_name, message in messages:
+                if first_index is None:
+                    first_index = index
+                line = json.dumps({'i': index, 'q': queue_name, 't': (index - first_index) * interval_ms, 'd': message},
+                                  ensure_ascii=False).encode('utf-8') + b'\n'
+                f.write(line)
+                raw_bytes += len(line)
+                count += 1
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    # 新数据集覆盖旧文件时，旧断点已失效
+    clear_checkpoint(path)
+
+    elapsed = time.time() - started
+    logger.info(f"数据集导出完成: {path}, 条数={count}, 原始大小={raw_bytes}字节, 耗时={elapsed:.2f}秒")
+    return {
+        'count': count,
+        'raw_bytes': raw_bytes,
+        'file_bytes': os.path.getsize(path),
+        'elapsed': round(elapsed, 3)
+    }
+
+
+# ==================== 读取 ====================
+def _open_dataset(path: str):
+    """打开数据集：普通文件使用mmap，gzip文件流式解压"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    f = open(path, 'rb')
+    if os.path.getsize(path) == 0:
+        return f
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+    return mapped
+
+
+def read_meta(path: str) -> Dict[str, Any]:
+    """读取数据集首行的头信息"""
+    try:
+        handle = _open_dataset(path)
+        try:
+            first = json.loads(handle.readline() or b'{}')
+        finally:
+            handle.close()
+        return first.get('meta', {}) if isinstance(first, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def iter_dataset(path: str, offset: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """从offset（未压缩字节偏移）开始逐行读取，返回 (下一行偏移, 记录)
+
+    offset为0时跳过头信息；gzip文件的seek需要解压到目标位置，但不必重新生成和解析前面的消息
+    """
+    handle = _open_dataset(path)
+    try:
+        if offset:
+            handle.seek(offset)
+        position = offset
+        while True:
+            line = handle.readline()
+            if not line:
+                break
+            position += len(line)
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'meta' in record:
+                continue
+            yield position, record
+    finally:
+        handle.close()
+
+
+# ==================== 断点 ====================
+def _checkpoint_path(path: str) -> str:
+    return f'{path}.checkpoint'
+
+
+def read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_checkpoint_path(path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_checkpoint(path: str, offset: int, sent: int):
+    tmp_path = f'{_checkpoint_path(path)}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'offset': offset, 'sent': sent,
+                   'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, f)
+    os.replace(tmp_path, _checkpoint_path(path))
+
+
+def clear_checkpoint(path: str):
+    try:
+        os.remove(_checkpoint_path(path))
+    except OSError:
+        pass
+
+
+# ==================== 数据集锁 ====================
+def lock_dataset(path: str):
+    """独占锁定数据集（<数据集>.lock），返回持有锁的文件句柄；已被其他任务（可能在其他worker中）占用时返回None
+
+    使用系统文件锁而不是锁文件是否存在，进程异常退出时锁自动释放，不会留下需要手工删除的锁
+    """
+    if fcntl is None and msvcrt is None:
+        raise RuntimeError('当前平台不支持文件锁，无法保证同一数据集只有一个回放任务')
+    handle = open(f'{path}.lock', 'a+')
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+# ==================== 回放 ====================
+class ReplayJob:
+    """后台回放任务
+
+    节奏控制：rate为固定每秒条数；speed为原始节奏（记录中的t）的倍数；都不传则尽快发送。
+    已到发送时间的连续同队列记录合并为一批（最多batch_size条）经push_batch在一个事务中发布，
+    尽快发送时每批都是满批；每CHECKPOINT_EVERY条把已完成的字节偏移写入断点文件，中断后可从断点续放。
+    进度每PROGRESS_INTERVAL秒写入任务存储，任意worker都能查询和停止。
+
+    publish(queue_name, messages) 返回与messages等长的标记列表（False为被校验拒绝、跳过的报文），整批推送失败时抛出异常；
+    推送失败时任务以error结束，偏移和断点停在该批之前，续放会重新发送这一批
+    """
+
+    def __init__(self, path: str, publish, offset: int = 0, rate: Optional[float] = None,
+                 speed: Optional[float] = None, limit: Optional[int] = None, batch_size: int = 100):
+        if rate is not None and rate <= 0:
+            raise ValueError('rate必须大于0')
+        if speed is not None and speed <= 0:
+            raise ValueError('speed必须大于0')
+        if batch_size < 1:
+            raise ValueError('batch_size必须大于0')
+        self.job_id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.publish = publish
+        self.start_offset = offset
+        self.offset = offset
+        self.rate = rate
+        self.speed = speed
+        self.limit = limit
+        self.batch_size = batch_size
+        self.sent = 0
+        self.failed = 0
+        self.failed_indexes = []
+        self.status = 'pending'
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_handle = None
+        self._last_progress = 0.0
+
+    def start(self, lock_handle=None):
+        """启动后台线程；lock_handle为数据集锁，任务结束时释放"""
+        self._lock_handle = lock_handle
+        self._save()
+        self._thread = threading.Thread(target=self._run, name=f'replay-{self.job_id}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _save(self):
+        state = self.to_dict()
+        try:
+            get_replay_store().update(state.pop('job_id'), **state)
+        except OSError as e:
+            logger.error(f"写入回放进度失败: job_id={self.job_id}, 错误: {str(e)}")
+
+    def _heartbeat(self):
+        """每PROGRESS_INTERVAL秒写一次进度，并检查其他worker写入的停止标记"""
+        now = time.time()
+        if now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        if os.path.exists(_stop_marker(self.job_id)):
+            self._stop.set()
+        self._save()
+
+    def _wait_until(self, target: float) -> bool:
+        """等待到目标时间，期间收到停止信号时返回False"""
+        while True:
+            delay = target - time.time()
+            if delay <= 0:
+                return not self._stop.is_set()
+            if self._stop.wait(min(delay, PROGRESS_INTERVAL)):
+                return False
+            self._heartbeat()
+
+    def _record_failure(self, record: Dict[str, Any]):
+        self.failed += 1
+        if len(self.failed_indexes) < 1000:
+            self.failed_indexes.append(record.get('i'))
+
+    def _flush(self, queue_name: str, batch: List[Dict[str, Any]], next_offset: int):
+        """发布一批并推进偏移，跨过CHECKPOINT_EVERY整数倍时写断点；推送失败时不推进偏移，异常交给_run处理"""
+        before = self.sent + self.failed
+        try:
+            results = self.publish(queue_name, [record['d'] for record in batch])
+        except Exception:
+            for record in batch:
+                self._record_failure(record)
+            raise
+        for record, ok in zip(batch, results):
+            if ok:
+                self.sent += 1
+            else:
+                self._record_failure(record)
+        self.offset = next_offset
+        if (self.sent + self.failed) // CHECKPOINT_EVERY != before // CHECKPOINT_EVERY:
+            write_checkpoint(self.path, self.offset, self.sent)
+        self._heartbeat()
+
+    def _run(self):
+        self.status = 'running'
+        self.started = time.time()
+        self._save()
+        base_t = None
+        batch: List[Dict[str, Any]] = []
+        batch_queue = None
+        batch_offset = self.offset
+        try:
+            for next_offset, record in iter_dataset(self.path, self.offset):
+                queued = self.sent + self.failed + len(batch)
+                if self.limit is not None and queued >= self.limit:
+                    break
+                if self.rate:
+                    target = self.started + queued / self.rate
+                elif self.speed:
+                    if base_t is None:
+                        base_t = record.get('t', 0)
+                    target = self.started + (record.get('t', 0) - base_t) / 1000.0 / self.speed
+                else:
+                    target = 0
+
+                # 当前记录还没到发送时间、换了队列或批已满时，先发出已攒的批
+                if batch and (target > time.time() or record['q'] != batch_queue or len(batch) >= self.batch_size):
+                    self._flush(batch_queue, batch, batch_offset)
+                    batch = []
+                if not self._wait_until(target):
+                    break
+                batch.append(record)
+                batch_queue = record['q']
+                batch_offset = next_offset
+
+            if batch and not self._stop.is_set():
+                self._flush(batch_queue, batch, batch_offset)
+
+            if self._stop.is_set():
+                self.status = 'stopped'
+                write_checkpoint(self.path, self.offset, self.sent)
+            else:
+                self.status = 'finished'
+                # 只有完整放完且没有失败时才清除断点
+                if self.failed or (self.limit is not None and self.sent + self.failed >= self.limit):
+                    write_checkpoint(self.path, self.offset, self.sent)
+                else:
+                    clear_checkpoint(self.path)
+        except Exception as e:
+            # self.offset仍是失败批次之前的位置
+            self.status = 'error'
+            self.error = str(e)
+            write_checkpoint(self.path, self.offset, self.sent)
+            logger.error(f"数据集回放异常: {self.path}, offset={self.offset}, 错误: {str(e)}")
+        finally:
+            self.finished = time.time()
+            self._save()
+            with _replay_jobs_lock:
+                _replay_jobs.pop(self.job_id, None)
+            if self._lock_handle is not None:
+                self._lock_handle.close()
+                self._lock_handle = None
+            try:
+                os.remove(_stop_marker(self.job_id))
+            except OSError:
+                pass
+            logger.info(f"数据集回放结束: {self.path}, 状态={self.status}, 成功={self.sent}, 失败={self.failed}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished or time.time()
+        elapsed = end - self.started if self.started else 0
+        done = self.sent + self.failed
+        return {
+            'job_id': self.job_id,
+            'kind': 'replay',
+            'pid': os.getpid(),
+            'heartbeat': time.time(),
+            'dataset': os.path.basename(self.path),
+            'status': self.status,
+            'error': self.error,
+            'rate': self.rate,
+            'speed': self.speed,
+            'limit': self.limit,
+            'batch_size': self.batch_size,
+            'start_offset': self.start_offset,
+            'offset': self.offset,
+            'sent': self.sent,
+            'failed': self.failed,
+            'failed_indexes': self.failed_indexes,
+            'elapsed': round(elapsed, 3),
+            'messages_per_second': round(done / elapsed, 1) if elapsed > 0 else None
+        }
+
+
+# ==================== 任务存储 ====================
+# 回放任务状态与任务模块相同，每个任务一个JSON文件（多worker共享）；本进程运行中的任务另存一份引用用于停止
+_replay_store = None
+_replay_jobs: Dict[str, ReplayJob] = {}
+_replay_jobs_lock = threading.Lock()
+
+
+def get_replay_store() -> JobStore:
+    """获取回放任务存储（单例模式）"""
+    global _replay_store
+    if _replay_store is None:
+        with _replay_jobs_lock:
+            if _replay_store is None:
+                from config import config
+                _replay_store = JobStore(config.REPLAY_STATE_DIR or os.path.join(tempfile.gettempdir(), 'toms_replay'),
+                                         config.JOB_RESULT_TTL, config.JOB_CLEANUP_INTERVAL)
+    return _replay_store
+
+
+def _stop_marker(job_id: str) -> str:
+    return os.path.join(get_replay_store().state_dir, f'{job_id}.stop')
+
+
+def _from_store(job: Dict[str, Any]) -> Dict[str, Any]:
+    """任务文件转为与ReplayJob.to_dict一致的格式；运行中的任务超过STALE_AFTER秒没有进度时标记为lost
+    （所在worker已退出，可用resume从断点续放）
+    """
+    job = dict(job, job_id=job['jobId'])
+    if job.get('status') in ACTIVE_STATUSES and time.time() - job.get('heartbeat', 0) > STALE_AFTER:
+        job['status'] = 'lost'
+    return job
+
+
+def start_replay(path: str, publish, offset: int = 0, rate: Optional[float] = None,
+                 speed: Optional[float] = None, limit: Optional[int] = None, batch_size: int = 100) -> ReplayJob:
+    """启动回放任务；同一数据集同时只允许一个运行中的任务（跨worker的文件锁），避免断点互相覆盖"""
+    job = ReplayJob(path, publish, offset, rate, speed, limit, batch_size)
+    handle = lock_dataset(path)
+    if handle is None:
+        running = [item['job_id'] for item in list_replay_jobs()
+                   if item.get('dataset') == os.path.basename(path) and item['status'] in ACTIVE_STATUSES]
+        raise ValueError(f'数据集正在回放中: {os.path.basename(path)}'
+                         + (f' (job_id={running[0]})' if running else ''))
+    get_replay_store().cleanup()
+    with _replay_jobs_lock:
+        _replay_jobs[job.job_id] = job
+    job.start(handle)
+    logger.info(f"数据集回放开始: {path}, job_id={job.job_id}, offset={offset}, rate={rate}, speed={speed}")
+    return job
+
+
+def get_replay_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """查询回放任务（任意worker启动的）"""
+    job = _replay_jobs.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    stored = get_replay_store().get(job_id)
+    return _from_store(stored) if stored else None
+
+
+def stop_replay(job_id: str, timeout: float = 5) -> Optional[Dict[str, Any]]:
+    """停止回放：本进程的任务直接通知，其他worker的任务写停止标记，由其在下一次进度检查时停止；
+    等待最多timeout秒后返回任务状态，任务不存在时返回None
+    """
+    job = _replay_jobs.get(job_id)
+    if job is not None:
+        job.stop()
+        job.join(timeout)
+        return job.to_dict()
+    stored = get_replay_job(job_id)
+    if stored is None or stored['status'] not in ACTIVE_STATUSES:
+        return stored
+    with open(_stop_marker(job_id), 'w', encoding='utf-8'):
+        pass
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(0.2)
+        stored = get_replay_job(job_id)
+        if stored is None or stored['status'] not in ACTIVE_STATUSES:
+            break
+    return stored
+
+
+def list_replay_jobs() -> list:
+    """全部worker的回放任务，新的在前（结束超过JOB_RESULT_TTL的任务会被清理）"""
+    jobs = [_from_store(job) for job in get_replay_store().list_jobs()]
+    return sorted(jobs, key=lambda job: job.get('updated', ''), reverse=True)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/22 15:00
+# file: schema.py
+# 声明式报文输入结构：按消息类型描述基础字段与明细行（类型、范围、默认值），注册时编译为解析/校验函数
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import request, jsonify
+
+from app.utils.timing import stage
+
+MISSING_VALUES = (None, '')
+# 校验函数对缺失的必填字段返回该错误，由调用方按字段逐条生成"缺少必填字段"信息
+REQUIRED = '缺少必填字段'
+
+
+class ValidationError(ValueError):
+    """输入校验失败，errors为全部错误 [{'field', 'row', 'message'}, ...]（一次返回，不逐个报错）
+
+    - field: 出错的字段名（字符串，每个缺失字段一条）；错误不针对具体字段（如请求或明细行不是对象）时为None
+    - row: 明细行序号（从1开始），基础字段的错误为None
+    """
+
+    MAX_MESSAGES = 5
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        self.errors = errors
+        messages = [error['message'] for error in errors[:self.MAX_MESSAGES]]
+        if len(errors) > self.MAX_MESSAGES:
+            messages.append(f'等共{len(errors)}项错误')
+        super().__init__('；'.join(messages))
+
+
+class Field:
+    """一个输入字段
+
+    - type: str / int / float，int、float校验数值格式与min/max范围
+    - convert=False 只校验格式，输出保留原始值（报文中该字段原本就是字符串时使用）
+    - path: JSON中的点路径（如 callbackResponse.entryOrder.entryOrderCode），默认与name相同
+    - 非必填字段缺失时取default
+    """
+
+    __slots__ = ('name', 'type', 'required', 'default', 'min', 'max', 'max_length', 'choices', 'convert', 'path')
+
+    TYPES = {'str': str, 'int': int, 'float': float}
+
+    def __init__(self, name: str, type: str = 'str', required: bool = True, default: Any = None,
+                 min: Optional[float] = None, max: Optional[float] = None, max_length: Optional[int] = None,
+                 choices: Optional[Sequence[Any]] = None, convert: bool = True, path: Optional[str] = None):
+        if type not in self.TYPES:
+            raise ValueError(f'不支持的字段类型: {type}')
+        self.name = name
+        self.type = type
+        self.required = required
+        self.default = default
+        self.min = min
+        self.max = max
+        self.max_length = max_length
+        self.choices = tuple(choices) if choices else None
+        self.convert = convert
+        self.path = path or name
+
+    def compile(self) -> Callable[[Any], Tuple[Any, Optional[str]]]:
+        """编译为 check(value) -> (输出值, 错误信息)，必填字段缺失时错误为REQUIRED"""
+        name, required, default = self.name, self.required, self.default
+        cast = self.TYPES[self.type]
+        numeric = self.type != 'str'
+        low, high, max_length, choices, convert = self.min, self.max, self.max_length, self.choices, self.convert
+        type_label = '整数' if self.type == 'int' else '数字'
+
+        def check(value):
+            if value in MISSING_VALUES:
+                return (None, REQUIRED) if required else (default, None)
+            if numeric:
+                if isinstance(value, bool):
+                    return None, f'{name}必须为{type_label}'
+                try:
+                    number = cast(value)
+                except (TypeError, ValueError):
+                    return None, f'{name}必须为{type_label}'
+                if low is not None and number < low:
+                    return None, f'{name}不能小于{low}'
+                if high is not None and number > high:
+                    return None, f'{name}不能大于{high}'
+                return (number if convert else value), None
+            if not isinstance(value, str):
+                value = str(value)
+            if max_length is not None and len(value) > max_length:
+                return None, f'{name}长度不能超过{max_length}个字符'
+            if choices is not None and value not in choices:
+                return None, f'{name}取值必须为: {", ".join(map(str, choices))}'
+            return value, None
+
+        return check
+
+
+def get_path(data: Any, path: str) -> Any:
+    """按点路径取值，路径不存在时返回None"""
+    for key in path.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+class MessageSchema:
+    """一种消息类型的输入结构：基础字段 + 明细行
+
+    明细行的来源（按顺序取第一个可用的）：
+    - detail_path: JSON中的明细数组路径（如 callbackResponse.orderLines）
+    - JSON请求体中的 details 数组
+    - row_key: 每行一个对象，如 detail_{i}，行数由detail_count给出
+    - 表单平铺字段：itemCode0、actualQty0……，行数由detail_count给出，序号从detail_base开始（0或1）
+    """
+
+    def __init__(self, name: str, fields: Iterable[Field] = (), details: Iterable[Field] = (), detail_base: int = 0,
+                 detail_path: Optional[str] = None, row_key: Optional[str] = None,
+                 min_details: int = 1, max_details: int = 1000, default_detail_count: int = 1):
+        self.name = name
+        self.fields = tuple(fields)
+        self.details = tuple(details)
+        self.detail_base = detail_base
+        self.detail_path = detail_path
+        self.row_key = row_key
+        self.min_details = min_details if self.details else 0
+        self.max_details = max_details
+        self.default_detail_count = default_detail_count
+        # 编译：每个字段的取值路径与校验函数只计算一次
+        self._header = tuple((field.name, field.path, '.' in field.path, field.compile()) for field in self.fields)
+        self._rows = tuple((field.name, field.compile()) for field in self.details)
+
+    # ==================== 解析 ====================
+    def _detail_rows(self, data: Any, errors: List[Dict[str, Any]]) -> List[Any]:
+        """取出原始明细行（字典）；平铺表单返回 (data, 序号) 交给_parse_row按键名读取"""
+        if self.detail_path:
+            rows = get_path(data, self.detail_path)
+            rows = rows if isinstance(rows, list) else []
+        elif isinstance(data, dict) and isinstance(data.get('details'), list):
+            rows = data['details']
+        else:
+            rows = None
+        if rows is not None:
+            count = len(rows)
+        else:
+            raw_count = data.get('detail_count')
+            try:
+                count = self.default_detail_count if raw_count in MISSING_VALUES else int(raw_count)
+            except (TypeError, ValueError):
+                errors.append({'field': 'detail_count', 'row': None, 'message': '明细数量必须为整数'})
+                return []
+        # 先检查行数，避免按超大的detail_count循环
+        if count < self.min_details or count > self.max_details:
+            errors.append({'field': 'detail_count', 'row': None,
+                           'message': f'明细数量必须在{self.min_details}到{self.max_details}之间'})
+            return []
+        if rows is not None:
+            return rows
+        base = self.detail_base
+        if self.row_key:
+            return [data.get(self.row_key.format(i=i)) for i in range(base, base + count)]
+        return [(data, i) for i in range(base, base + count)]
+
+    def parse(self, data: Any) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """解析一条请求（表单MultiDict或JSON字典），返回 (基础字段, 明细列表)；全部错误一次性以ValidationError抛出"""
+        if not hasattr(data, 'get'):
+            raise ValidationError([{'field': None, 'row': None, 'message': '请求数据格式错误'}])
+        errors: List[Dict[str, Any]] = []
+        fields: Dict[str, Any] = {}
+        invalid = []
+        for name, path, nested, check in self._header:
+            value, error = check(get_path(data, path) if nested else data.get(path))
+            if error is None:
+                fields[name] = value
+            elif error is REQUIRED:
+                errors.append({'field': name, 'row': None, 'message': f'缺少必填字段: {name}'})
+            else:
+                invalid.append({'field': name, 'row': None, 'message': error})
+        # 缺失字段排在格式错误之前
+        errors.extend(invalid)
+
+        details: List[Dict[str, Any]] = []
+        if self._rows:
+            for number, row in enumerate(self._detail_rows(data, errors), 1):
+                detail = self._parse_row(row, number, errors)
+                if detail is not None:
+                    details.append(detail)
+        if errors:
+            raise ValidationError(errors)
+        return fields, details
+
+    def _parse_row(self, row: Any, number: int, errors: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if isinstance(row, tuple):
+            source, index = row
+            get = lambda name: source.get(f'{name}{index}')
+        elif isinstance(row, dict):
+            get = row.get
+        else:
+            # 明细行缺失或不是对象：按所有字段缺失处理，逐个报出必填字段
+            get = lambda name: None
+        detail = {}
+        missing = []
+        row_errors = []
+        for name, check in self._rows:
+            value, error = check(get(name))
+            if error is None:
+                detail[name] = value
+            elif error is REQUIRED:
+                missing.append({'field': name, 'row': number, 'message': f'明细 {number} 缺少必填字段: {name}'})
+            else:
+                row_errors.append({'field': name, 'row': number, 'message': f'明细 {number} 的{error}'})
+        if not isinstance(row, (tuple, dict)) and not missing:
+            errors.append({'field': None, 'row': number, 'message': f'明细 {number} 格式错误'})
+            return None
+        errors.extend(missing)
+        errors.extend(row_errors)
+        return None if missing or row_errors else detail
+
+    def parse_many(self, items: List[Any]) -> List[Tuple[int, Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]], Optional[ValidationError]]]:
+        """解析批量请求（JSON数组），逐条返回 (序号, 解析结果, 错误)，一条出错不影响其他条"""
+        results = []
+        for index, item in enumerate(items):
+            try:
+                results.append((index, self.parse(item), None))
+            except ValidationError as e:
+                results.append((index, None, e))
+        return results
+
+    def describe(self) -> Dict[str, Any]:
+        def field_info(field: Field) -> Dict[str, Any]:
+            info = {'name': field.name, 'type': field.type, 'required': field.required}
+            for key in ('default', 'min', 'max', 'max_length', 'choices'):
+                if getattr(field, key) is not None:
+                    info[key] = getattr(field, key)
+            if field.path != field.name:
+                info['path'] = field.path
+            return info
+        return {
+            'fields': [field_info(field) for field in self.fields],
+            'details': [field_info(field) for field in self.details],
+            'detail_base': self.detail_base,
+            'detail_count': [self.min_details, self.max_details]
+        }
+
+
+# ==================== 消息类型注册 ====================
+_schemas: Dict[str, MessageSchema] = {}
+
+
+def register_schema(name: str, fields: Iterable[Field] = (), details: Iterable[Field] = (), **options) -> MessageSchema:
+    """注册某消息类型的输入结构（编译一次，之后各请求复用）"""
+    schema = MessageSchema(name, fields, details, **options)
+    _schemas[name] = schema
+    return schema
+
+
+def get_schema(name: str) -> Optional[MessageSchema]:
+    return _schemas.get(name)
+
+
+def list_schemas() -> Dict[str, Dict[str, Any]]:
+    return {name: schema.describe() for name, schema in _schemas.items()}
+
+
+def request_data() -> Any:
+    """当前请求的输入：JSON请求体（字典或数组）或表单"""
+    if request.is_json:
+        return request.get_json(silent=True)
+    return request.form
+
+
+def parse_request(name: str, data: Any = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """按注册的输入结构解析当前请求，返回 (基础字段, 明细列表)，校验失败抛出ValidationError"""
+    schema = _schemas.get(name)
+    if schema is None:
+        raise ValueError(f'未注册的消息类型: {name}')
+    with stage('parse'):
+        return schema.parse(request_data() if data is None else data)
+
+
+def validation_error_response(error: ValidationError):
+    """校验失败的统一响应：message为汇总信息，errors为逐项错误"""
+    return jsonify({'status': 'error', 'message': str(error), 'errors': error.errors}), 400
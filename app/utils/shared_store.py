@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/18 15:00
+# file: shared_store.py
+# 仪表盘共享存储：SQLite（WAL模式）保存菜单统计、备忘录、推送历史、队列指标、慢请求和追踪，多个gunicorn worker读写同一份数据
+import os
+import time
+import sqlite3
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS menu_stats (
+    menu_id TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS push_history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    queue_name TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    elapsed_ms REAL,
+    size INTEGER NOT NULL,
+    truncated INTEGER NOT NULL DEFAULT 0,
+    body BLOB NOT NULL,
+    pid INTEGER
+);
+-- 业务单号二级索引：(值, 序号) 作为主键，按单号查询时直接走索引并按序号倒序分页
+CREATE TABLE IF NOT EXISTS push_history_keys (
+    key_value TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    key_name TEXT NOT NULL,
+    PRIMARY KEY (key_value, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_push_history_keys_seq ON push_history_keys (seq);
+-- (列, seq) 索引直接按序号倒序分页；(列, ts) 索引用于同时带时间范围的查询
+CREATE INDEX IF NOT EXISTS idx_push_history_queue ON push_history (queue_name, seq);
+CREATE INDEX IF NOT EXISTS idx_push_history_queue_ts ON push_history (queue_name, ts);
+CREATE INDEX IF NOT EXISTS idx_push_history_success ON push_history (success, seq);
+CREATE INDEX IF NOT EXISTS idx_push_history_success_ts ON push_history (success, ts);
+CREATE INDEX IF NOT EXISTS idx_push_history_ts ON push_history (ts);
+-- 报文总字节数由触发器维护，裁剪时无需全表求和
+CREATE TABLE IF NOT EXISTS push_history_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO push_history_meta (id, bytes)
+    SELECT 1, COALESCE(SUM(LENGTH(body)), 0) FROM push_history;
+CREATE TRIGGER IF NOT EXISTS trg_push_history_insert AFTER INSERT ON push_history BEGIN
+    UPDATE push_history_meta SET bytes = bytes + LENGTH(NEW.body) WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_push_history_delete AFTER DELETE ON push_history BEGIN
+    UPDATE push_history_meta SET bytes = bytes - LENGTH(OLD.body) WHERE id = 1;
+    DELETE FROM push_history_keys WHERE seq = OLD.seq;
+END;
+-- 队列指标桶：每个worker一行保存桶的累计值，读取时按 (队列, 起始时间) 合并
+CREATE TABLE IF NOT EXISTS metric_buckets (
+    resolution TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    queue_name TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    histogram TEXT NOT NULL,
+    PRIMARY KEY (resolution, start, queue_name, pid)
+) WITHOUT ROWID;
+-- 慢请求：entry为完整记录（JSON），按序号保留最近若干条
+CREATE TABLE IF NOT EXISTS slow_requests (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    path TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+-- 结束的追踪：summary为不含span的概要（列表用），spans单独保存（查看单条时读取）；同一trace_id只保留最后一段
+CREATE TABLE IF NOT EXISTS traces (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    trace_id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    duration_ms REAL,
+    status TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    spans TEXT NOT NULL
+);
+"""
+
+HISTORY_COLUMNS = 'h.seq, h.ts, h.queue_name, h.success, h.elapsed_ms, h.size, h.truncated, h.body'
+
+
+class SharedStore:
+    """基于SQLite的跨进程存储
+
+    - WAL模式：读写互不阻塞，多个worker并发读取；busy_timeout处理写锁竞争
+    - 每个线程一个连接（sqlite3连接不能跨线程共享）
+    - 调用方负责合并写入，这里只提供批量写接口
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ==================== 键值（备忘录） ====================
+    def get_value(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self._connect().execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_value(self, key: str, value: str):
+        self._connect().execute(
+            'INSERT INTO kv (key, value, updated) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated = excluded.updated',
+            (key, value, time.time())
+        )
+
+    # ==================== 菜单统计 ====================
+    def get_menu_stats(self) -> Dict[str, int]:
+        rows = self._connect().execute('SELECT menu_id, count FROM menu_stats').fetchall()
+        return {menu_id: count for menu_id, count in rows}
+
+    # ==================== 推送历史 ====================
+    def search_history(self, limit: int = 50, before: Optional[int] = None, queue_name: Optional[str] = None,
+                       success: Optional[bool] = None, start: Optional[float] = None, end: Optional[float] = None,
+                       key: Optional[str] = None, key_name: Optional[str] = None) -> List[Tuple]:
+        """按序号倒序查询推送记录，before为上一页最后一条的序号（游标）
+
+        按单号查询时从push_history_keys主键出发，其余条件命中queue_name/success/ts上的二级索引
+        """
+        conditions, params = [], []
+        if key:
+            sql = f'SELECT {HISTORY_COLUMNS} FROM push_history_keys k JOIN push_history h ON h.seq = k.seq'
+            conditions.append('k.key_value = ?')
+            params.append(key)
+            if key_name:
+                conditions.append('k.key_name = ?')
+                params.append(key_name)
+            order_column = 'k.seq'
+        else:
+            sql = f'SELECT {HISTORY_COLUMNS} FROM push_history h'
+            order_column = 'h.seq'
+        if before is not None:
+            conditions.append(f'{order_column} < ?')
+            params.append(before)
+        if queue_name:
+            conditions.append('h.queue_name = ?')
+            params.append(queue_name)
+        if success is not None:
+            conditions.append('h.success = ?')
+            params.append(1 if success else 0)
+        if start is not None:
+            conditions.append('h.ts >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('h.ts < ?')
+            params.append(end)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY {order_column} DESC LIMIT ?'
+        params.append(limit)
+        return self._connect().execute(sql, params).fetchall()
+
+    def history_after(self, seq: int, limit: int = 500) -> List[Tuple]:
+        """按序号正序返回seq之后的记录元数据（不含报文），供实时推送增量使用"""
+        return self._connect().execute(
+            'SELECT seq, ts, queue_name, success, elapsed_ms, size, truncated FROM push_history '
+            'WHERE seq > ? ORDER BY seq LIMIT ?', (seq, limit)
+        ).fetchall()
+
+    def max_history_seq(self) -> int:
+        return self._connect().execute('SELECT COALESCE(MAX(seq), 0) FROM push_history').fetchone()[0]
+
+    def get_history(self, seq: int) -> Optional[Tuple]:
+        return self._connect().execute(
+            f'SELECT {HISTORY_COLUMNS} FROM push_history h WHERE h.seq = ?', (seq,)
+        ).fetchone()
+
+    def history_keys(self, seqs: List[int]) -> Dict[int, List[Tuple[str, str]]]:
+        """批量取一页记录的业务单号"""
+        if not seqs:
+            return {}
+        placeholders = ','.join('?' * len(seqs))
+        rows = self._connect().execute(
+            f'SELECT seq, key_name, key_value FROM push_history_keys WHERE seq IN ({placeholders})', seqs
+        ).fetchall()
+        keys = {}
+        for seq, key_name, key_value in rows:
+            keys.setdefault(seq, []).append((key_name, key_value))
+        return keys
+
+    def history_stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        min_seq, max_seq = conn.execute('SELECT COALESCE(MIN(seq), 0), COALESCE(MAX(seq), 0) FROM push_history').fetchone()
+        total_bytes = conn.execute('SELECT bytes FROM push_history_meta WHERE id = 1').fetchone()[0]
+        count = conn.execute('SELECT COUNT(*) FROM push_history').fetchone()[0] if max_seq else 0
+        return {'count': count, 'bytes': total_bytes, 'oldest_seq': min_seq, 'total_appended': max_seq}
+
+    # ==================== 队列指标 ====================
+    def metric_rows(self, resolution: str, start: int, end: int, queue_name: Optional[str] = None) -> List[Tuple]:
+        """返回 [start, end) 内所有worker的指标桶 (queue_name, start, count, failures, latency_sum, histogram)"""
+        sql = ('SELECT queue_name, start, count, failures, latency_sum, histogram FROM metric_buckets '
+               'WHERE resolution = ? AND start >= ? AND start < ?')
+        params = [resolution, start, end]
+        if queue_name:
+            sql += ' AND queue_name = ?'
+            params.append(queue_name)
+        return self._connect().execute(sql, params).fetchall()
+
+    def metric_queues(self) -> List[str]:
+        rows = self._connect().execute("SELECT DISTINCT queue_name FROM metric_buckets WHERE resolution = 'minute'")
+        return sorted(row[0] for row in rows)
+
+    # ==================== 慢请求 ====================
+    def recent_slow_requests(self, limit: int, path: Optional[str] = None) -> List[str]:
+        """按序号倒序返回慢请求记录（JSON），path为路径前缀"""
+        sql, params = 'SELECT entry FROM slow_requests', []
+        if path:
+            sql += ' WHERE substr(path, 1, ?) = ?'
+            params.extend([len(path), path])
+        sql += ' ORDER BY seq DESC LIMIT ?'
+        params.append(limit)
+        return [row[0] for row in self._connect().execute(sql, params)]
+
+    # ==================== 追踪 ====================
+    def recent_traces(self, limit: int, name: Optional[str] = None, min_ms: float = 0,
+                      status: Optional[str] = None) -> List[str]:
+        """按序号倒序返回追踪概要（JSON），name为名称子串"""
+        conditions, params = [], []
+        if name:
+            conditions.append('instr(name, ?) > 0')
+            params.append(name)
+        if min_ms:
+            conditions.append('duration_ms >= ?')
+            params.append(min_ms)
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        sql = 'SELECT summary FROM traces'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY seq DESC LIMIT ?'
+        params.append(limit)
+        return [row[0] for row in self._connect().execute(sql, params)]
+
+    def get_trace(self, trace_id: str) -> Optional[Tuple[str, str]]:
+        """返回 (summary, spans) JSON"""
+        return self._connect().execute('SELECT summary, spans FROM traces WHERE trace_id = ?', (trace_id,)).fetchone()
+
+    # ==================== 批量写入 ====================
+    def write_batch(self, menu_counts: Dict[str, int], records: List[Any], pid: Optional[int],
+                    history_capacity: int, history_max_bytes: int, metric_rows: Optional[List[Tuple]] = None,
+                    metric_cutoffs: Optional[Dict[str, int]] = None, slow_requests: Optional[List[Tuple]] = None,
+                    slow_request_capacity: int = 0, traces: Optional[List[Tuple]] = None, trace_capacity: int = 0):
+        """一个事务内写入菜单计数增量、推送记录（PushRecord）、本worker的指标桶、慢请求和追踪，并裁剪超出保留范围的数据
+
+        metric_rows为 (resolution, queue_name, start, count, failures, latency_sum, histogram)，
+        metric_cutoffs为各时间粒度保留的最早桶起始时间，slow_requests为 (ts, path, entry)，
+        traces为 (trace_id, name, duration_ms, status, summary, spans)
+        """
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if menu_counts:
+                conn.executemany(
+                    'INSERT INTO menu_stats (menu_id, count) VALUES (?, ?) '
+                    'ON CONFLICT(menu_id) DO UPDATE SET count = count + excluded.count',
+                    list(menu_counts.items())
+                )
+            if records:
+                key_rows = []
+                for r in records:
+                    seq = conn.execute(
+                        'INSERT INTO push_history (ts, queue_name, success, elapsed_ms, size, truncated, body, pid) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (r.ts, r.queue_name, int(r.success), r.elapsed_ms, r.size, int(r.truncated), r.body, pid)
+                    ).lastrowid
+                    key_rows.extend((value, seq, name) for name, value in r.keys)
+                if key_rows:
+                    conn.executemany('INSERT OR IGNORE INTO push_history_keys (key_value, seq, key_name) VALUES (?, ?, ?)',
+                                     key_rows)
+                self._trim_history(conn, history_capacity, history_max_bytes)
+            if metric_rows:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO metric_buckets '
+                    '(resolution, queue_name, start, count, failures, latency_sum, histogram, pid) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [row + (pid,) for row in metric_rows]
+                )
+                for resolution, cutoff in (metric_cutoffs or {}).items():
+                    conn.execute('DELETE FROM metric_buckets WHERE resolution = ? AND start < ?', (resolution, cutoff))
+            if slow_requests:
+                conn.executemany('INSERT INTO slow_requests (ts, path, entry) VALUES (?, ?, ?)', slow_requests)
+                conn.execute('DELETE FROM slow_requests WHERE seq <= (SELECT MAX(seq) FROM slow_requests) - ?',
+                             (slow_request_capacity,))
+            if traces:
+                # REPLACE会删除同一trace_id的旧行并分配新序号，序号不连续，按第capacity新的序号裁剪
+                conn.executemany(
+                    'INSERT OR REPLACE INTO traces (trace_id, name, duration_ms, status, summary, spans) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', traces
+                )
+                conn.execute('DELETE FROM traces WHERE seq < (SELECT seq FROM traces ORDER BY seq DESC LIMIT 1 OFFSET ?)',
+                             (max(trace_capacity - 1, 0),))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _trim_history(conn: sqlite3.Connection, capacity: int, max_bytes: int):
+        # 按条数裁剪：序号连续递增，直接按主键范围删除
+        conn.execute('DELETE FROM push_history WHERE seq <= (SELECT MAX(seq) FROM push_history) - ?', (capacity,))
+        # 按字节数裁剪：只在超出预算时从最旧记录累加，找到需要删除的最后一条
+        excess = conn.execute('SELECT bytes FROM push_history_meta WHERE id = 1').fetchone()[0] - max_bytes
+        if excess > 0:
+            acc = 0
+            cutoff = None
+            for seq, length in conn.execute('SELECT seq, LENGTH(body) FROM push_history ORDER BY seq'):
+                acc += length
+                cutoff = seq
+                if acc >= excess:
+                    break
+            if cutoff is not None:
+                conn.execute('DELETE FROM push_history WHERE seq <= ?', (cutoff,))
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/17 10:00
+# file: srm_stub.py
+# 本地SRM网关替身服务：实现saveArrival接口契约，可配置延迟、错误率和响应体，用于离线调试与压测
+#
+# 启动: python -m app.utils.srm_stub --port 18080 --latency-ms 50 --jitter-ms 20 --error-rate 0.05
+# 然后设置 apiEnv=local（地址见 SRM_GATEWAY_LOCAL_URL）
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import logging
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SAVE_ARRIVAL_PATH = '/open/srm/purchase/saveArrival'
+
+# 默认响应体，字符串中的 {businessNo} / {warehouseCode} / {lineCount} 会被替换
+DEFAULT_RESPONSES = {
+    'success': {
+        'code': '200',
+        'success': True,
+        'message': '操作成功',
+        'data': {'businessNo': '{businessNo}', 'warehouseCode': '{warehouseCode}', 'lineCount': '{lineCount}'}
+    },
+    'error': {
+        'code': '500',
+        'success': False,
+        'message': '模拟网关错误',
+        'data': None
+    },
+    'invalid': {
+        'code': '400',
+        'success': False,
+        'message': '{message}',
+        'data': None
+    }
+}
+
+
+def render(template: Any, values: Dict[str, Any]) -> Any:
+    """递归替换响应模板中的占位符"""
+    if isinstance(template, dict):
+        return {key: render(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [render(value, values) for value in template]
+    if isinstance(template, str):
+        return template.format(**values)
+    return template
+
+
+def validate_save_arrival(payload: Any) -> Optional[str]:
+    """校验saveArrival请求，返回错误信息或None"""
+    if not isinstance(payload, dict):
+        return '请求体必须为JSON对象'
+    for field in ('businessNo', 'warehouseCode', 'forecastArrivalTime'):
+        if not payload.get(field):
+            return f'缺少必填字段: {field}'
+    details = payload.get('detailList')
+    if not isinstance(details, list) or not details:
+        return 'detailList不能为空'
+    for line in details:
+        if not isinstance(line, dict) or not line.get('skuCode') or not line.get('sourceCode'):
+            return f'明细缺少skuCode或sourceCode: {line}'
+        if not isinstance(line.get('planArrivalNumber'), int) or line['planArrivalNumber'] <= 0:
+            return f'明细planArrivalNumber必须为正整数: {line.get("skuCode")}'
+    return None
+
+
+class StubState:
+    """替身服务的运行时配置与统计（线程安全）"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 error_status: int = 500, responses: Optional[Dict[str, Any]] = None, seed: Optional[int] = None):
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.responses = deepcopy(DEFAULT_RESPONSES)
+        self.responses.update(responses or {})
+        self.seen: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.started = time.time()
+            self.requests = 0
+            self.errors = 0
+            self.invalid = 0
+            self.duplicates = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.lines = 0
+
+    def configure(self, **options) -> Dict[str, Any]:
+        with self.lock:
+            for key in ('latency_ms', 'jitter_ms', 'error_rate'):
+                if key in options:
+                    setattr(self, key, float(options[key]))
+            if 'error_status' in options:
+                self.error_status = int(options['error_status'])
+            if 'responses' in options:
+                self.responses.update(options['responses'])
+        return self.describe()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'latency_ms': self.latency_ms,
+            'jitter_ms': self.jitter_ms,
+            'error_rate': self.error_rate,
+            'error_status': self.error_status
+        }
+
+    def enter(self) -> float:
+        """请求开始：计数并返回本次应模拟的延迟（秒）"""
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+            return max(self.latency_ms + jitter, 0) / 1000.0
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def handle(self, payload: Any) -> Tuple[int, Dict[str, Any]]:
+        """处理saveArrival请求，返回 (HTTP状态码, 响应体)"""
+        error = validate_save_arrival(payload)
+        with self.lock:
+            if error:
+                self.invalid += 1
+                return 400, render(self.responses['invalid'], {'message': error})
+            # 同一businessNo重复提交时返回首次结果，模拟网关幂等
+            business_no = payload['businessNo']
+            if business_no in self.seen:
+                self.duplicates += 1
+                return self.seen[business_no]
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.errors += 1
+                return self.error_status, render(self.responses['error'], {})
+            self.lines += len(payload['detailList'])
+            values = {
+                'businessNo': business_no,
+                'warehouseCode': payload['warehouseCode'],
+                'lineCount': len(payload['detailList'])
+            }
+            result = (200, render(self.responses['success'], values))
+            self.seen[business_no] = result
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            elapsed = time.time() - self.started
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'invalid': self.invalid,
+                'duplicates': self.duplicates,
+                'lines': self.lines,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'elapsed': round(elapsed, 3),
+                'requests_per_second': round(self.requests / elapsed, 1) if elapsed > 0 else None,
+                'config': self.describe()
+            }
+
+
+def make_handler(state: StubState):
+    """创建绑定了运行状态的请求处理类"""
+
+    class SrmStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支持长连接，与真实网关一致
+
+        def _send_json(self, status: int, body: Dict[str, Any]):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json;charset=UTF-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self) -> Any:
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            try:
+                return json.loads(raw or b'null')
+            except ValueError:
+                return None
+
+        def do_GET(self):
+            if self.path == '/__stats':
+                self._send_json(200, state.stats())
+            elif self.path == '/__health':
+                self._send_json(200, {'status': 'ok'})
+            else:
+                self._send_json(404, {'code': '404', 'success': False, 'message': f'未知接口: {self.path}'})
+
+        def do_POST(self):
+            if self.path == SAVE_ARRIVAL_PATH:
+                payload = self._read_json()
+                delay = state.enter()
+                try:
+                    if delay:
+                        time.sleep(delay)
+                    status, body = state.handle(payload)
+                finally:
+                    state.leave()
+                self._send_json(status, body)
+            elif self.path == '/__config':
+                self._send_json(200, state.configure(**(self._read_json() or {})))
+            elif self.path == '/__reset':
+                state.reset_stats()
+                self._send_json(200, state.stats())
+            else:
+                self._send_json(404, {'code': '404', 'success': False, 'message': f'未知接口: {self.path}'})
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} - {format % args}")
+
+    return SrmStubHandler
+
+
+def create_server(host: str = '127.0.0.1', port: int = 18080, **options) -> ThreadingHTTPServer:
+    """创建替身服务（不启动），options同StubState；port为0时随机分配端口"""
+    state = StubState(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def start_in_thread(host: str = '127.0.0.1', port: int = 0, **options) -> ThreadingHTTPServer:
+    """在后台线程中启动替身服务，返回server（server.server_address为实际地址，server.shutdown()停止）"""
+    server = create_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, name='srm-stub', daemon=True).start()
+    return server
+
+
+def load_responses(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not path:
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地SRM网关替身服务（saveArrival）')
+    parser.add_argument('--host', default=os.getenv('SRM_STUB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('SRM_STUB_PORT', '18080')))
+    parser.add_argument('--latency-ms', type=float, default=float(os.getenv('SRM_STUB_LATENCY_MS', '0')), help='平均响应延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=float(os.getenv('SRM_STUB_JITTER_MS', '0')), help='延迟抖动范围（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=float(os.getenv('SRM_STUB_ERROR_RATE', '0')), help='随机错误比例（0~1）')
+    parser.add_argument('--error-status', type=int, default=int(os.getenv('SRM_STUB_ERROR_STATUS', '500')), help='随机错误的HTTP状态码')
+    parser.add_argument('--responses', default=os.getenv('SRM_STUB_RESPONSES'), help='自定义响应体JSON文件（success/error/invalid）')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子，固定后错误分布可复现')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = create_server(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           error_rate=args.error_rate, error_status=args.error_status,
+                           responses=load_responses(args.responses), seed=args.seed)
+    logger.info(f"SRM网关替身服务已启动: http://{args.host}:{args.port}{SAVE_ARRIVAL_PATH}, 配置={server.state.describe()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/23 15:00
+# file: timing.py
+# 请求分段计时：解析、构建、校验、编码、连接、确认、记录等阶段的耗时累加到当前请求，
+# 响应时输出Server-Timing头，超过阈值的慢请求连同分段明细写入日志和仪表盘共享存储
+import time
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from flask import Flask, g, has_request_context, request
+
+from app.utils.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+# 长连接的事件流持续时间由客户端决定，不计入慢请求
+LONG_LIVED_MIMETYPES = ('text/event-stream',)
+
+
+class RequestTiming:
+    """一个请求的分段耗时
+
+    阶段可以嵌套（如 build 中调用 parse），每个阶段只记录扣除子阶段后的自身耗时，
+    各阶段之和不超过请求总耗时；同名阶段多次出现时累加并计数（如重试、批量提交逐条构建）
+    """
+
+    __slots__ = ('started', 'stages', '_children')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}  # 阶段名 -> [累计秒数, 次数]，按首次出现的顺序
+        self._children: List[float] = []  # 进行中的各层阶段已累计的子阶段耗时
+
+    def begin(self) -> float:
+        self._children.append(0.0)
+        return time.perf_counter()
+
+    def end(self, name: str, started: float):
+        elapsed = time.perf_counter() - started
+        own = elapsed - self._children.pop()
+        if self._children:
+            self._children[-1] += elapsed
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [own, 1]
+        else:
+            entry[0] += own
+            entry[1] += 1
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        """Server-Timing头：stage;dur=毫秒，多次出现的阶段附带 desc="xN"，最后为total"""
+        parts = []
+        for name, (seconds, count) in self.stages.items():
+            desc = f';desc="x{count}"' if count > 1 else ''
+            parts.append(f'{name}{desc};dur={seconds * 1000:.1f}')
+        parts.append(f'total;dur={self.total() * 1000:.1f}')
+        return ', '.join(parts)
+
+    def breakdown(self) -> Dict[str, Dict[str, Any]]:
+        return {name: {'ms': round(seconds * 1000, 1), 'count': count}
+                for name, (seconds, count) in self.stages.items()}
+
+
+def current_timing() -> Optional[RequestTiming]:
+    """当前请求的计时；不在请求上下文中（后台任务、回放线程）时为None"""
+    if not has_request_context():
+        return None
+    return g.get('_timing')
+
+
+@contextmanager
+def stage(name: str):
+    """计时一个阶段：with stage('encode'): ...；不在请求中时不计时。有进行中的追踪时同时记录为同名的子span"""
+    timing = current_timing()
+    with start_span(name):
+        if timing is None:
+            yield
+            return
+        started = timing.begin()
+        try:
+            yield
+        finally:
+            timing.end(name, started)
+
+
+def timed(name: str) -> Callable:
+    """装饰器形式的stage，整个函数计为一个阶段"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==================== 应用钩子 ====================
+def record_if_slow(timing: RequestTiming, method: str, path: str, query: str, status: int, threshold_ms: float):
+    """请求（含流式响应体）结束时调用：超过阈值时写入慢请求日志"""
+    total_ms = timing.total() * 1000
+    if threshold_ms <= 0 or total_ms < threshold_ms:
+        return
+    from app.utils.dashboard_data import get_dashboard_data_manager
+    breakdown = timing.breakdown()
+    get_dashboard_data_manager().log_slow_request({
+        'time': time.time(),
+        'method': method,
+        'path': path,
+        'query': query,
+        'status': status,
+        'total_ms': round(total_ms, 1),
+        'stages': breakdown
+    })
+    stages = ', '.join(f"{name}={info['ms']}ms" + (f"(x{info['count']})" if info['count'] > 1 else '')
+                       for name, info in breakdown.items())
+    logger.warning(f"慢请求: {method} {path} 状态码{status} 耗时{total_ms:.1f}ms "
+                   f"(阈值{threshold_ms:g}ms) 分段: {stages or '无'}")
+
+
+def finish_after_stream(chunks: Iterable, on_finish: Callable[[], None]) -> Iterator:
+    """流式响应体发送完毕（或客户端断开）后调用on_finish；关闭时同时关闭原始迭代器"""
+    try:
+        yield from chunks
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        on_finish()
+
+
+def init_timing(app: Flask):
+    """注册请求计时钩子（应在其他after_request钩子之前注册，最后执行，计入压缩等处理的耗时）
+
+    - before_request 开始计时
+    - after_request 写入Server-Timing头；流式响应的头只包含响应开始前的阶段，
+      慢请求判断推迟到响应体发送完毕（批量提交的逐条构建与推送发生在流式响应中）
+    """
+    header_enabled = app.config.get('SERVER_TIMING_ENABLED', True)
+    threshold_ms = app.config.get('SLOW_REQUEST_MS', 1000)
+
+    @app.before_request
+    def start_timing():
+        g._timing = RequestTiming()
+
+    @app.after_request
+    def add_server_timing(response):
+        timing = g.get('_timing')
+        if timing is None:
+            return response
+        if header_enabled:
+            response.headers.add('Server-Timing', timing.header())
+        if threshold_ms <= 0 or response.mimetype in LONG_LIVED_MIMETYPES:
+            return response
+        args = (timing, request.method, request.path, request.query_string.decode('latin-1'),
+                response.status_code, threshold_ms)
+        # 文件响应（send_file）保持直接传递，不包装
+        if response.is_streamed and not response.direct_passthrough:
+            response.response = finish_after_stream(response.response, lambda: record_if_slow(*args))
+        else:
+            record_if_slow(*args)
+        return response
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/24 15:00
+# file: tracing.py
+# 轻量链路追踪：进程内的span（属性、事件、父子关系），覆盖HTTP请求→构建报文→推送→RabbitMQ确认；
+# 追踪上下文以W3C traceparent写入AMQP消息头供消费方延续，结束的追踪写入仪表盘共享存储（可选追加到JSONL文件）供仪表盘查看
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from flask import Flask, g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = 'traceparent'
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+TRACE_ID_HEADER = 'X-Trace-Id'
+
+# 当前线程/上下文中进行中的子span；HTTP请求的根span保存在g中（请求结束时不需要复位）
+_current: contextvars.ContextVar = contextvars.ContextVar('trace_span', default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Trace:
+    """一条追踪在本进程内的全部span；根span结束时导出"""
+
+    __slots__ = ('trace_id', 'remote_parent_id', 'started', 'spans', 'dropped', 'max_spans')
+
+    def __init__(self, trace_id: Optional[str] = None, remote_parent_id: Optional[str] = None, max_spans: int = 500):
+        self.trace_id = trace_id or _new_id(16)
+        self.remote_parent_id = remote_parent_id  # 上游（如调用方的traceparent）的span
+        self.started = time.time()
+        self.spans: List['Span'] = []
+        self.dropped = 0
+        self.max_spans = max_spans
+
+    def new_span(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> Optional['Span']:
+        """超出max_spans时不再记录（返回None），只计数"""
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return None
+        span = Span(self, name, parent_id, attributes)
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.spans[0]
+        return {
+            'trace_id': self.trace_id,
+            'name': root.name,
+            'start': self.started,
+            'duration_ms': root.duration_ms(),
+            'status': root.status,
+            # 请求成功但内部有失败的span（如重试后成功的发布、被拒绝的单条批量数据）
+            'error_spans': sum(1 for span in self.spans if span.status == 'error'),
+            'span_count': len(self.spans),
+            'dropped': self.dropped,
+            'remote_parent_id': self.remote_parent_id,
+            'pid': os.getpid(),
+            'spans': [span.to_dict() for span in self.spans]
+        }
+
+
+class Span:
+    """一个span：名称、起止时间、属性、事件（如重连、重试）与状态"""
+
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'start', '_started', 'duration', 'attributes',
+                 'events', 'status', 'error')
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attributes = dict(attributes)
+        self.events: List[Dict[str, Any]] = []
+        self.status = 'ok'
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f'00-{self.trace.trace_id}-{self.span_id}-01'
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes):
+        self.events.append({'name': name, 'offset_ms': round((time.perf_counter() - self._started) * 1000, 3),
+                            'attributes': attributes})
+
+    def record_error(self, error: Any):
+        self.status = 'error'
+        self.error = f'{type(error).__name__}: {error}' if isinstance(error, BaseException) else str(error)
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+
+    def duration_ms(self) -> Optional[float]:
+        return None if self.duration is None else round(self.duration * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self.start - self.trace.started) * 1000, 3),
+            'duration_ms': self.duration_ms(),
+            'attributes': self.attributes,
+            'events': self.events,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+def parse_traceparent(value: Optional[str]):
+    """解析traceparent，返回 (trace_id, parent_id, sampled)，格式不正确时返回None"""
+    match = TRACEPARENT_RE.match((value or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+# ==================== 追踪API ====================
+def current_span() -> Optional[Span]:
+    span = _current.get()
+    if span is not None:
+        return span
+    if has_request_context():
+        return g.get('_trace_span')
+    return None
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+    """开始一条追踪并返回根span（需调用方end并export_trace）；携带traceparent时延续上游追踪，
+    否则按TRACE_SAMPLE_RATE采样，未采样时返回None
+    """
+    from config import config
+    upstream = parse_traceparent(traceparent)
+    if upstream is not None:
+        if not upstream[2]:
+            return None
+        trace = Trace(upstream[0], upstream[1], config.TRACE_MAX_SPANS)
+    elif config.TRACE_SAMPLE_RATE >= 1.0 or random.random() < config.TRACE_SAMPLE_RATE:
+        trace = Trace(max_spans=config.TRACE_MAX_SPANS)
+    else:
+        return None
+    return trace.new_span(name, trace.remote_parent_id, attributes)
+
+
+@contextmanager
+def start_span(name: str, **attributes):
+    """在当前span下开始子span：with start_span('rabbitmq.publish', queue=...) as span: ...
+
+    没有进行中的追踪（未采样、后台任务）或超出span上限时span为None，调用方需判断
+    """
+    parent = current_span()
+    span = parent.trace.new_span(name, parent.span_id, attributes) if parent is not None else None
+    if span is None:
+        yield None
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+
+def add_event(name: str, **attributes):
+    """在当前span上记录事件（如重连、重试），没有进行中的追踪时忽略"""
+    span = current_span()
+    if span is not None:
+        span.add_event(name, **attributes)
+
+
+def inject(headers: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """把当前追踪上下文写入消息头（AMQP headers），没有进行中的追踪时原样返回"""
+    span = current_span()
+    if span is None:
+        return headers
+    headers = dict(headers or {})
+    headers[TRACEPARENT] = span.traceparent
+    return headers
+
+
+# ==================== 导出 ====================
+class TraceStore:
+    """结束的追踪：随仪表盘数据写回共享存储（所有worker可查，保留最近TRACE_BUFFER_SIZE条），可选同时追加到JSONL文件"""
+
+    def __init__(self, export_file: Optional[str] = None):
+        self.export_file = export_file
+        self._file_lock = threading.Lock()
+        if export_file:
+            os.makedirs(os.path.dirname(os.path.abspath(export_file)), exist_ok=True)
+
+    def add(self, data: Dict[str, Any]):
+        from app.utils.dashboard_data import get_dashboard_data_manager
+        get_dashboard_data_manager().log_trace(data)
+        if self.export_file:
+            line = json.dumps(data, ensure_ascii=False, default=str) + '\n'
+            try:
+                with self._file_lock, open(self.export_file, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError as e:
+                logger.error(f"写入追踪文件失败: {str(e)}")
+
+    def recent(self, limit: int = 50, name: Optional[str] = None, min_ms: float = 0,
+               status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """追踪列表（不含span明细），新的在前"""
+        from app.utils.dashboard_data import get_dashboard_data_manager
+        return get_dashboard_data_manager().get_traces(limit, name, min_ms, status)
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        from app.utils.dashboard_data import get_dashboard_data_manager
+        return get_dashboard_data_manager().get_trace(trace_id)
+
+
+_trace_store = None
+_trace_store_pid = None
+_trace_store_lock = threading.Lock()
+
+
+def get_trace_store() -> TraceStore:
+    """获取追踪存储（单例模式，fork后的子进程重新创建）"""
+    global _trace_store, _trace_store_pid
+    if _trace_store is None or _trace_store_pid != os.getpid():
+        with _trace_store_lock:
+            if _trace_store is None or _trace_store_pid != os.getpid():
+                from config import config
+                _trace_store = TraceStore(config.TRACE_EXPORT_FILE or None)
+                _trace_store_pid = os.getpid()
+    return _trace_store
+
+
+def export_trace(root: Span):
+    """结束根span并导出整条追踪，导出失败不影响请求"""
+    root.end()
+    try:
+        get_trace_store().add(root.trace.to_dict())
+    except Exception as e:
+        logger.error(f"导出追踪失败: {str(e)}")
+
+
+# ==================== 应用钩子 ====================
+def init_tracing(app: Flask):
+    """为TRACE_METHODS中的请求（默认只有提交类请求，不含页面与仪表盘轮询）创建根span
+
+    请求头带traceparent时延续上游追踪；响应头 X-Trace-Id 返回追踪ID，可在仪表盘"链路追踪"页查看。
+    流式响应（如大批量提交的NDJSON）在响应体发送完毕后结束根span
+    """
+    if not app.config.get('TRACING_ENABLED', True):
+        return
+    from app.utils.timing import finish_after_stream
+    methods = frozenset(method.strip().upper() for method in app.config.get('TRACE_METHODS', ()) if method.strip())
+
+    @app.before_request
+    def start_request_trace():
+        if request.method not in methods:
+            return
+        span = start_trace(f'{request.method} {request.path}', request.headers.get(TRACEPARENT),
+                           **{'http.method': request.method, 'http.target': request.full_path.rstrip('?')})
+        if span is not None:
+            g._trace_span = span
+
+    @app.after_request
+    def finish_request_trace(response):
+        span = g.get('_trace_span')
+        if span is None:
+            return response
+        if request.url_rule is not None:
+            span.set('http.route', request.url_rule.rule)
+        span.set('http.status_code', response.status_code)
+        if response.status_code >= 400:
+            span.record_error(f'HTTP {response.status_code}')
+        response.headers[TRACE_ID_HEADER] = span.trace.trace_id
+        if response.is_streamed and not response.direct_passthrough:
+            response.response = finish_after_stream(response.response, lambda: export_trace(span))
+        else:
+            export_trace(span)
+        return response
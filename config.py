@@ -12,6 +12,21 @@ class Config:
     PORT = 5002
     HOST = os.getenv('HOST', '0.0.0.0')  # 默认使用0.0.0.0，可通过.env配置覆盖
 
+    # 日志配置（app.utils.logging_setup）
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # 根日志级别
+    LOG_LEVELS = {  # 模块日志级别，环境变量 LOG_LEVELS=pika:WARNING,app.routes:DEBUG 可覆盖
+        'pika': 'WARNING',
+        'urllib3': 'WARNING'
+    }
+    LOG_DIR = os.getenv('LOG_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs'))  # 滚动日志目录，置空则只输出到控制台
+    LOG_FILE_MODE = os.getenv('LOG_FILE_MODE', 'process')  # process：每个进程滚动各自的toms.<pid>.log；watched：共用toms.log，由logrotate滚动
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # 单个日志文件大小上限（process模式）
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))  # 每个进程保留的历史日志文件数（process模式）
+    LOG_RETENTION_DAYS = float(os.getenv('LOG_RETENTION_DAYS', '7'))  # 已退出进程的日志文件保留天数（process模式，0为不清理）
+    LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', '2000'))  # 日志中报文的最大字符数
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '1.0'))  # 报文日志采样比例（0~1）
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # 每个进程待写日志队列上限，超出的日志丢弃并计数
+
     # 队列名称（与RabbitMQ管理界面一致）
     ORDER_DOWNLOAD_QUEUE = 'oms_sales_order_download_queue'  # 订单下载队列
     ORDER_DELIVERY_QUEUE = 'sale_order_add_back'  # 销售订单发货队列
@@ -23,6 +38,7 @@ class Config:
     ALLOCATION_OUT_QUEUE = 'stock_out_back'  # 调拨出库队列
     ALLOCATION_ENTRY_QUEUE = 'entry_order_add_back_other'  # 调拨入库队列
     INVENTORY_ENTRY_QUEUE = 'inventory_return_order_back'  # 其他入库队列
+    INVENTORY_OUT_QUEUE = 'stock_out_back'  # 其他出库队列
 
     RABBITMQ_CONFIG = {
         'HOST': os.getenv('RABBITMQ_HOST'),
@@ -37,6 +53,130 @@ class Config:
     RABBITMQ_RETRY_ATTEMPTS = 3
     RABBITMQ_RETRY_DELAY = 2
 
+    # 业务编码生成配置（Snowflake风格，保证多worker、重启后不重复）
+    ID_SHARD_BASE = int(os.getenv('ID_SHARD_BASE', '0'))  # 多台机器部署时错开分片区间
+    ID_SHARD_COUNT = int(os.getenv('ID_SHARD_COUNT', '64'))  # 单机可租用的分片数（需大于worker数）
+    ID_STATE_DIR = os.getenv('ID_STATE_DIR')  # 分片租约与时间戳高水位目录，默认系统临时目录
+    ID_MAX_BATCH = int(os.getenv('ID_MAX_BATCH', '10000'))  # 单次批量获取编码的上限
+    # 编码类型 -> 前缀与格式模板（可用字段: prefix, id, ts, shard, seq, date, time）
+    ID_CODE_FORMATS = {
+        'businessNo': {'prefix': '', 'format': '{prefix}{id}'},
+        'sourceCode': {'prefix': 'SC', 'format': '{prefix}{id}'},
+        'platformOrderNo': {'prefix': 'PO', 'format': '{prefix}{id}'},
+        'platformNo': {'prefix': 'PN', 'format': '{prefix}{id}'},
+        'deliveryOrderCode': {'prefix': 'DS', 'format': '{prefix}{id}'},
+        'expressCode': {'prefix': 'EXP', 'format': '{prefix}{id}'},
+        'entryOrderCode': {'prefix': 'GSI', 'format': '{prefix}{id}'},
+        'returnOrderCode': {'prefix': 'RT', 'format': '{prefix}{id}'},
+        'platformRefundNo': {'prefix': 'RF', 'format': '{prefix}{id}'},
+        'platformExchangeNo': {'prefix': 'EX', 'format': '{prefix}{id}'}
+    }
+
+    # 基础数据目录配置（SKU/店铺/仓库）
+    CATALOG_SOURCE = os.getenv('CATALOG_SOURCE')  # CSV目录或SQLite文件，默认 app/fixtures/catalog
+    CATALOG_RELOAD_INTERVAL = int(os.getenv('CATALOG_RELOAD_INTERVAL', '30'))  # 检查来源文件变化的间隔（秒），0为不自动重载
+    CATALOG_SYNTHETIC_SKU_COUNT = int(os.getenv('CATALOG_SYNTHETIC_SKU_COUNT', '0'))  # 追加的Zipf分布合成SKU数量
+    CATALOG_MAX_SAMPLE = int(os.getenv('CATALOG_MAX_SAMPLE', '10000'))  # 单次采样数量上限
+
+    # 批量数据生成配置
+    BULK_MAX_COUNT = int(os.getenv('BULK_MAX_COUNT', '100000'))  # 单次批量生成数量上限
+    BULK_DRY_RUN_INLINE_MAX = int(os.getenv('BULK_DRY_RUN_INLINE_MAX', '1000'))  # 演练模式超过该数量时改为NDJSON流式返回
+
+    # SRM网关配置（库存调整）
+    SRM_GATEWAY_URLS = {
+        'test': os.getenv('SRM_GATEWAY_TEST_URL', 'https://gateway-test.babycare.com'),
+        'uat': os.getenv('SRM_GATEWAY_UAT_URL', 'https://gateway-uat.babycare.com'),
+        'local': os.getenv('SRM_GATEWAY_LOCAL_URL', 'http://127.0.0.1:18080')  # 本地替身服务：python -m app.utils.srm_stub
+    }
+    SRM_SAVE_ARRIVAL_PATH = '/open/srm/purchase/saveArrival'
+    SRM_CONNECT_TIMEOUT = float(os.getenv('SRM_CONNECT_TIMEOUT', '3.05'))  # 建立连接超时（秒）
+    SRM_READ_TIMEOUT = float(os.getenv('SRM_READ_TIMEOUT', '30'))  # 等待响应超时（秒）
+    SRM_POOL_MAXSIZE = int(os.getenv('SRM_POOL_MAXSIZE', '20'))  # 每个环境保持的最大长连接数
+    SRM_MAX_RETRIES = int(os.getenv('SRM_MAX_RETRIES', '2'))  # 重试次数（POST仅在连接失败时重试）
+    SRM_RETRY_BACKOFF = float(os.getenv('SRM_RETRY_BACKOFF', '0.3'))  # 重试退避系数（秒）
+    SRM_BATCH_GROUP_SIZE = int(os.getenv('SRM_BATCH_GROUP_SIZE', '50'))  # 批量调整时单个请求的最大明细行数
+    SRM_BATCH_CONCURRENCY = int(os.getenv('SRM_BATCH_CONCURRENCY', '8'))  # 批量调整的并发请求数（不超过连接池大小）
+    SRM_BATCH_MAX_ITEMS = int(os.getenv('SRM_BATCH_MAX_ITEMS', '5000'))  # 单次批量调整的最大行数
+
+    # 后台任务配置（异步库存调整）
+    JOB_STATE_DIR = os.getenv('JOB_STATE_DIR')  # 任务状态目录（多worker共享），默认系统临时目录下的toms_jobs
+    JOB_EXECUTOR_WORKERS = int(os.getenv('JOB_EXECUTOR_WORKERS', '8'))  # 每个worker的后台线程数
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '3600'))  # 任务结果保留时间（秒）
+    JOB_CLEANUP_INTERVAL = int(os.getenv('JOB_CLEANUP_INTERVAL', '60'))  # 清理过期任务文件的最小间隔（秒）
+
+    # 仪表盘推送历史配置（环形缓冲区）
+    PUSH_HISTORY_CAPACITY = int(os.getenv('PUSH_HISTORY_CAPACITY', '1000'))  # 最多保留的推送记录条数
+    PUSH_HISTORY_MAX_BYTES = int(os.getenv('PUSH_HISTORY_MAX_BYTES', str(8 * 1024 * 1024)))  # 推送记录报文总字节上限
+    PUSH_HISTORY_MAX_RECORD_BYTES = int(os.getenv('PUSH_HISTORY_MAX_RECORD_BYTES', str(256 * 1024)))  # 单条报文保留的最大字节数
+
+    # 仪表盘共享存储配置（SQLite WAL，多worker共享）
+    DASHBOARD_STORE_PATH = os.getenv('DASHBOARD_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'dashboard.db'))  # 数据库文件路径
+    STORE_FLUSH_INTERVAL = float(os.getenv('STORE_FLUSH_INTERVAL', '1'))  # 菜单计数与推送记录的合并写回间隔（秒）
+    STORE_CACHE_TTL = float(os.getenv('STORE_CACHE_TTL', '2'))  # 读取结果缓存时间（秒）
+    STORE_FLUSH_WATERMARK = int(os.getenv('STORE_FLUSH_WATERMARK', '500'))  # 待写回推送记录达到该条数时立即写回，不等写回间隔
+    STORE_PENDING_MAX = int(os.getenv('STORE_PENDING_MAX', '50000'))  # 每个worker待写回推送记录的上限，超出时丢弃最旧的记录并计数
+    STORE_HISTORY_CAPACITY = int(os.getenv('STORE_HISTORY_CAPACITY', '500000'))  # 共享存储中保留的推送记录条数
+    STORE_HISTORY_MAX_BYTES = int(os.getenv('STORE_HISTORY_MAX_BYTES', str(1024 * 1024 * 1024)))  # 共享存储中推送报文总字节上限
+    LIVE_FEED_INTERVAL = float(os.getenv('LIVE_FEED_INTERVAL', '1'))  # 实时推送轮询共享存储的间隔（秒）
+    LIVE_FEED_WINDOW = float(os.getenv('LIVE_FEED_WINDOW', '60'))  # 队列吞吐统计窗口（秒）
+    LIVE_FEED_QUEUE_SIZE = int(os.getenv('LIVE_FEED_QUEUE_SIZE', '100'))  # 单个连接最多积压的事件数，超出后断开
+    LIVE_FEED_HEARTBEAT = float(os.getenv('LIVE_FEED_HEARTBEAT', '15'))  # 心跳间隔（秒）
+    LIVE_FEED_MAX_SECONDS = float(os.getenv('LIVE_FEED_MAX_SECONDS', '1800'))  # 单个连接最长保持时间（秒），到期后浏览器自动重连
+    METRICS_SECOND_BUCKETS = int(os.getenv('METRICS_SECOND_BUCKETS', '300'))  # 按秒统计保留的桶数
+    METRICS_MINUTE_BUCKETS = int(os.getenv('METRICS_MINUTE_BUCKETS', '60'))  # 按分钟统计保留的桶数
+    PUSH_HISTORY_KEY_FIELDS = os.getenv('PUSH_HISTORY_KEY_FIELDS', 'platformOrderNo,deliveryOrderCode,entryOrderCode').split(',')  # 推送时提取并建立索引的业务单号字段
+
+    # 静态资源打包配置
+    ASSET_BUILD_DIR = os.getenv('ASSET_BUILD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build', 'assets'))  # 打包输出目录
+    ASSET_AUTO_RELOAD = os.getenv('ASSET_AUTO_RELOAD', 'false').lower() in ('1', 'true', 'yes')  # 源文件修改后自动重新打包（开发调试用）
+
+    # 页面渲染缓存配置
+    PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # 各页面按预设参数版本缓存渲染结果，并支持ETag/304
+    PAGE_CACHE_SIZE = int(os.getenv('PAGE_CACHE_SIZE', '64'))  # 缓存的页面数上限
+
+    # 响应压缩配置（brotli未安装时只使用gzip）
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # 是否压缩响应
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))  # 小于该字节数的响应不压缩（流式响应不受限制）
+    COMPRESSION_MIMETYPES = os.getenv(
+        'COMPRESSION_MIMETYPES',
+        'text/html,text/css,text/plain,text/javascript,application/javascript,application/json,'
+        'image/svg+xml,text/event-stream,application/x-ndjson'
+    ).split(',')  # 允许压缩的内容类型
+    COMPRESSION_CACHE_BYTES = int(os.getenv('COMPRESSION_CACHE_BYTES', str(16 * 1024 * 1024)))  # 带强ETag响应的压缩结果缓存上限
+
+    # 出站报文校验配置
+    OUTPUT_SCHEMA_MODE = os.getenv('OUTPUT_SCHEMA_MODE', 'strict').lower()  # strict：不合格不推送；warn：记录警告后推送；off：不校验（批量任务可按请求覆盖）
+
+    # 批量提交配置（各提交接口的JSON请求体为数组时）
+    BATCH_SUBMIT_MAX = int(os.getenv('BATCH_SUBMIT_MAX', '10000'))  # 单次批量提交的最大条数
+    BATCH_INLINE_MAX = int(os.getenv('BATCH_INLINE_MAX', '200'))  # 超过该条数时以NDJSON流式返回逐条结果
+    BATCH_PUBLISH_CHUNK = int(os.getenv('BATCH_PUBLISH_CHUNK', '500'))  # 每个AMQP事务推送的条数
+
+    # 请求分段计时配置
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # 响应中输出Server-Timing头（浏览器开发者工具的Timing面板可查看各阶段耗时）
+    SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '1000'))  # 超过该耗时（毫秒）的请求记入慢请求日志，0为不记录
+    SLOW_REQUEST_LOG_SIZE = int(os.getenv('SLOW_REQUEST_LOG_SIZE', '200'))  # 共享存储中保留的最近慢请求条数（所有worker）
+
+    # 按需性能剖析配置（管理接口 /profiler）
+    PROFILER_TOKEN = os.getenv('PROFILER_TOKEN', '')  # 管理令牌，为空时剖析接口不启用且不注册任何请求钩子
+    PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', '60'))  # 单次剖析的最长秒数
+    PROFILER_MAX_REQUESTS = int(os.getenv('PROFILER_MAX_REQUESTS', '1000'))  # 按请求数剖析时的上限
+    PROFILER_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILER_SAMPLE_INTERVAL_MS', '5'))  # 采样模式的默认采样间隔（毫秒）
+
+    # 链路追踪配置（HTTP请求→构建→推送→确认，仪表盘"链路追踪"页查看）
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # 是否记录追踪
+    TRACE_METHODS = os.getenv('TRACE_METHODS', 'POST,PUT,PATCH,DELETE').split(',')  # 创建追踪的请求方法（默认不追踪页面与仪表盘轮询）
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))  # 未携带traceparent的请求的采样比例（0~1）
+    TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '500'))  # 单条追踪最多记录的span数（大批量提交超出部分只计数）
+    TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '500'))  # 共享存储中保留的最近追踪条数（所有worker）
+    TRACE_EXPORT_FILE = os.getenv('TRACE_EXPORT_FILE', '')  # 非空时结束的追踪同时以JSONL追加到该文件
+
+    # 数据集导出与回放配置
+    DATASET_DIR = os.getenv('DATASET_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets'))  # 数据集文件目录
+    REPLAY_MAX_RATE = float(os.getenv('REPLAY_MAX_RATE', '2000'))  # 回放速率上限（条/秒）
+    REPLAY_BATCH_SIZE = int(os.getenv('REPLAY_BATCH_SIZE', '100'))  # 回放时一个事务最多发布的条数
+    REPLAY_STATE_DIR = os.getenv('REPLAY_STATE_DIR')  # 回放任务状态目录（多worker共享），默认系统临时目录下的toms_replay
+
     # 订单下载预设参数
     ORDER_DOWNLOAD_PRESET = {
         "city": "杭州市",
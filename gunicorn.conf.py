@@ -0,0 +1,69 @@
+# author:音十
+# time: 2025/8/22 10:00
+# gunicorn.conf.py - Gunicorn配置（gunicorn -c gunicorn.conf.py wsgi:app）
+#
+# 默认使用gthread：每个worker多个线程并发处理请求，推送等待RabbitMQ确认、库存调整等待SRM网关时不占满worker。
+# 仪表盘SSE连接会长期占用一个线程，线程数需要覆盖"同时打开的仪表盘数 + 并发提交数"。
+# 也可设置 GUNICORN_WORKER_CLASS=gevent，由gunicorn对socket打补丁，pika等待确认时让出协程。
+import os
+import multiprocessing
+
+cpu_count = multiprocessing.cpu_count()
+
+# ==================== 监听与进程 ====================
+bind = os.getenv('GUNICORN_BIND', f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5002')}")
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')  # gthread / gevent / sync
+# 推送统计、指标、慢请求、追踪和实时事件写回共享存储，所有worker看到相同数据，worker数不影响仪表盘；
+# 但每个worker各自持有RabbitMQ连接池（worker数×RABBITMQ_POOL_SIZE个连接）、页面缓存和商品目录，
+# 且都向同一个SQLite共享存储写回，worker数仍不宜过多；并发主要靠线程
+workers = int(os.getenv('GUNICORN_WORKERS', str(min(cpu_count * 2, 8))))
+threads = int(os.getenv('GUNICORN_THREADS', '16'))  # gthread每个worker的线程数
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '500'))  # gevent每个worker的最大并发连接数
+
+# ==================== 超时 ====================
+# gthread/gevent的timeout只检测worker是否卡死，不限制单个请求时长；
+# sync worker下单个推送（含重试）可能超过30秒，因此同样放宽
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))  # 重启/停止时等待进行中请求的秒数
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# 定期重启worker（默认关闭），释放长时间运行积累的内存；jitter避免所有worker同时重启
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+
+# ==================== 日志 ====================
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+# RabbitMQ连接池与并发度一致：gthread下每个线程最多占用一个连接；gevent下限制为较小的固定值，避免每个协程一个连接
+if worker_class == 'gthread':
+    os.environ.setdefault('RABBITMQ_POOL_SIZE', str(threads))
+elif worker_class == 'gevent':
+    os.environ.setdefault('RABBITMQ_POOL_SIZE', '16')
+else:
+    os.environ.setdefault('RABBITMQ_POOL_SIZE', '1')
+
+
+# ==================== 钩子 ====================
+def post_fork(server, worker):
+    """worker启动：丢弃从主进程继承的RabbitMQ管理器（preload_app时），在本进程重新初始化连接参数"""
+    from app.utils.rabbitmq import reset_after_fork, get_rabbitmq_manager
+    reset_after_fork()
+    manager = get_rabbitmq_manager()
+    server.log.info(f"Worker {worker.pid} 启动: worker_class={worker_class}, "
+                    f"RabbitMQ连接池上限={manager.config['POOL_SIZE']}")
+
+
+def worker_exit(server, worker):
+    """worker退出：等待进行中的推送完成后关闭RabbitMQ连接，并把仪表盘缓冲数据写回共享存储"""
+    from app.utils.rabbitmq import close_rabbitmq_connection
+    from app.utils.dashboard_data import get_dashboard_data_manager
+    try:
+        close_rabbitmq_connection(timeout=graceful_timeout)
+    except Exception as e:
+        server.log.error(f"Worker {worker.pid} 关闭RabbitMQ连接失败: {str(e)}")
+    try:
+        get_dashboard_data_manager().flush()
+    except Exception as e:
+        server.log.error(f"Worker {worker.pid} 写回仪表盘数据失败: {str(e)}")
@@ -21,4 +21,4 @@ cd TOMS/
 
 # 第四步：启动Gunicorn服务
 echo "第四步：启动Gunicorn服务..."
-gunicorn -w 4 -b 0.0.0.0:5002 wsgi:app
\ No newline at end of file
+gunicorn -c gunicorn.conf.py wsgi:app
\ No newline at end of file
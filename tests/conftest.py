@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/26 10:00
+# file: conftest.py
+# 测试公共配置：把项目根目录加入导入路径
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# time: 2025/8/26 10:00
+# file: test_push_history_search.py
+# 推送历史写回与按业务单号检索
+import pytest
+
+from config import config
+from app.utils.dashboard_data import DashboardDataManager
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    """使用临时数据库的独立管理器；写回间隔足够长，测试期间只有显式flush写回"""
+    monkeypatch.setattr(config, 'DASHBOARD_STORE_PATH', str(tmp_path / 'dashboard.db'))
+    monkeypatch.setattr(config, 'PUSH_HISTORY_CAPACITY', 100)
+    monkeypatch.setattr(config, 'STORE_FLUSH_INTERVAL', 3600)
+    monkeypatch.setattr(config, 'STORE_FLUSH_WATERMARK', 10 ** 6)
+    monkeypatch.setattr(DashboardDataManager, '_instance', None)
+    instance = DashboardDataManager()
+    yield instance
+    instance._pid = None  # 结束写回线程
+    instance._wakeup.set()
+    instance.store.close()
+
+
+def test_burst_larger_than_ring_is_fully_indexed(manager):
+    total = config.PUSH_HISTORY_CAPACITY * 10
+    for i in range(total):
+        manager.log_rabbitmq_request('oms_sales_order_download_queue', {'platformOrderNo': f'PO{i:05d}'}, True, 1.0)
+    assert len(manager.push_history) == config.PUSH_HISTORY_CAPACITY
+
+    manager.flush()
+
+    stats = manager.get_push_stats()
+    assert stats['count'] == total
+    assert stats['pending'] == 0 and stats['dropped'] == 0
+    logs = manager.search_rabbitmq_logs(key='PO00000', include_message=True)['logs']
+    assert len(logs) == 1
+    assert logs[0]['message'] == {'platformOrderNo': 'PO00000'}
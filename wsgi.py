@@ -11,4 +11,4 @@ app = create_app()
 if __name__ == '__main__':
     # 即使直接运行此文件，也不使用开发服务器
     # 而是提示用户使用WSGI服务器
-    print("请使用WSGI服务器部署，例如: gunicorn -w 4 -b 0.0.0.0:5002 wsgi:app")
\ No newline at end of file
+    print("请使用WSGI服务器部署，例如: gunicorn -c gunicorn.conf.py wsgi:app")
\ No newline at end of file